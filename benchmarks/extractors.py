@@ -0,0 +1,87 @@
+"""Speed and output of the PDF text extractors on sample transcripts
+
+For each PDF and each extractor that can be imported, extracts every page
+serially and with the process pool used by PDFTextStore, and reports time per
+page. Output is compared with PyPDF2's after normalization: the share of
+PyPDF2's Greek words the extractor also found, and how many Greek letters it
+produced. Nothing is written to media/.
+
+Run from the repository root:
+    python benchmarks/extractors.py a.pdf b.pdf [--processes 4] [--runs 3]
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTRACTORS = [
+    'proceedings.services.extractors.PyPDF2Extractor',
+    'proceedings.services.extractors.PdfiumExtractor',
+    'proceedings.services.extractors.PdfminerExtractor',
+]
+
+
+def greek_words(text):
+    return Counter(word for word in text.split() if any('Ͱ' <= ch <= 'Ͽ' for ch in word))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pdfs', nargs='+', help='PDF transcripts to extract')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='Processes for the parallel runs')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per measurement; the fastest is reported')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    import django
+    from django.conf import settings
+    django.setup()
+    from proceedings.services import extractors
+    from proceedings.services.pdf_processor import PDFTextStore
+
+    available = []
+    for path in EXTRACTORS:
+        try:
+            extractors.get_extractor(path)
+        except ImportError as e:
+            print(f"{path.rsplit('.', 1)[1]}: not installed ({e.name})")
+            continue
+        available.append(path)
+
+    store = PDFTextStore()
+    for pdf in args.pdfs:
+        print(f"\n{os.path.basename(pdf)}:")
+        reference = None
+        for path in available:
+            settings.AGORA_PDF_EXTRACTOR = path
+            extractor = extractors.get_extractor(path)
+            pages = extractor.page_count(pdf)
+            timings = {}
+            for processes in sorted({1, args.processes}):
+                settings.AGORA_EXTRACT_PROCESSES = processes
+                best = None
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    texts = list(store._extract_pages(pdf))
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[processes] = best
+
+            words = greek_words('\n'.join(texts))
+            if reference is None:
+                reference = words
+            overlap = sum((words & reference).values()) / max(sum(reference.values()), 1)
+            letters = sum(len(word) * count for word, count in words.items())
+            speeds = ', '.join(f"{processes} process(es) {seconds / max(pages, 1) * 1000:.1f} ms/page"
+                               for processes, seconds in timings.items())
+            print(f"  {extractor.name}: {pages} pages, {speeds}; "
+                  f"{overlap:.1%} of PyPDF2's Greek words, {letters} Greek letters")
+
+
+if __name__ == '__main__':
+    main()
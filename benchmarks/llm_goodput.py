@@ -0,0 +1,100 @@
+"""Goodput of model calls under a traffic spike, with and without admission control
+
+Runs against the fake backend with a simulated provider quota. A burst of
+interactive (Q&A) calls arrives together with a stream of background
+(summary) calls, first with no rate limit and no retries, which is how a
+quota error used to reach the user, then with the rate limiter at the quota
+and retries on. Reports completed and failed calls, goodput and interactive
+latency. Rate-limiter state is kept in a scratch directory.
+
+Run from the repository root:
+    python benchmarks/llm_goodput.py [--quota 20] [--interactive 200] [--background 40] [--latency 0.2]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(client, interactive, background, spread):
+    """Fire the calls; returns (latencies of successful interactive calls, failures, background done, wall time)"""
+    from proceedings.services.llm_backends import ThrottledError
+    from proceedings.services.rate_limiter import INTERACTIVE
+
+    failures = []
+    background_done = []
+
+    def background_worker(count):
+        for i in range(count):
+            try:
+                client.generate(f'περίληψη {threading.get_ident()} {i}')
+                background_done.append(1)
+            except ThrottledError:
+                failures.append('background')
+
+    async def interactive_call(i):
+        await asyncio.sleep(spread * i / max(interactive, 1))
+        started = time.perf_counter()
+        try:
+            await client.agenerate(f'ερώτηση {i}', INTERACTIVE)
+            return time.perf_counter() - started
+        except ThrottledError:
+            failures.append('interactive')
+            return None
+
+    async def spike():
+        return await asyncio.gather(*(interactive_call(i) for i in range(interactive)))
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=background_worker, args=(background // 4,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    latencies = [latency for latency in asyncio.run(spike()) if latency is not None]
+    for worker in workers:
+        worker.join()
+    return latencies, failures, len(background_done), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quota', type=float, default=20, help='Calls per second the fake provider accepts')
+    parser.add_argument('--interactive', type=int, default=200, help='Interactive calls in the spike')
+    parser.add_argument('--background', type=int, default=40, help='Background calls, from 4 threads')
+    parser.add_argument('--spread', type=float, default=2.0, help='Seconds over which the spike arrives')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake model latency in seconds')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    import django
+    django.setup()
+    from proceedings.services.llm_backends import FakeBackend
+    from proceedings.services.llm_client import LLMClient
+    from proceedings.services.rate_limiter import RateLimiter
+
+    configurations = {
+        'unlimited, no retries': dict(rate=0, retries=0),
+        f'rate {args.quota:g}/s, retries': dict(rate=args.quota, burst=args.quota, retries=6, backoff=0.25),
+    }
+    for label, options in configurations.items():
+        with tempfile.TemporaryDirectory() as state_dir:
+            backend = FakeBackend('goodput', latency=args.latency, piece_latency=0, quota=args.quota)
+            client = LLMClient(backend, 64, RateLimiter(backend.name, 64, state_dir=state_dir, **options))
+            latencies, failures, background_done, wall = run(client, args.interactive, args.background, args.spread)
+        done = len(latencies) + background_done
+        p95 = sorted(latencies)[int(0.95 * (len(latencies) - 1))] if latencies else float('nan')
+        print(f"{label}: {len(latencies)}/{args.interactive} interactive and {background_done}/{args.background} "
+              f"background calls succeeded, {len(failures)} failed, {backend.throttled} throttled by the provider; "
+              f"goodput {done / wall:.1f} calls/s, interactive p50 "
+              f"{statistics.median(latencies) if latencies else float('nan'):.2f}s p95 {p95:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Size of Q&A prompts with and without token-budget context packing
+
+For each question, builds the prompt for one session the old way (all retrieved
+chunks and speaker turns concatenated, last three history messages verbatim) and
+packed at each budget, without calling the model API. The session's chunks are
+created first if needed.
+
+Run from the repository root, for a PDF in media/pdf_documents:
+    python benchmarks/prompt_size.py session.pdf [--budgets 1500 3000 6000] [--questions questions.txt]
+"""
+import os
+import sys
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    'Ποια νομοσχέδια ψηφίστηκαν;',
+    'Τι ειπώθηκε για τον προϋπολογισμό;',
+    'Ποιες τροπολογίες κατατέθηκαν για τη φορολογία;',
+    'Τι συζητήθηκε για το μεταναστευτικό;',
+    'Ποιο ήταν το αποτέλεσμα της ψηφοφορίας;',
+]
+
+HISTORY = [
+    {'role': 'user', 'content': 'Ποια ήταν τα κύρια θέματα της συνεδρίασης;'},
+    {'role': 'assistant', 'content': 'Τα κύρια θέματα ήταν ο προϋπολογισμός, η παιδεία και η υγεία. ' * 20},
+    {'role': 'user', 'content': 'Και για την ενέργεια;'},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filename', help='Session PDF in media/pdf_documents')
+    parser.add_argument('--budgets', type=int, nargs='+', default=[1500, 3000, 6000],
+                        help='Prompt token budgets to compare')
+    parser.add_argument('--questions', help='File with one question per line')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    import django
+    django.setup()
+    from proceedings.services.context_packer import ContextPacker, estimate_tokens
+    from proceedings.services.qa_service import QAService
+
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    qa = QAService()
+    manager = qa.chunk_manager
+    manager.ensure_chunks(manager.get_pdf_path(args.filename), args.filename)
+
+    def unpacked(question):
+        passages = qa.speaker_turns(question, args.filename) + manager.get_relevant_chunks(
+            args.filename, question, k=qa.CONTEXT_CHUNKS)
+        history = '\n'.join(f"{'Χρήστης' if msg['role'] == 'user' else 'Βοηθός'}: {msg['content']}"
+                            for msg in HISTORY)
+        return qa.format_prompt(question, '\n'.join(passages), history)
+
+    sizes = [estimate_tokens(unpacked(question)) for question in questions]
+    print(f"unpacked: mean {statistics.mean(sizes):.0f} tokens, max {max(sizes)} over {len(questions)} questions")
+    for budget in args.budgets:
+        qa.packer = ContextPacker(budget)
+        sizes = [estimate_tokens(qa.build_prompt(question, HISTORY, args.filename)) for question in questions]
+        print(f"budget {budget}: mean {statistics.mean(sizes):.0f} tokens, max {max(sizes)}")
+
+
+if __name__ == '__main__':
+    main()
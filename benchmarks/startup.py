@@ -0,0 +1,91 @@
+"""Startup and per-request setup cost of the web process
+
+Measures, without calling the model API:
+  - cold start: a fresh interpreter running django.setup() and importing proceedings.views
+  - Session objects: building the view-level Session record for one PDF
+  - services: getting the summarizer, topic extractor, Q&A service and chunk manager a request uses
+
+Run from the repository root:
+    python benchmarks/startup.py [--runs 5] [--iterations 10000]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START = """
+import os, sys, time
+sys.path.insert(0, {root!r})
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+started = time.perf_counter()
+import django
+django.setup()
+import proceedings.views
+print(time.perf_counter() - started)
+"""
+
+
+def cold_start(runs):
+    env = dict(os.environ, GEMINI_API_KEY=os.environ.get('GEMINI_API_KEY', 'benchmark'), PYTHONWARNINGS='ignore')
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', COLD_START.format(root=ROOT)], cwd=ROOT, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def per_call(function, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time')
+    parser.add_argument('--iterations', type=int, default=10000, help='Repetitions of the in-process timings')
+    args = parser.parse_args()
+
+    timings = cold_start(args.runs)
+    print(f"cold start (setup + import views): median {statistics.median(timings) * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms over {args.runs} runs")
+
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    import django
+    django.setup()
+    from proceedings import views
+    from proceedings.services.registry import get_service
+
+    print(f"google.generativeai imported at startup: {'google.generativeai' in sys.modules}")
+
+    session = per_call(lambda: views.Session('session.pdf'), args.iterations)
+    print(f"Session(filename): {session * 1e6:.2f} us, {sys.getsizeof(views.Session('session.pdf'))} bytes")
+
+    def request_services():
+        get_service(views.SessionSummarizer)
+        get_service(views.TopicExtractor)
+        get_service(views.QAService)
+        get_service(views.PDFChunkManager)
+
+    def fresh_services():
+        views.SessionSummarizer()
+        views.TopicExtractor()
+        views.QAService()
+        views.PDFChunkManager()
+
+    shared = per_call(request_services, args.iterations)
+    fresh = per_call(fresh_services, max(1, args.iterations // 10))
+    print(f"services per request: shared {shared * 1e6:.2f} us, constructed {fresh * 1e6:.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""End-to-end performance suite, run offline against the fake model backend
+
+Stages, all on one session PDF copied into a scratch library (the real media/
+directory and database are never touched):
+  - extract: PDF text extraction
+  - chunk: chunking, BM25 and vector indexing and speaker segmentation, and
+    opening the stored chunks and index in a fresh process cache
+  - retrieval: per-query chunk ranking in lexical, vector and hybrid mode
+  - cache: Q&A answer cache miss, exact hit and near-duplicate hit
+  - topics: topic generation through map-reduce with the fake model's latency
+  - views: request latency of session_qa_view (answer cache miss and hit, JSON
+    and streamed), session_topics_view and SessionListView under concurrency
+
+Every number is a time, so lower is better. --save writes them as a baseline,
+and --compare reports each one against a saved baseline and exits with status 1
+when any is slower than the tolerance allows.
+
+Run from the repository root:
+    python benchmarks/suite.py path/to/session.pdf [--stages extract chunk ...] [--concurrency 16]
+        [--requests 100] [--latency 0.2] [--save benchmarks/baseline.json] [--compare benchmarks/baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import argparse
+import importlib
+import platform
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ['extract', 'chunk', 'retrieval', 'cache', 'topics', 'views']
+
+QUESTIONS = [
+    'Ποια νομοσχέδια ψηφίστηκαν;',
+    'Τι ειπώθηκε για τον προϋπολογισμό;',
+    'Ποιες τροπολογίες κατατέθηκαν για τη φορολογία;',
+    'Τι συζητήθηκε για το μεταναστευτικό;',
+    'Ποιο ήταν το αποτέλεσμα της ψηφοφορίας;',
+    'Τι αποφασίστηκε για τις συντάξεις;',
+    'Ποιες θέσεις διατυπώθηκαν για την υγεία;',
+    'Τι προτάθηκε για τη στέγαση;',
+]
+TOPICS = ('παιδεία υγεία ενέργεια νερό στέγαση συντάξεις φορολογία οικονομία δικαιοσύνη '
+          'εκλογές μεταναστευτικό προϋπολογισμός τροπολογία νομοσχέδιο ψηφοφορία').split()
+
+
+def unique_questions(count, salt=''):
+    """Distinct questions, so that every request misses the answer cache"""
+    questions = []
+    for i in range(count):
+        digest = hashlib.sha256(f'{salt}{i}'.encode()).digest()
+        words = [TOPICS[b % len(TOPICS)] for b in digest[:3]]
+        questions.append(f"Τι ειπώθηκε για {words[0]}, {words[1]} και {words[2]} (ερώτηση {salt}{i});")
+    return questions
+
+
+def summarize(timings):
+    """Milliseconds at the usual percentiles of a list of durations in seconds"""
+    ordered = sorted(timings)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {'p50_ms': percentile(50), 'p95_ms': percentile(95), 'p99_ms': percentile(99),
+            'mean_ms': statistics.mean(ordered) * 1000}
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+class Suite:
+    def __init__(self, args, filename):
+        self.args = args
+        self.filename = filename
+        self.metrics = {}
+
+    def record(self, name, value):
+        self.metrics[name] = round(value, 3)
+        print(f"  {name}: {value:.3f}")
+
+    def record_latencies(self, name, timings, wall):
+        for key, value in summarize(timings).items():
+            self.record(f'{name}.{key}', value)
+        # Wall time per request under concurrency, the inverse of throughput
+        self.record(f'{name}.ms_per_request', wall / len(timings) * 1000)
+
+    def run(self, stages):
+        for stage in stages:
+            print(f"{stage}:")
+            getattr(self, f'stage_{stage}')()
+
+    def pdf_path(self):
+        from django.conf import settings
+        return os.path.join(settings.MEDIA_ROOT, 'pdf_documents', self.filename)
+
+    def stage_extract(self):
+        from proceedings.services.pdf_processor import PDFTextStore
+        store = PDFTextStore()
+        timings = []
+        for _ in range(self.args.runs):
+            shutil.rmtree(os.path.join(store.artifacts.ROOT, store.ARTIFACT_KIND), ignore_errors=True)
+            timings.append(timed(store.ensure_extracted, self.pdf_path())[0])
+        pages = store.page_count(self.pdf_path())
+        self.record('extract.seconds', min(timings))
+        self.record('extract.ms_per_page', min(timings) / max(pages, 1) * 1000)
+
+    def stage_chunk(self):
+        from proceedings.services.qa_service import PDFChunkManager
+        manager = PDFChunkManager()
+        manager.extractor.text_store.ensure_extracted(self.pdf_path())
+        timings = []
+        for _ in range(self.args.runs):
+            for kind in ('chunks', 'vectors', 'turns'):
+                shutil.rmtree(os.path.join(manager.artifacts.ROOT, kind), ignore_errors=True)
+            PDFChunkManager._loaded.clear()
+            timings.append(timed(manager.create_chunks, self.pdf_path(), self.filename)[0])
+        self.record('chunk.seconds', min(timings))
+        loads = []
+        for _ in range(self.args.runs):
+            PDFChunkManager._loaded.clear()
+            loads.append(timed(manager.load, self.filename)[0])
+        self.record('chunk.load_ms', min(loads) * 1000)
+
+    def stage_retrieval(self):
+        from proceedings.services.qa_service import PDFChunkManager
+        manager = PDFChunkManager()
+        manager.ensure_chunks(self.pdf_path(), self.filename)
+        for mode in ('lexical', 'vector', 'hybrid'):
+            manager.rank_chunks(self.filename, QUESTIONS[0], mode=mode)  # Load the indexes
+            timings = [timed(manager.rank_chunks, self.filename, question, 5, mode)[0]
+                       for _ in range(self.args.runs * 10) for question in QUESTIONS]
+            for key, value in summarize(timings).items():
+                self.record(f'retrieval.{mode}.{key}', value)
+
+    def stage_cache(self):
+        from django.core.cache import cache
+        from proceedings.services.answer_cache import AnswerCache
+        cache.clear()
+        answers = AnswerCache()
+        answers.threshold = 0.92  # The rewording tier is off by default; measure it enabled
+        scope = 'benchmark'
+        questions = unique_questions(200, 'cache')
+        for question in questions:
+            answers.set(question, [], scope, 'απάντηση')
+        # Misses scan the scope's questions for a near-duplicate before giving up
+        unrelated = [f'Πόσοι βουλευτές παρευρέθηκαν στη συνεδρίαση αριθμός {i};' for i in range(200)]
+        misses = [timed(answers.get, question, [], scope)[0] for question in unrelated]
+        hits = [timed(answers.get, question, [], scope)[0] for question in questions]
+        # The same questions, re-punctuated and with a filler word: near-duplicates of cached ones
+        variants = [question.replace(';', '?').replace('Τι ', 'Τι ακριβώς ') for question in questions]
+        near = [timed(answers.get, question, [], scope)[0] for question in variants]
+        # Close in wording, different in meaning: each must miss, not get the other's answer
+        answers.set('Τι είπε ο Υπουργός Οικονομικών για τις δαπάνες υγείας;', [], scope, 'υγεία')
+        answers.set('Ποιος ψήφισε υπέρ του νομοσχεδίου;', [], scope, 'υπέρ')
+        wrong = sum(answers.get(question, [], scope) is not None for question in (
+            'Τι είπε ο Υπουργός Οικονομικών για τις δαπάνες παιδείας;',
+            'Ποιος ψήφισε κατά του νομοσχεδίου;',
+        ))
+        self.record('cache.miss.p50_ms', summarize(misses)['p50_ms'])
+        self.record('cache.exact_hit.p50_ms', summarize(hits)['p50_ms'])
+        self.record('cache.near_duplicate.p50_ms', summarize(near)['p50_ms'])
+        print(f"  ({answers.local_stats['misses']} of {len(unrelated)} unrelated questions missed, "
+              f"{answers.local_stats['similar_hits']} of {len(variants)} near-duplicates hit, "
+              f"{wrong} of 2 different questions wrongly hit)")
+
+    def stage_topics(self):
+        from proceedings.services.topic_service import TopicExtractor
+        extractor = TopicExtractor()
+        shutil.rmtree(os.path.join(extractor.artifacts.ROOT, 'topics'), ignore_errors=True)
+        shutil.rmtree(os.path.join(extractor.artifacts.ROOT, 'section'), ignore_errors=True)
+        seconds, _ = timed(extractor.get_or_generate_topics, self.filename, self.pdf_path())
+        self.record('topics.generate.seconds', seconds)
+
+    def stage_views(self):
+        from django.core.cache import cache
+        from django.test import AsyncClient, Client
+        from proceedings.services.registry import get_service
+        from proceedings.services.qa_service import QAService
+        from proceedings.services.session_catalog import SessionCatalog
+        from proceedings.services.topic_service import TopicExtractor
+
+        get_service(SessionCatalog).sync(force=True)
+        get_service(TopicExtractor).get_or_generate_topics(self.filename, self.pdf_path())
+        qa = get_service(QAService)
+        qa.chunk_manager.ensure_chunks(self.pdf_path(), self.filename)
+        url = f'/session/{self.filename}/'
+        requests = self.args.requests
+
+        async def load(make_request, count):
+            semaphore = asyncio.Semaphore(self.args.concurrency)
+            client = AsyncClient()
+            timings = []
+
+            async def one(i):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await make_request(client, i)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{response.status_code}: {response.content[:200]}")
+                    if response.streaming:
+                        async for _ in response.streaming_content:
+                            pass
+                    timings.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(count)))
+            return timings, time.perf_counter() - started
+
+        def ask(questions, stream=False):
+            async def request(client, i):
+                body = json.dumps({'question': questions[i % len(questions)], 'chat_history': [], 'stream': stream})
+                return await client.post(f'{url}qa/', body, content_type='application/json')
+            return request
+
+        # Near-duplicate matching would turn some misses into hits
+        qa.answers.threshold = 2
+        cache.clear()
+        self.record_latencies('views.qa.miss', *asyncio.run(load(ask(unique_questions(requests, 'miss')), requests)))
+        cache.clear()
+        self.record_latencies('views.qa.stream_miss',
+                              *asyncio.run(load(ask(unique_questions(requests, 'stream'), stream=True), requests)))
+        warm = unique_questions(len(QUESTIONS), 'hit')
+        asyncio.run(load(ask(warm), len(warm)))
+        self.record_latencies('views.qa.hit', *asyncio.run(load(ask(warm), requests)))
+
+        async def topics(client, i):
+            return await client.get(f'{url}topics/')
+        self.record_latencies('views.topics', *asyncio.run(load(topics, requests)))
+
+        # The list view is synchronous, so concurrent requests run in threads
+        def session_list(i):
+            started = time.perf_counter()
+            response = Client().get('/')
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code}")
+            return time.perf_counter() - started
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.args.concurrency) as pool:
+            timings = list(pool.map(session_list, range(requests)))
+        self.record_latencies('views.session_list', timings, time.perf_counter() - started)
+
+
+def compare(metrics, baseline, tolerance, noise_ms):
+    """Print each metric against the baseline; returns the names of those that regressed
+
+    A metric regressed when it is slower by more than tolerance, relatively, and
+    by more than noise_ms, absolutely, so jitter in sub-millisecond timings is not
+    reported.
+    """
+    regressions = []
+    print(f"\nAgainst baseline from {baseline.get('created')} ({baseline['pdf']['name']}):")
+    for name, old in baseline['metrics'].items():
+        new = metrics.get(name)
+        if new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        delta_ms = (new - old) * (1 if name.endswith('_ms') else 1000)
+        flag = ''
+        if change > tolerance and delta_ms > noise_ms:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"  {name}: {old:.3f} -> {new:.3f} ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pdf', help='Session PDF to benchmark with')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--runs', type=int, default=3, help='Repetitions of the extraction and chunking stages')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per view scenario')
+    parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake model latency before the first piece, seconds')
+    parser.add_argument('--piece-latency', type=float, default=0.01, help='Fake model latency per streamed piece, seconds')
+    parser.add_argument('--save', help='Write the results to this baseline file')
+    parser.add_argument('--compare', help='Compare the results with this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown against the baseline')
+    parser.add_argument('--noise-ms', type=float, default=1.0, help='Slowdowns smaller than this are not regressions')
+    args = parser.parse_args()
+
+    pdf = os.path.abspath(args.pdf)
+    with open(pdf, 'rb') as f:
+        pdf_hash = hashlib.sha256(f.read()).hexdigest()
+    filename = os.path.basename(pdf)
+
+    scratch = tempfile.mkdtemp(prefix='agora-bench-')
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'config.settings',
+        'GEMINI_API_KEY': os.environ.get('GEMINI_API_KEY', 'benchmark'),
+        'AGORA_LLM_BACKEND': 'proceedings.services.llm_backends.FakeBackend',
+        'AGORA_FAKE_LLM_LATENCY': str(args.latency),
+        'AGORA_FAKE_LLM_PIECE_LATENCY': str(args.piece_latency),
+    })
+    sys.path.insert(0, ROOT)
+    # The services keep their caches under relative media/ paths: run inside the scratch directory
+    os.chdir(scratch)
+    try:
+        import django
+        from django.conf import settings
+        settings_module = importlib.import_module('config.settings')
+        settings_module.MEDIA_ROOT = os.path.join(scratch, 'media')
+        settings_module.DATABASES['default']['NAME'] = os.path.join(scratch, 'db.sqlite3')
+        settings_module.ALLOWED_HOSTS = ['testserver']
+        django.setup()
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'pdf_documents'))
+        shutil.copy(pdf, os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename))
+
+        suite = Suite(args, filename)
+        suite.run([stage for stage in STAGES if stage in args.stages])
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'pdf': {'name': filename, 'sha256': pdf_hash},
+        'options': {key: getattr(args, key) for key in ('runs', 'requests', 'concurrency', 'latency', 'piece_latency')},
+        'metrics': suite.metrics,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nSaved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['pdf']['sha256'] != pdf_hash or baseline['options'] != results['options']:
+            print("\nWarning: the baseline was made with a different PDF or options")
+        if compare(suite.metrics, baseline, args.tolerance, args.noise_ms):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'proceedings.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -131,4 +132,91 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Gemini API Key
-api_key = os.getenv("GEMINI_API_KEY")
\ No newline at end of file
+api_key = os.getenv("GEMINI_API_KEY")
+GEMINI_API_KEY = api_key
+
+# Shared LLM client: model name and the most calls in flight per process
+AGORA_LLM_MODEL = os.getenv('AGORA_LLM_MODEL', 'gemini-pro')
+AGORA_LLM_MAX_CONCURRENCY = int(os.getenv('AGORA_LLM_MAX_CONCURRENCY', '64'))
+
+# Admission control shared by the processes on this host: model calls per second
+# and burst, share of the burst and of the concurrency kept for interactive Q&A, and
+# retries of throttled calls with a jittered backoff starting at AGORA_LLM_BACKOFF
+# seconds. The host-wide concurrency limit halves on throttling and grows back with
+# successes. A rate of 0 turns the shared limits off: each process then only limits
+# itself, and Q&A no longer gets ahead of the background workers' calls
+AGORA_LLM_RATE = float(os.getenv('AGORA_LLM_RATE', '5'))
+AGORA_LLM_BURST = float(os.getenv('AGORA_LLM_BURST', '0'))
+AGORA_LLM_INTERACTIVE_RESERVE = float(os.getenv('AGORA_LLM_INTERACTIVE_RESERVE', '0.25'))
+AGORA_LLM_RETRIES = int(os.getenv('AGORA_LLM_RETRIES', '4'))
+AGORA_LLM_BACKOFF = float(os.getenv('AGORA_LLM_BACKOFF', '0.5'))
+
+# Model backend: Gemini, or proceedings.services.llm_backends.FakeBackend to run
+# offline with deterministic answers and these simulated latencies (seconds)
+AGORA_LLM_BACKEND = os.getenv('AGORA_LLM_BACKEND', 'proceedings.services.llm_backends.GeminiBackend')
+AGORA_FAKE_LLM_LATENCY = float(os.getenv('AGORA_FAKE_LLM_LATENCY', '0.5'))
+AGORA_FAKE_LLM_PIECE_LATENCY = float(os.getenv('AGORA_FAKE_LLM_PIECE_LATENCY', '0.05'))
+# Calls per second the fake backend accepts before throttling (0 for no quota)
+AGORA_FAKE_LLM_QUOTA = float(os.getenv('AGORA_FAKE_LLM_QUOTA', '0'))
+
+# Sections of one long transcript summarized in parallel (map-reduce)
+AGORA_MAP_CONCURRENCY = int(os.getenv('AGORA_MAP_CONCURRENCY', '8'))
+
+# Q&A retrieval: 'lexical' (BM25), 'vector' (embeddings) or 'hybrid' (both, rank-fused)
+AGORA_RETRIEVAL_MODE = os.getenv('AGORA_RETRIEVAL_MODE', 'hybrid')
+
+# Q&A answer cache: seconds an answer is kept, cosine similarity above which a
+# rewording of a cached question (same content words) reuses its answer, questions kept per session.
+# The rewording tier is off by default (above 1); 0.92 is a reasonable value to enable it
+AGORA_QA_CACHE_TIMEOUT = int(os.getenv('AGORA_QA_CACHE_TIMEOUT', '3600'))
+AGORA_QA_SIMILARITY = float(os.getenv('AGORA_QA_SIMILARITY', '1.01'))
+AGORA_QA_CACHE_ENTRIES = int(os.getenv('AGORA_QA_CACHE_ENTRIES', '256'))
+
+# In-process LRU of summaries and topics read from media/artifacts, in bytes of JSON
+AGORA_MEMORY_CACHE_BYTES = int(os.getenv('AGORA_MEMORY_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# Sessions whose memory-mapped chunks and indexes (and, separately, vector indexes and
+# speaker turns) each process keeps open; every map holds a file descriptor
+AGORA_LOADED_FILES = int(os.getenv('AGORA_LOADED_FILES', '64'))
+
+# Optional shared tier between the in-process LRU and the disk: a memcached (or any
+# Django cache) server given by AGORA_SHARED_CACHE_BACKEND and _LOCATION, e.g.
+# django.core.cache.backends.memcached.PyMemcacheCache and 127.0.0.1:11211
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+AGORA_SHARED_CACHE = ''
+if os.getenv('AGORA_SHARED_CACHE_BACKEND'):
+    CACHES['artifacts'] = {
+        'BACKEND': os.getenv('AGORA_SHARED_CACHE_BACKEND'),
+        'LOCATION': os.getenv('AGORA_SHARED_CACHE_LOCATION', ''),
+    }
+    AGORA_SHARED_CACHE = 'artifacts'
+AGORA_SHARED_CACHE_TIMEOUT = int(os.getenv('AGORA_SHARED_CACHE_TIMEOUT', str(24 * 3600)))
+
+# Token budget of a Q&A prompt: instructions, question, retrieved passages and chat history
+AGORA_QA_CONTEXT_TOKENS = int(os.getenv('AGORA_QA_CONTEXT_TOKENS', '3000'))
+
+# Batch Q&A over many sessions: sessions per question, retrievals run at once,
+# and the prompt tokens and sessions packed into one model call
+AGORA_QA_BATCH_MAX_SESSIONS = int(os.getenv('AGORA_QA_BATCH_MAX_SESSIONS', '50'))
+AGORA_QA_BATCH_CONCURRENCY = int(os.getenv('AGORA_QA_BATCH_CONCURRENCY', '8'))
+AGORA_QA_BATCH_TOKENS = int(os.getenv('AGORA_QA_BATCH_TOKENS', '12000'))
+AGORA_QA_BATCH_SESSIONS = int(os.getenv('AGORA_QA_BATCH_SESSIONS', '4'))
+
+# Add a Server-Timing header with per-stage durations to every response
+# (clients can also ask for it per request with an X-Agora-Timing header)
+AGORA_TIMING_HEADER = os.getenv('AGORA_TIMING_HEADER', '') == '1'
+
+# Directory where each worker process writes its metrics, merged by /metrics/
+# whichever worker serves the scrape; empty to report only the serving process
+AGORA_METRICS_DIR = os.getenv('AGORA_METRICS_DIR', 'media/metrics')
+
+# PDF text extractor: PyPDF2Extractor (default), or PdfiumExtractor / PdfminerExtractor
+# from proceedings.services.extractors once pypdfium2 / pdfminer.six are installed.
+# Changing it re-extracts every PDF on next use
+AGORA_PDF_EXTRACTOR = os.getenv('AGORA_PDF_EXTRACTOR', 'proceedings.services.extractors.PyPDF2Extractor')
+# Processes extracting long PDFs (500+ pages) in parallel, shared by all extractions
+# of a server or worker process (0 for one per CPU, 1 to extract in-process)
+AGORA_EXTRACT_PROCESSES = int(os.getenv('AGORA_EXTRACT_PROCESSES', '0'))
+
+# Embedder used for chunk vectors; any class with a `name` and an `embed(texts)` method
+AGORA_EMBEDDER = 'proceedings.services.vector_index.HashingEmbedder'
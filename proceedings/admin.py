@@ -1,3 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import GenerationJob, ParliamentarySession
+
+
+@admin.register(ParliamentarySession)
+class ParliamentarySessionAdmin(admin.ModelAdmin):
+    list_display = ('title', 'date', 'page_count', 'summary_ready', 'topics_ready', 'chunks_ready', 'updated_at')
+    list_filter = ('summary_ready', 'topics_ready', 'chunks_ready')
+    search_fields = ('title', 'filename')
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'filename', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('filename',)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ProceedingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'proceedings'
+
+    def ready(self):
+        # Create the shared LLM client once per process; its model is built on first use
+        from .services.llm_client import get_llm_client
+        get_llm_client()
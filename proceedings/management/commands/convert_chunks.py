@@ -0,0 +1,42 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from proceedings.services.qa_service import PDFChunkManager
+
+
+class Command(BaseCommand):
+    help = 'Convert chunks and indexes cached as JSON to the memory-mapped binary format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-json', action='store_true',
+                            help='Keep the JSON files after converting them')
+
+    def handle(self, *args, **options):
+        chunk_manager = PDFChunkManager()
+        pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
+        filenames = sorted(f for f in os.listdir(pdf_dir) if f.endswith('.pdf')) if os.path.isdir(pdf_dir) else []
+
+        converted = saved = 0
+        for filename in filenames:
+            paths = chunk_manager.get_cache_path(filename)
+            try:
+                if not os.path.exists(paths['chunks']) and not chunk_manager.convert_json(filename):
+                    continue
+            except Exception as e:
+                print(f"Error converting {filename}: {e}")
+                continue
+            legacy = [paths[name] for name in ('chunks_json', 'index_json') if os.path.exists(paths[name])]
+            if not legacy:
+                continue
+            before = sum(os.path.getsize(path) for path in legacy)
+            saved += before - os.path.getsize(paths['chunks']) - os.path.getsize(paths['index'])
+            converted += 1
+            if not options['keep_json']:
+                for path in legacy:
+                    os.remove(path)
+            self.stdout.write(f"Converted {filename}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted {converted} session(s), {saved / 1e6:.1f} MB smaller"))
@@ -0,0 +1,66 @@
+import os
+import time
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from proceedings.services.artifact_store import ArtifactStore
+from proceedings.services.fragments import FragmentStore
+from proceedings.services.qa_service import PDFChunkManager
+from proceedings.services.summarizer import SessionSummarizer
+from proceedings.services.topic_service import TopicExtractor
+
+# Filename-keyed caches written before the artifact store existed
+LEGACY_DIRS = ['media/summaries', 'media/topics', 'media/chunks', 'media/text']
+
+
+class Command(BaseCommand):
+    help = 'Delete generated artifacts that no current PDF, prompt or parameter set can reach'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List what would be deleted without deleting it')
+        parser.add_argument('--legacy', action='store_true',
+                            help='Also delete the old filename-keyed cache directories (run import_legacy first)')
+
+    def reachable_keys(self):
+        """Artifact keys the current PDFs resolve to with the current code and settings"""
+        services = [(SessionSummarizer(), 'summary'), (TopicExtractor(), 'topics')]
+        fragments = FragmentStore()
+        chunk_manager = PDFChunkManager()
+        text_store = chunk_manager.extractor.text_store
+
+        keys = set()
+        pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
+        filenames = sorted(f for f in os.listdir(pdf_dir) if f.endswith('.pdf')) if os.path.isdir(pdf_dir) else []
+        for filename in filenames:
+            pdf_path = os.path.join(pdf_dir, filename)
+            keys.add(text_store.artifact_key(text_store.content_hash(pdf_path)))
+            keys.update(chunk_manager.artifact_keys(filename).values())
+            keys.add(chunk_manager.speakers.artifact_key(filename))
+            extracted = text_store.get_page_index(pdf_path) is not None
+            for service, field in services:
+                keys.add(service.artifact_key(filename))
+                keys.add(fragments.artifact_key(service, filename, field))
+                if extracted:
+                    keys.update(service.section_keys(text_store.iter_texts(pdf_path)))
+        return keys
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # Artifacts written while the keys are computed are newer than this, and kept
+        started = time.time()
+        removed = ArtifactStore().collect_garbage(self.reachable_keys(), dry_run=dry_run, started=started)
+        for path in removed:
+            self.stdout.write(f"{'Would delete' if dry_run else 'Deleted'} {path}")
+
+        if options['legacy']:
+            for directory in LEGACY_DIRS:
+                if os.path.isdir(directory):
+                    self.stdout.write(f"{'Would delete' if dry_run else 'Deleted'} {directory}/")
+                    if not dry_run:
+                        shutil.rmtree(directory)
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(removed)} artifact file(s)"))
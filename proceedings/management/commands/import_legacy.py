@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from proceedings.services.session_catalog import SessionCatalog
+from proceedings.services.summarizer import SessionSummarizer
+from proceedings.services.topic_service import TopicExtractor
+
+
+class Command(BaseCommand):
+    help = 'Store the summaries and topics of the old filename-keyed caches under their artifact keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List what would be imported without importing it')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        services = [(SessionSummarizer(), 'summary'), (TopicExtractor(), 'topics')]
+        catalog = SessionCatalog()
+
+        pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
+        filenames = sorted(f for f in os.listdir(pdf_dir) if f.endswith('.pdf')) if os.path.isdir(pdf_dir) else []
+        imported = skipped = 0
+        for filename in filenames:
+            for service, kind in services:
+                legacy_path = service.get_legacy_cache_path(filename)
+                if not os.path.isfile(legacy_path) or os.path.exists(service.get_cache_path(filename)):
+                    continue
+                if service.read_legacy(filename) is not None:
+                    if not dry_run:
+                        service.import_legacy(filename)
+                        catalog.mark_ready(filename, kind)
+                    self.stdout.write(f"{'Would import' if dry_run else 'Imported'} {legacy_path}")
+                    imported += 1
+                else:
+                    # Stale: the PDF, prompt or model changed, or the cache holds an error
+                    self.stdout.write(f"Skipped {legacy_path}")
+                    skipped += 1
+
+        verb = 'Would import' if dry_run else 'Imported'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {imported} legacy cache(s), skipped {skipped}"))
@@ -0,0 +1,141 @@
+import os
+import glob
+import time
+import shutil
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from proceedings.models import GenerationJob
+from proceedings.services.corpus_search import CorpusIndex
+from proceedings.services.job_queue import JobQueue
+from proceedings.services.pdf_processor import PDFTextStore
+from proceedings.services.qa_service import PDFChunkManager
+from proceedings.services.session_catalog import SessionCatalog
+from proceedings.services.speaker_index import SpeakerIndex
+
+
+def _ingest(args):
+    """Copy one PDF into the library and extract and chunk it; runs in a pool process"""
+    source, pdf_dir = args
+    filename = os.path.basename(source)
+    try:
+        text_store = PDFTextStore()
+        target = os.path.join(pdf_dir, filename)
+        if os.path.abspath(source) != os.path.abspath(target):
+            if os.path.exists(target):
+                if text_store.content_hash(target) != text_store.content_hash(source):
+                    return filename, 'clash', 0, 0
+            else:
+                shutil.copy2(source, target)
+
+        chunk_manager = PDFChunkManager()
+        # Artifacts are keyed by content hash, so a rerun skips everything finished before a crash
+        if chunk_manager.chunk_exists(filename):
+            return filename, 'skipped', 0, 0
+        chunk_manager.ensure_chunks(target, filename)
+        pages = text_store.page_count(target)
+        return filename, 'processed', pages, os.path.getsize(target)
+    except Exception as e:
+        print(f"Error ingesting {filename}: {e}")
+        return filename, 'failed', 0, 0
+
+
+class Command(BaseCommand):
+    help = 'Extract and chunk session PDFs in parallel, optionally queueing their summaries and topics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+',
+                            help='Directories or glob patterns of PDFs to ingest')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Number of extraction processes')
+        parser.add_argument('--enqueue', nargs='*', default=[],
+                            choices=[GenerationJob.KIND_SUMMARY, GenerationJob.KIND_TOPICS],
+                            help='Queue these generation jobs for every ingested session')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Maximum generation jobs queued per second (0 for no limit)')
+        parser.add_argument('--progress-every', type=int, default=50,
+                            help='Report throughput after this many files')
+
+    def collect(self, sources):
+        paths = []
+        for source in sources:
+            if os.path.isdir(source):
+                matches = glob.glob(os.path.join(source, '**', '*.pdf'), recursive=True)
+            else:
+                matches = glob.glob(source, recursive=True)
+            paths.extend(path for path in matches if path.endswith('.pdf') and os.path.isfile(path))
+
+        # One file per name: the library is keyed by file name
+        unique = {}
+        for path in sorted(paths):
+            unique.setdefault(os.path.basename(path), path)
+        return list(unique.values())
+
+    def handle(self, *args, **options):
+        paths = self.collect(options['sources'])
+        if not paths:
+            raise CommandError('No PDF files found')
+
+        pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
+        os.makedirs(pdf_dir, exist_ok=True)
+        processes = max(1, options['processes'])
+        self.stdout.write(f"Ingesting {len(paths)} PDF(s) with {processes} process(es)")
+
+        catalog = SessionCatalog()
+        queue = JobQueue()
+        interval = 1.0 / options['rate'] if options['rate'] > 0 else 0
+        next_enqueue = 0.0
+        counts = {'processed': 0, 'skipped': 0, 'failed': 0, 'clash': 0}
+        pages = size = 0
+        started = time.monotonic()
+
+        # Pool processes must not inherit this process's database connections
+        connections.close_all()
+        # Forked, so the pool processes inherit the configured Django; a spawned child
+        # would import this module before django.setup(). Without fork, ingest in-process.
+        if 'fork' in multiprocessing.get_all_start_methods():
+            pool = multiprocessing.get_context('fork').Pool(processes)
+            results = pool.imap_unordered(_ingest, [(path, pdf_dir) for path in paths])
+        else:
+            pool = None
+            results = map(_ingest, [(path, pdf_dir) for path in paths])
+        try:
+            for done, (filename, status, file_pages, file_size) in enumerate(results, start=1):
+                counts[status] += 1
+                pages += file_pages
+                size += file_size
+                if status == 'clash':
+                    self.stderr.write(f"Skipped {filename}: a different file with this name is already in the library")
+                elif status != 'failed':
+                    session = catalog.refresh(filename)
+                    for kind in options['enqueue']:
+                        if session is not None and getattr(session, f'{kind}_ready'):
+                            continue
+                        # Space out the jobs so the workers do not hit the model API all at once
+                        if interval:
+                            time.sleep(max(0.0, next_enqueue - time.monotonic()))
+                            next_enqueue = time.monotonic() + interval
+                        queue.enqueue(kind, filename)
+
+                if done % options['progress_every'] == 0 or done == len(paths):
+                    self.report(done, len(paths), pages, size, time.monotonic() - started)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        CorpusIndex().sync(build=True)
+        SpeakerIndex().sync(build=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {counts['processed']}, skipped {counts['skipped']} already processed, "
+            f"failed {counts['failed']}, name clashes {counts['clash']}"
+        ))
+
+    def report(self, done, total, pages, size, elapsed):
+        elapsed = max(elapsed, 1e-6)
+        self.stdout.write(
+            f"{done}/{total} files in {elapsed:.1f}s: {done / elapsed:.1f} files/s, "
+            f"{pages / elapsed:.1f} pages/s, {size / elapsed / 2**20:.1f} MB/s"
+        )
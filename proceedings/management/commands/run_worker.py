@@ -0,0 +1,50 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from proceedings.services.job_queue import JobQueue
+
+
+def _work(poll_interval, once):
+    # Each process opens its own database connection
+    connections.close_all()
+    JobQueue().work(poll_interval=poll_interval, once=once)
+
+
+class Command(BaseCommand):
+    help = 'Run background workers that generate summaries, topics and chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes to run')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        self.stdout.write(f"Starting {processes} worker process(es)")
+
+        if processes == 1:
+            processed = JobQueue().work(poll_interval=options['poll_interval'], once=options['once'])
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)"))
+            return
+
+        # Forked, so the workers inherit the configured Django; a spawned child would
+        # import this module before django.setup(). The command runs no threads of its own.
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('Several worker processes need the fork start method; '
+                               'run one worker per command instead')
+        context = multiprocessing.get_context('fork')
+        connections.close_all()
+        workers = [
+            context.Process(target=_work, args=(options['poll_interval'], options['once']))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
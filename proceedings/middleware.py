@@ -0,0 +1,53 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .services.metrics import REQUEST_SECONDS, end_request_spans, server_timing, start_request_spans
+
+
+class RequestTimingMiddleware:
+    """Time every request by view, and optionally report its stages in a Server-Timing header
+
+    The header lists the spans recorded while the response was produced
+    (extraction, retrieval, prompt, model call, cache lookups...). It is added
+    when AGORA_TIMING_HEADER is on, or when the request sends X-Agora-Timing.
+    Streamed bodies are produced after the response leaves, so their stages
+    only reach the /metrics/ histograms.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.always = getattr(settings, 'AGORA_TIMING_HEADER', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        spans, token = start_request_spans()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request_spans(token)
+        return self.finish(request, response, spans, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        spans, token = start_request_spans()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request_spans(token)
+        return self.finish(request, response, spans, time.perf_counter() - started)
+
+    def finish(self, request, response, spans, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, view, request.method, str(response.status_code))
+        if self.always or 'X-Agora-Timing' in request.headers:
+            response['Server-Timing'] = server_timing(spans, elapsed)
+        return response
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:31
+
+import os
+
+from django.db import migrations, models
+
+
+def fill_filenames(apps, schema_editor):
+    ParliamentarySession = apps.get_model('proceedings', 'ParliamentarySession')
+    for session in ParliamentarySession.objects.filter(filename__isnull=True):
+        session.filename = os.path.basename(session.pdf_file.name) or f"session-{session.pk}.pdf"
+        session.save(update_fields=['filename'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proceedings', '0002_generationjob'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='parliamentarysession',
+            options={'ordering': ['-date', 'filename']},
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='chunks_ready',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='filename',
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='mtime_ns',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='page_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='summary_ready',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='parliamentarysession',
+            name='topics_ready',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='parliamentarysession',
+            name='date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='parliamentarysession',
+            name='pdf_file',
+            field=models.FileField(max_length=255, upload_to='pdf_documents/'),
+        ),
+        migrations.RunPython(fill_filenames, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='parliamentarysession',
+            name='filename',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='parliamentarysession',
+            index=models.Index(fields=['-date', 'filename'], name='session_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parliamentarysession',
+            index=models.Index(fields=['summary_ready', 'topics_ready'], name='session_status_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+from django.db import models
+from django.db.models import Q
+
+
+class ParliamentarySession(models.Model):
+    """Catalog entry for one session PDF, kept in step with media/pdf_documents"""
+    filename = models.CharField(max_length=255, unique=True)
+    title = models.CharField(max_length=200)
+    date = models.DateField(blank=True, null=True)
+    pdf_file = models.FileField(upload_to='pdf_documents/', max_length=255)
+    summary = models.TextField(blank=True, null=True)
+    page_count = models.PositiveIntegerField(default=0)
+    size = models.PositiveBigIntegerField(default=0)
+    mtime_ns = models.BigIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, blank=True)
+    summary_ready = models.BooleanField(default=False)
+    topics_ready = models.BooleanField(default=False)
+    chunks_ready = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date', 'filename']
+        indexes = [
+            models.Index(fields=['-date', 'filename'], name='session_date_idx'),
+            models.Index(fields=['summary_ready', 'topics_ready'], name='session_status_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def url(self):
+        return f'/media/pdf_documents/{self.filename}'
+
+
+class GenerationJob(models.Model):
+    """A queued piece of background work for one session PDF"""
+    KIND_SUMMARY = 'summary'
+    KIND_TOPICS = 'topics'
+    KIND_CHUNKS = 'chunks'
+    KIND_CHOICES = [
+        (KIND_SUMMARY, 'Summary'),
+        (KIND_TOPICS, 'Topics'),
+        (KIND_CHUNKS, 'Chunks'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Refreshed by the worker while it runs
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            # At most one pending or running job per artifact, however many viewers ask for it
+            models.UniqueConstraint(
+                fields=['kind', 'filename'],
+                condition=Q(status__in=['pending', 'running']),
+                name='unique_active_generation_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.filename} ({self.status})"
@@ -0,0 +1,202 @@
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import cache_result, span
+from .search_index import tokenize
+from .vector_index import get_embedder
+
+
+# Folded function and question words, which do not change what a question asks about
+# Negations and words of polarity or direction (δεν, μην, χωρις, κατα, μετα) are content:
+# "who did not vote" is a different question from "who voted"
+STOPWORDS = frozenset("""
+    ο η το οι τα του τησ των τον την τουσ τισ ενα ενασ ενοσ μια μιασ
+    σε στο στη στην στον στα στουσ στισ στου στησ των για με απο προσ
+    και ή η να θα αν οτι που πωσ τι ποιοσ ποια ποιο ποιοι ποιεσ ποιου ποιασ
+    ποιων ποιον ποσοι ποσεσ ποσα ποσο ποτε γιατι πού ειναι ηταν αυτο αυτη αυτοσ αυτα αυτου
+    μου μασ σασ σου τουσ ακριβωσ παρακαλω λοιπον επισησ ομωσ
+""".split())
+
+
+def normalize_question(question: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a question"""
+    return ' '.join(tokenize(question))
+
+
+def content_words(normalized: str) -> frozenset:
+    """Words of a normalized question that say what it is about"""
+    return frozenset(word for word in normalized.split() if word not in STOPWORDS)
+
+
+class AnswerCache:
+    """Q&A answers shared by every worker through Django's cache, in two tiers
+
+    The exact tier is keyed by a sha256 of the normalized question and of the
+    chat history the prompt includes, so the same question hits in any process
+    and after restarts. The similarity tier keeps, per scope (session, page
+    range, model and prompt), the most recently used questions; a question
+    with the same history and the same content words as one of them, and an
+    embedding close enough to it, is served that question's answer. The
+    embedder only counts shared words, so similarity alone would match
+    "spending on health" with "spending on education"; the tier is off unless
+    AGORA_QA_SIMILARITY is set to 1 or below. Entries expire after the timeout, and each
+    scope keeps at most AGORA_QA_CACHE_ENTRIES questions, dropping the least recently used.
+    """
+    PREFIX = 'qa_cache'
+    VERSION = 1
+    HISTORY_TURNS = 3   # Chat messages included in the prompt, and so in the key
+    STATS = ('exact_hits', 'similar_hits', 'misses')
+
+    def __init__(self):
+        self.timeout = getattr(settings, 'AGORA_QA_CACHE_TIMEOUT', 3600)
+        # Cosine similarity above which a cached answer is reused; above 1 disables the tier
+        self.threshold = getattr(settings, 'AGORA_QA_SIMILARITY', 1.01)
+        self.max_entries = getattr(settings, 'AGORA_QA_CACHE_ENTRIES', 256)
+        # Embeddings of recently seen questions, so each is embedded once per process
+        self._vectors = OrderedDict()
+        self._vectors_lock = threading.Lock()
+        self.local_stats = Counter()
+
+    def history_key(self, chat_history: List[Dict]) -> str:
+        """Fingerprint of the part of the chat history that reaches the prompt"""
+        recent = [f"{msg.get('role')}:{normalize_question(msg.get('content', ''))}"
+                  for msg in (chat_history or [])[-self.HISTORY_TURNS:]]
+        return hashlib.sha256('\n'.join(recent).encode('utf-8')).hexdigest()[:16]
+
+    def key(self, question: str, chat_history: List[Dict], scope: str) -> str:
+        digest = hashlib.sha256(
+            f"{self.history_key(chat_history)}\n{normalize_question(question)}".encode('utf-8')
+        ).hexdigest()
+        return f"{self.PREFIX}:{self.VERSION}:{scope}:{digest}"
+
+    def _entries_key(self, scope: str) -> str:
+        return f"{self.PREFIX}:{self.VERSION}:{scope}:entries"
+
+    def _stats_key(self, name: str) -> str:
+        return f"{self.PREFIX}:{self.VERSION}:stats:{name}"
+
+    def peek(self, question: str, chat_history: List[Dict], scope: str) -> Optional[str]:
+        """Exact-tier answer, without touching the metrics or the LRU order"""
+        return cache.get(self.key(question, chat_history, scope))
+
+    def get(self, question: str, chat_history: List[Dict], scope: str) -> Optional[str]:
+        """Cached answer to this question or a near-duplicate of it, or None"""
+        with span('answer_cache'):
+            key = self.key(question, chat_history, scope)
+            answer = cache.get(key)
+            if answer is not None:
+                self._touch(scope, key)
+                self._count('exact_hits')
+                return answer
+
+            answer = self._get_similar(question, self.history_key(chat_history), scope)
+            self._count('similar_hits' if answer is not None else 'misses')
+            return answer
+
+    def set(self, question: str, chat_history: List[Dict], scope: str, answer: str):
+        key = self.key(question, chat_history, scope)
+        cache.set(key, answer, timeout=self.timeout)
+        entries = self._live_entries(scope)
+        entries = [entry for entry in entries if entry[2] != key]
+        entries.append([normalize_question(question), self.history_key(chat_history), key, time.time()])
+        self._save_entries(scope, entries)
+
+    async def aget(self, question: str, chat_history: List[Dict], scope: str) -> Optional[str]:
+        return await sync_to_async(self.get)(question, chat_history, scope)
+
+    async def apeek(self, question: str, chat_history: List[Dict], scope: str) -> Optional[str]:
+        return await sync_to_async(self.peek)(question, chat_history, scope)
+
+    async def aset(self, question: str, chat_history: List[Dict], scope: str, answer: str):
+        await sync_to_async(self.set)(question, chat_history, scope, answer)
+
+    def _get_similar(self, question: str, history_key: str, scope: str) -> Optional[str]:
+        if self.threshold > 1:
+            return None
+        normalized = normalize_question(question)
+        words = content_words(normalized)
+        # Rewordings only: a question about anything else is a different question, however similar
+        candidates = [entry for entry in self._live_entries(scope)
+                      if entry[1] == history_key and content_words(entry[0]) == words]
+        if not words or not candidates:
+            return None
+        vectors = self._embed([normalized] + [entry[0] for entry in candidates])
+        scores = vectors[1:] @ vectors[0]
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        answer = cache.get(candidates[best][2])
+        if answer is not None:
+            self._touch(scope, candidates[best][2])
+        return answer
+
+    def _embed(self, questions: List[str]) -> np.ndarray:
+        with self._vectors_lock:
+            missing = [q for q in dict.fromkeys(questions) if q not in self._vectors]
+        if missing:
+            vectors = get_embedder().embed(missing)
+            with self._vectors_lock:
+                for question, vector in zip(missing, vectors):
+                    self._vectors[question] = vector
+                while len(self._vectors) > self.max_entries * 4:
+                    self._vectors.popitem(last=False)
+        with self._vectors_lock:
+            rows = []
+            for question in questions:
+                vector = self._vectors.get(question)
+                if vector is None:  # Evicted by another thread meanwhile
+                    vector = get_embedder().embed([question])[0]
+                else:
+                    self._vectors.move_to_end(question)
+                rows.append(vector)
+        return np.vstack(rows)
+
+    def _live_entries(self, scope: str) -> List[list]:
+        """[normalized question, history key, answer key, stored at] of a scope, least recently used first"""
+        oldest = time.time() - self.timeout
+        return [entry for entry in cache.get(self._entries_key(scope), []) if entry[3] >= oldest]
+
+    def _save_entries(self, scope: str, entries: List[list]):
+        # Concurrent writers may drop each other's updates; a lost entry only costs a cache miss
+        cache.set(self._entries_key(scope), entries[-self.max_entries:], timeout=self.timeout)
+
+    def _touch(self, scope: str, key: str):
+        """Mark an entry as most recently used"""
+        entries = self._live_entries(scope)
+        for position, entry in enumerate(entries):
+            if entry[2] == key:
+                if position != len(entries) - 1:
+                    entries.append(entries.pop(position))
+                    self._save_entries(scope, entries)
+                return
+
+    def _count(self, name: str):
+        self.local_stats[name] += 1
+        cache_result('answers', name != 'misses', {'exact_hits': 'hit', 'similar_hits': 'similar_hit'}.get(name))
+        key = self._stats_key(name)
+        try:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+        except ValueError:  # Evicted between add() and incr()
+            cache.set(key, 1, timeout=None)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit and miss counts of all workers sharing the cache, with the hit rate"""
+        counts = cache.get_many([self._stats_key(name) for name in self.STATS])
+        stats = {name: counts.get(self._stats_key(name), 0) for name in self.STATS}
+        lookups = sum(stats.values())
+        stats['lookups'] = lookups
+        stats['hit_rate'] = round((stats['exact_hits'] + stats['similar_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear_stats(self):
+        cache.delete_many([self._stats_key(name) for name in self.STATS])
+        self.local_stats.clear()
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from .storage import atomic_write, atomic_write_json, file_lock
+
+
+def fingerprint(*parts: str, length: int = 12) -> str:
+    """Short stable hash of prompt or template text, used as its version"""
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:length]
+
+
+class ArtifactStore:
+    """Content-addressed store for everything generated from a PDF
+
+    An artifact key hashes together the artifact kind, the content hash of the
+    source PDF and every parameter that affects the output (prompt version, model
+    name, chunking parameters...). Replacing a PDF or changing a prompt therefore
+    yields new keys, while unchanged artifacts keep theirs across deploys.
+
+    Every stored artifact is recorded in an append-only manifest, which gives a
+    bulk view of what exists without walking the directory tree.
+    """
+    ROOT = 'media/artifacts'
+
+    def __init__(self):
+        os.makedirs(self.ROOT, exist_ok=True)
+
+    def get_manifest_path(self) -> str:
+        return os.path.join(self.ROOT, 'manifest.jsonl')
+
+    def key(self, kind: str, content_hash: str, **params) -> str:
+        description = json.dumps({'kind': kind, 'content': content_hash, 'params': params}, sort_keys=True)
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def path(self, kind: str, key: str, suffix: str = 'json') -> str:
+        """Location of an artifact file; directories are fanned out by key prefix and created by the first write"""
+        return os.path.join(self.ROOT, kind, key[:2], f"{key}.{suffix}")
+
+    def get(self, kind: str, key: str) -> Optional[dict]:
+        path = self.path(kind, key)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def put(self, kind: str, key: str, data, source: str = '', content_hash: str = '',
+            params: Optional[dict] = None, **dump_kwargs):
+        """Write a JSON artifact atomically and record it in the manifest"""
+        path = self.path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write_json(path, data, **dump_kwargs)
+        self.record(kind, key, [path], source, content_hash, params)
+
+    def record(self, kind: str, key: str, files: List[str], source: str = '', content_hash: str = '',
+               params: Optional[dict] = None):
+        """Add a manifest entry for artifact files written by the caller"""
+        entry = {
+            'key': key,
+            'kind': kind,
+            'source': source,
+            'content_hash': content_hash,
+            'params': params or {},
+            'files': [os.path.relpath(path, self.ROOT) for path in files],
+            'created_at': str(datetime.now()),
+        }
+        line = json.dumps(entry, ensure_ascii=False, sort_keys=True) + '\n'
+        with file_lock(self.get_manifest_path()):
+            with open(self.get_manifest_path(), 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def manifest(self) -> Dict[str, dict]:
+        """All recorded artifacts, keyed by artifact key; the latest record wins"""
+        entries = {}
+        if os.path.exists(self.get_manifest_path()):
+            with open(self.get_manifest_path(), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries[entry['key']] = entry
+        return entries
+
+    def lookup(self, source: str) -> List[dict]:
+        """Manifest entries generated from one session PDF"""
+        return [entry for entry in self.manifest().values() if entry['source'] == source]
+
+    def collect_garbage(self, reachable: Iterable[str], dry_run: bool = False,
+                        started: Optional[float] = None) -> List[str]:
+        """Delete artifact files whose key is not reachable and rewrite the manifest without them
+
+        Writers do not take the manifest lock, so files modified since started
+        (when the reachable keys began to be computed; now by default) are kept:
+        they may be artifacts that the reachable keys do not know of yet.
+        """
+        started = time.time() if started is None else started
+        reachable = set(reachable)
+        removed = []
+        with file_lock(self.get_manifest_path()):
+            for directory, _, files in os.walk(self.ROOT):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    # Skip the manifest and writes still in progress
+                    if path == self.get_manifest_path() or name.startswith('.tmp-'):
+                        continue
+                    key = name.split('.', 1)[0]
+                    if key in reachable:
+                        continue
+                    try:
+                        if os.stat(path).st_mtime >= started:
+                            reachable.add(key)
+                            continue
+                        if not dry_run:
+                            os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                    removed.append(path)
+
+            if not dry_run:
+                kept = [entry for key, entry in self.manifest().items() if key in reachable]
+                with atomic_write(self.get_manifest_path()) as f:
+                    for entry in kept:
+                        f.write(json.dumps(entry, ensure_ascii=False, sort_keys=True) + '\n')
+        return removed
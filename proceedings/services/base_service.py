@@ -1,27 +1,207 @@
 import os
 import json
+import hashlib
+import itertools
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-import genai
+from .llm_client import get_llm_client
+from .artifact_store import ArtifactStore, fingerprint
+from .pdf_processor import PDFTextStore, iter_split
+from .memory_cache import JSONFileCache
+from .metrics import cache_result, counted_lookup
+from .registry import get_service
+from .storage import async_single_flight, single_flight
 
 class BaseService:
-    def __init__(self, cache_dir):
-        self.CACHE_DIR = cache_dir
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
+    ARTIFACT_KIND = None    # Defaults to the lowercased class name
+    PROMPT = MAP_PROMPT = REDUCE_PROMPT = ''
+    SECTION_SIZE = 24000    # Characters of transcript per map step
+    SECTION_OVERLAP = 200
+    # Filename-keyed cache of this output from before the artifact store ({filename}, {base} without .pdf),
+    # and the fingerprint of PROMPT and the model it was generated with
+    LEGACY_CACHE = None
+    LEGACY_PROMPT = None
+    LEGACY_MODEL = 'gemini-pro'
+
+    def __init__(self):
+        self.artifacts = ArtifactStore()
+        self.text_store = PDFTextStore()
+        # Shared client: no per-service configure() or model construction
+        self.llm = get_llm_client()
+
+    @property
+    def model(self):
+        return self.llm.model
+
+    def get_pdf_path(self, filename):
+        return os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename)
+
+    def get_artifact_kind(self):
+        return self.ARTIFACT_KIND or self.__class__.__name__.lower()
+
+    def artifact_params(self):
+        """Everything besides the PDF bytes that affects the generated output"""
+        return {
+            'model': self.llm.model_name,
+            'prompt': fingerprint(self.PROMPT, self.MAP_PROMPT, self.REDUCE_PROMPT),
+            'sections': [self.SECTION_SIZE, self.SECTION_OVERLAP],
+            'text': self.text_store.artifact_params(),
+        }
+
+    def artifact_key(self, filename):
+        content_hash = self.text_store.content_hash(self.get_pdf_path(filename))
+        return self.artifacts.key(self.get_artifact_kind(), content_hash, **self.artifact_params())
 
     def get_cache_path(self, filename):
-        base = os.path.splitext(filename)[0]
-        return os.path.join(self.CACHE_DIR, f"{base}_{self.__class__.__name__.lower()}.json")
+        return self.artifacts.path(self.get_artifact_kind(), self.artifact_key(filename))
 
     def get_cached_data(self, filename):
-        cache_path = self.get_cache_path(filename)
-        if os.path.exists(cache_path):
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        data = self._read_cached_data(filename)
+        cache_result(self.get_artifact_kind(), data is not None)
+        return data
+
+    def _read_cached_data(self, filename):
+        # Served from memory while the file is unchanged; an error stored by older code counts as missing
+        data = get_service(JSONFileCache).get(self.get_cache_path(filename))
+        return data if data is None or self.usable(data) else None
 
     def cache_data(self, filename, data):
-        cache_path = self.get_cache_path(filename)
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2) 
\ No newline at end of file
+        self.artifacts.put(self.get_artifact_kind(), self.artifact_key(filename), data,
+                           source=filename,
+                           content_hash=self.text_store.content_hash(self.get_pdf_path(filename)),
+                           params=self.artifact_params(), indent=2)
+
+    def get_legacy_cache_path(self, filename):
+        if self.LEGACY_CACHE is None:
+            return None
+        return self.LEGACY_CACHE.format(filename=filename, base=os.path.splitext(filename)[0])
+
+    def usable(self, data):
+        """Whether generated or cached output is a real result, not a stored error"""
+        return True
+
+    def read_legacy(self, filename):
+        """The old filename-keyed output of a session, if it is still valid
+
+        It is valid when the prompt and model are those it was generated with
+        and the PDF has not changed since: the cache file is newer than the
+        PDF. Returns None otherwise.
+        """
+        legacy_path = self.get_legacy_cache_path(filename)
+        pdf_path = self.get_pdf_path(filename)
+        if (legacy_path is None or not os.path.isfile(legacy_path) or not os.path.isfile(pdf_path)
+                or fingerprint(self.PROMPT) != self.LEGACY_PROMPT or self.llm.model_name != self.LEGACY_MODEL
+                or os.path.getmtime(legacy_path) < os.path.getmtime(pdf_path)):
+            return None
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading legacy cache {legacy_path}: {e}")
+            return None
+        if not isinstance(data, dict) or not self.usable(data):
+            return None
+        return data
+
+    def import_legacy(self, filename):
+        """Store the still valid old output of a session under its artifact key; returns it, or None"""
+        data = self.read_legacy(filename)
+        if data is not None:
+            self.cache_data(filename, data)
+        return data
+
+    def single_flight(self, key, lookup, generate):
+        """Run generate() once per key across threads and processes; other callers wait for its result"""
+        return single_flight(key, lookup, generate)
+
+    async def async_single_flight(self, key, lookup, generate):
+        """Coroutine version of single_flight for callers running on an event loop"""
+        return await async_single_flight(key, lookup, generate)
+
+    def get_or_generate(self, filename, generate):
+        """Get cached data or generate and cache it, with one generation per file at a time"""
+        def generate_and_cache():
+            # Output cached before the artifact store existed is reused instead of paying for it again
+            data = self.import_legacy(filename)
+            if data is not None:
+                return data
+            data = generate()
+            # Keys are content-addressed: a stored error would be served until the PDF or prompt changes
+            if not self.usable(data):
+                raise ValueError(f"Not caching an error result for {filename}")
+            self.cache_data(filename, data)
+            return data
+
+        lookup = counted_lookup(self.get_artifact_kind(), lambda: self._read_cached_data(filename))
+        return self.single_flight(self.get_cache_path(filename), lookup, generate_and_cache)
+
+    def map_reduce(self, text, direct_prompt, map_prompt, reduce_prompt):
+        """Run a prompt over a whole transcript, however long
+
+        text is a string or an iterable of page texts, which is consumed as a
+        stream. Text that fits in one section goes straight to direct_prompt.
+        Longer text is split into sections that are processed concurrently with
+        map_prompt, and the partial results are combined with reduce_prompt. At
+        most a few sections per worker are held in memory at once. Each section
+        result is cached under its text and map prompt, so changing only the
+        reduce prompt re-runs only the reduce step. Returns None for empty text.
+        """
+        sections = self.iter_sections(text)
+        first, second = next(sections, None), next(sections, None)
+        if first is None:
+            return None
+        if second is None:
+            return self.llm.generate(direct_prompt.format(text=first))
+
+        workers = getattr(settings, 'AGORA_MAP_CONCURRENCY', 8)
+        partials, pending = [], deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for section in itertools.chain([first, second], sections):
+                pending.append(pool.submit(self._map_section, section, map_prompt))
+                # Keep reading the transcript only as fast as the sections are mapped
+                if len(pending) >= 2 * workers:
+                    partials.append(pending.popleft().result())
+            partials.extend(future.result() for future in pending)
+
+        combined = "\n\n".join(
+            f"--- Section {number} of {len(partials)} ---\n{partial}"
+            for number, partial in enumerate(partials, start=1)
+        )
+        return self.llm.generate(reduce_prompt.format(text=combined))
+
+    def iter_sections(self, text):
+        """Split a string or a stream of page texts into map sections"""
+        pieces = [text] if isinstance(text, str) else text
+        return (section for start, section in iter_split(pieces, self.SECTION_SIZE, self.SECTION_OVERLAP, min_size=0))
+
+    def section_key(self, section, map_prompt):
+        section_hash = hashlib.sha256(section.encode('utf-8')).hexdigest()
+        return self.artifacts.key('section', section_hash, model=self.llm.model_name,
+                                  prompt=fingerprint(map_prompt))
+
+    def section_keys(self, text):
+        """Keys of the cached map results a transcript of this text (string or page stream) uses"""
+        keys = [self.section_key(section, self.MAP_PROMPT) for section in self.iter_sections(text)]
+        return keys if len(keys) > 1 else []
+
+    def _map_section(self, section, map_prompt):
+        """Map one section, reusing the cached result for identical text, prompt and model"""
+        key = self.section_key(section, map_prompt)
+        cache_path = self.artifacts.path('section', key)
+
+        def lookup():
+            if os.path.exists(cache_path):
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)['result']
+            return None
+
+        def generate():
+            result = self.llm.generate(map_prompt.format(text=section))
+            self.artifacts.put('section', key, {'result': result, 'generated_at': str(datetime.now())},
+                               content_hash=hashlib.sha256(section.encode('utf-8')).hexdigest(),
+                               params={'model': self.llm.model_name, 'prompt': fingerprint(map_prompt)})
+            return result
+
+        return self.single_flight(cache_path, counted_lookup('section', lookup), generate)
@@ -0,0 +1,214 @@
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List
+
+from django.conf import settings
+
+from .answer_cache import AnswerCache
+from .base_service import BaseService
+from .context_packer import estimate_tokens
+from .llm_backends import ThrottledError
+from .metrics import span
+from .qa_service import QAService
+from .rate_limiter import INTERACTIVE
+from .registry import get_service
+
+# Header of each session's passages in a batched prompt, and of its answer in the reply
+SESSION_HEADER = '=== ΣΥΝΕΔΡΙΑ {number} ==='
+ANSWER_HEADER = re.compile(r'^[#*\s]*=+\s*ΣΥΝΕΔΡΙΑ\s+(\d+)\s*=+[*\s]*$', re.MULTILINE)
+
+
+def split_answers(text: str, count: int) -> Dict[int, str]:
+    """Answers of a batched reply by session number (1-based); sessions it left out are missing"""
+    answers = {}
+    headers = list(ANSWER_HEADER.finditer(text))
+    for position, header in enumerate(headers):
+        number = int(header.group(1))
+        end = headers[position + 1].start() if position + 1 < len(headers) else len(text)
+        answer = text[header.end():end].strip()
+        if 1 <= number <= count and answer and number not in answers:
+            answers[number] = answer
+    return answers
+
+
+class BatchQAService(BaseService):
+    """Answer one question over many sessions, with fewer model calls than one per session
+
+    Cached answers come back first. For the other sessions, retrieval runs
+    concurrently in a thread pool, and each session's passages are packed into
+    the same budget a single-session question gets. Sessions are then grouped,
+    in the order their retrieval finishes, into prompts of at most
+    AGORA_QA_BATCH_TOKENS tokens and AGORA_QA_BATCH_SESSIONS sessions, which
+    the model answers under numbered headers. A group's model call starts as
+    soon as the group is full, so generation overlaps the remaining
+    retrieval. A session on its own gets exactly the single-session prompt,
+    and a session left out of a batched reply is asked again on its own.
+    Every answer is stored in the Q&A answer cache under the key a
+    single-session question uses, so either endpoint reuses it.
+    """
+
+    @property
+    def qa(self) -> QAService:
+        # Not looked up in __init__: get_service holds the registry lock while constructing
+        return get_service(QAService)
+
+    @property
+    def answers(self):
+        return self.qa.answers
+
+    @property
+    def packer(self):
+        return self.qa.packer
+
+    def format_prompt(self, question: str, contexts: List[str], formatted_history: str) -> str:
+        sessions = '\n\n'.join(f"{SESSION_HEADER.format(number=number)}\n{context}"
+                               for number, context in enumerate(contexts, start=1))
+        prompt = f"""
+        Είσαι ένας βοηθός που βοηθά τους χρήστες να κατανοήσουν τα πρακτικά των συνεδριάσεων της Βουλής των Αντιπροσώπων της Κύπρου.
+
+        Παρακάτω υπάρχουν αποσπάσματα από {len(contexts)} διαφορετικές συνεδριάσεις. Απάντησε στην ίδια ερώτηση για κάθε συνεδρίαση χωριστά.
+
+        Οδηγίες:
+        1. Για κάθε συνεδρίαση χρησιμοποίησε μόνο τις πληροφορίες από τα δικά της αποσπάσματα
+        2. Ξεκίνα την απάντηση κάθε συνεδρίασης με τη γραμμή "{SESSION_HEADER.format(number='N')}", όπου N ο αριθμός της, και απάντησε για όλες με τη σειρά
+        3. Αν η πληροφορία δεν υπάρχει στα αποσπάσματα μιας συνεδρίασης, απάντησε για αυτή "Δεν μπορώ να βρω αυτή την πληροφορία στα πρακτικά της συνεδρίασης"
+        4. Απάντησε στα Ελληνικά με σαφή και κατανοητό τρόπο
+        5. Αν χρειάζεται να αναφέρεις αριθμούς ή ημερομηνίες, γράψε τους με ακρίβεια
+        6. Αν αναφέρεσαι σε βουλευτές, χρησιμοποίησε το πλήρες όνομα και την ιδιότητά τους
+
+        Σχετικό κείμενο από τις συνεδριάσεις:
+        {sessions}
+
+        Προηγούμενη συζήτηση:
+        {formatted_history}
+
+        Ερώτηση: {question}
+
+        Απάντηση:
+        """
+        return prompt
+
+    def _prepare(self, question: str, chat_history: List[Dict], filename: str, budget: int) -> Dict:
+        """A session's cached answer, or its packed passages; runs in the retrieval pool"""
+        try:
+            scope = self.qa.cache_scope(filename)
+            cached = self.answers.get(question, chat_history, scope)
+            if cached is not None:
+                return {'filename': filename, 'status': 'success', 'answer': cached, 'cached': True}
+            if not self.qa.chunk_manager.chunk_exists(filename):
+                # Chunking a whole transcript is left to the workers; the caller queues it
+                return {'filename': filename, 'status': 'pending'}
+            chunks, ranked, turns = self.qa.retrieve(question, filename)
+            context = self.packer.pack_passages(chunks, ranked, budget, turns, self.qa.chunk_manager.OVERLAP)
+            return {'filename': filename, 'scope': scope, 'context': context}
+        except Exception as e:
+            print(f"Error preparing {filename} for batch Q&A: {e}")
+            return {'filename': filename, 'status': 'error', 'error': str(e)}
+
+    async def _answer_group(self, question: str, chat_history: List[Dict], formatted_history: str,
+                            group: List[Dict]) -> List[Dict]:
+        """Answer a group of prepared sessions with one model call and cache each answer"""
+        try:
+            if len(group) == 1:
+                answers = {1: await self._answer_one(question, chat_history, formatted_history, group[0])}
+            else:
+                prompt = self.format_prompt(question, [item['context'] for item in group], formatted_history)
+                answers = split_answers(await self.llm.agenerate(prompt, INTERACTIVE), len(group))
+                for number, answer in answers.items():
+                    await self.answers.aset(question, chat_history, group[number - 1]['scope'], answer)
+                missing = [number for number in range(1, len(group) + 1) if number not in answers]
+                retried = await asyncio.gather(*(
+                    self._answer_one(question, chat_history, formatted_history, group[number - 1])
+                    for number in missing))
+                answers.update(zip(missing, retried))
+        except ThrottledError:
+            return [{'filename': item['filename'], 'status': 'busy'} for item in group]
+        except Exception as e:
+            print(f"Error in batch Q&A: {e}")
+            return [{'filename': item['filename'], 'status': 'error', 'error': str(e)} for item in group]
+
+        return [{'filename': item['filename'], 'status': 'success', 'answer': answers[number],
+                 'cached': False, 'batch_size': len(group)}
+                for number, item in enumerate(group, start=1)]
+
+    async def _answer_one(self, question: str, chat_history: List[Dict], formatted_history: str,
+                          item: Dict) -> str:
+        """One session with the single-session prompt, shared with concurrent askers of the same question"""
+        async def lookup():
+            return await self.answers.apeek(question, chat_history, item['scope'])
+
+        async def generate():
+            answer = await self.llm.agenerate(
+                self.qa.format_prompt(question, item['context'], formatted_history), INTERACTIVE)
+            await self.answers.aset(question, chat_history, item['scope'], answer)
+            return answer
+
+        return await self.async_single_flight(self.answers.key(question, chat_history, item['scope']),
+                                              lookup, generate)
+
+    async def astream(self, question: str, chat_history: List[Dict], filenames: List[str]) -> AsyncIterator[Dict]:
+        """Yield one result per session as it completes
+
+        A result has the session's filename and a status: 'success' with the
+        answer, 'pending' while its chunks are not ready, 'busy' when the model
+        provider keeps throttling, or 'error'.
+        """
+        max_tokens = getattr(settings, 'AGORA_QA_BATCH_TOKENS', 12000)
+        max_sessions = getattr(settings, 'AGORA_QA_BATCH_SESSIONS', 4)
+
+        # The history is packed once and shared; each session's passages get what a single prompt leaves them
+        reserved = estimate_tokens(self.qa.format_prompt(question, '', ''))
+        available = max(self.packer.budget - reserved, 0)
+        formatted_history, history_tokens = self.packer.pack_history(
+            chat_history[-AnswerCache.HISTORY_TURNS:], int(available * self.packer.HISTORY_SHARE))
+        budget = available - history_tokens
+        # What a batched prompt has left for passages after its instructions, history and question
+        room = max_tokens - estimate_tokens(self.format_prompt(question, [], formatted_history))
+
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=getattr(settings, 'AGORA_QA_BATCH_CONCURRENCY', 8))
+        results = asyncio.Queue()
+
+        async def answer(group):
+            for result in await self._answer_group(question, chat_history, formatted_history, group):
+                results.put_nowait(result)
+
+        async def run():
+            groups, group, used = [], [], 0
+            try:
+                with span('batch_retrieval'):
+                    prepared = [loop.run_in_executor(pool, self._prepare, question, chat_history, filename, budget)
+                                for filename in filenames]
+                    for next_prepared in asyncio.as_completed(prepared):
+                        item = await next_prepared
+                        if 'context' not in item:
+                            results.put_nowait(item)
+                            continue
+                        # Header line and separating blank line of the session in the prompt
+                        tokens = estimate_tokens(item['context']) + 8
+                        if group and (used + tokens > room or len(group) >= max_sessions):
+                            groups.append(asyncio.create_task(answer(group)))
+                            group, used = [], 0
+                        group.append(item)
+                        used += tokens
+                if group:
+                    groups.append(asyncio.create_task(answer(group)))
+                await asyncio.gather(*groups)
+            finally:
+                for task in groups:
+                    task.cancel()
+                results.put_nowait(None)
+
+        runner = asyncio.create_task(run())
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                yield result
+            await runner
+        finally:
+            runner.cancel()
+            # Do not wait for retrievals still running when the client goes away
+            pool.shutdown(wait=False, cancel_futures=True)
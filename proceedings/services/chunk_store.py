@@ -0,0 +1,45 @@
+from collections.abc import Sequence
+from typing import List
+
+import numpy as np
+
+from .packed import PackedFile, write_packed
+
+
+class ChunkTable(Sequence):
+    """Chunk texts of a session, sliced out of one memory-mapped UTF-8 blob on access
+
+    The file holds the blob, the byte offset of every chunk in it and the page
+    each chunk starts on. Opening it reads only the header and the page list;
+    a chunk's text is decoded when it is used.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, packed: PackedFile):
+        self.offsets = packed.array('offsets')      # chunk_id -> byte offset; one extra for the end
+        self.pages = packed.array('pages').tolist()  # chunk_id -> page the chunk starts on; [] if unknown
+        self._text = packed.blob('text')
+
+    @staticmethod
+    def write(path: str, chunks: List[str], pages: List[int]):
+        encoded = [chunk.encode('utf-8') for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum(np.array([len(chunk) for chunk in encoded], dtype=np.uint64), out=offsets[1:])
+        write_packed(path, {
+            'offsets': offsets,
+            'pages': np.array(pages or [], dtype=np.uint32),
+            'text': b''.join(encoded),
+        }, format=ChunkTable.FORMAT_VERSION)
+
+    @classmethod
+    def open(cls, path: str) -> 'ChunkTable':
+        return cls(PackedFile(path))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, chunk_id):
+        if isinstance(chunk_id, slice):
+            return [self[i] for i in range(*chunk_id.indices(len(self)))]
+        chunk_id = range(len(self))[chunk_id]
+        return str(self._text[int(self.offsets[chunk_id]):int(self.offsets[chunk_id + 1])], 'utf-8')
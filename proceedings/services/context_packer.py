@@ -0,0 +1,105 @@
+import re
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+# "[NAME (PARTY)] " prefix of a chunk that continues a speaker's turn
+LABEL_PATTERN = re.compile(r'^\[[^\]\n]{1,80}\] ')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough model token count of a text, without calling a tokenizer"""
+    return math.ceil(len(text) / ContextPacker.CHARS_PER_TOKEN)
+
+
+def merge_overlapping(previous: str, following: str, max_overlap: int, min_overlap: int = 20) -> str:
+    """Join two consecutive chunks, writing the text they share only once"""
+    body = LABEL_PATTERN.sub('', following, count=1)
+    for length in range(min(len(previous), len(body), max_overlap), min_overlap - 1, -1):
+        if previous.endswith(body[:length]):
+            return previous + body[length:]
+    return previous + '\n' + body
+
+
+class ContextPacker:
+    """Fit retrieved passages and the chat history into a prompt token budget
+
+    Passages are taken in order of relevance while they fit. Chunks that are
+    neighbours in the transcript are merged so their overlap appears once, and
+    chunks already contained in a longer passage (e.g. a speaker's turn) are
+    dropped. The history gets at most HISTORY_SHARE of the budget, newest
+    messages first; what it leaves unused goes to the passages.
+    """
+    CHARS_PER_TOKEN = 3     # Conservative for Greek, which tokenizes into short pieces
+    HISTORY_SHARE = 0.25
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget or getattr(settings, 'AGORA_QA_CONTEXT_TOKENS', 3000)
+
+    def pack_history(self, messages: Sequence[Dict], budget: int) -> Tuple[str, int]:
+        """Format the newest messages that fit in budget tokens; returns the text and the tokens used"""
+        lines, used = [], 0
+        for msg in reversed(messages):
+            line = f"{'Χρήστης' if msg['role'] == 'user' else 'Βοηθός'}: {msg['content']}"
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                if not lines:
+                    # Keep the end of an overlong last message, which is what a follow-up refers to
+                    keep = max(0, (budget - 1) * self.CHARS_PER_TOKEN)
+                    if keep:
+                        lines.append('…' + line[-keep:])
+                        used = budget
+                break
+            lines.append(line)
+            used += cost
+        return '\n'.join(reversed(lines)), used
+
+    def pack_passages(self, chunks: List[str], ranked: Iterable[int], budget: int,
+                      extra: Sequence[str] = (), overlap: int = 0) -> str:
+        """Pack extra passages, then ranked chunk ids, into budget tokens, in transcript order"""
+        limit = budget * self.CHARS_PER_TOKEN
+        passages, used = [], 0
+        for passage in extra:
+            if used + len(passage) > limit:
+                if passages:
+                    continue
+                passage = passage[:limit]
+            passages.append(passage)
+            used += len(passage) + 1
+
+        selected = set()
+        for chunk_id in ranked:
+            body = LABEL_PATTERN.sub('', chunks[chunk_id], count=1)
+            if any(body in passage for passage in passages):
+                continue
+            # A neighbour already in the context makes the shared overlap free
+            cost = len(chunks[chunk_id]) + 1
+            if chunk_id - 1 in selected or chunk_id + 1 in selected:
+                cost -= overlap
+            if used + cost > limit:
+                if passages or selected:
+                    continue
+                # Never answer from an empty context: cut the best chunk down to the budget
+                passages.append(chunks[chunk_id][:limit])
+                used = limit
+                continue
+            selected.add(chunk_id)
+            used += cost
+
+        # Runs of consecutive chunks become one passage
+        blocks = []
+        for chunk_id in sorted(selected):
+            if blocks and chunk_id - 1 in selected:
+                blocks[-1] = merge_overlapping(blocks[-1], chunks[chunk_id], max(overlap * 2, 20))
+            else:
+                blocks.append(chunks[chunk_id])
+        return '\n'.join(passages + blocks)
+
+    def pack(self, chunks: List[str], ranked: Iterable[int], chat_history: Sequence[Dict],
+             reserved: int = 0, extra: Sequence[str] = (), overlap: int = 0) -> Tuple[str, str]:
+        """(context, history) fitting the budget, less the reserved tokens of the rest of the prompt"""
+        available = max(self.budget - reserved, 0)
+        history, used = self.pack_history(chat_history, int(available * self.HISTORY_SHARE))
+        context = self.pack_passages(chunks, ranked, available - used, extra, overlap)
+        return context, history
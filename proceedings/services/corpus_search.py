@@ -0,0 +1,234 @@
+import os
+import json
+import heapq
+import zlib
+from datetime import datetime
+from typing import Dict, List
+
+from django.conf import settings
+
+from .qa_service import PDFChunkManager
+from .registry import get_service
+from .search_index import InvertedIndex, tokenize, bm25, bm25_idf
+from .storage import atomic_write_json, file_lock
+
+
+def queue_chunks(filename: str):
+    """Have the workers chunk a session; its indexes are merged when they are done"""
+    from .job_queue import JobQueue  # job_queue imports the indexes, to sync them after chunking
+    from ..models import GenerationJob
+    get_service(JobQueue).enqueue(GenerationJob.KIND_CHUNKS, filename)
+
+
+class CorpusIndex:
+    """Global BM25 index over the chunks of every session, sharded by term"""
+    CACHE_DIR = 'media/search'
+    SHARD_COUNT = 32
+    COMMON_TERM_RATIO = 0.5  # Terms found in more chunks than this are skipped if rarer ones exist
+
+    # Shards and manifest loaded by this process, keyed by path
+    _loaded = {}
+
+    def __init__(self):
+        self.chunk_manager = PDFChunkManager()
+        os.makedirs(self.CACHE_DIR, exist_ok=True)
+
+    def get_manifest_path(self) -> str:
+        return os.path.join(self.CACHE_DIR, 'manifest.json')
+
+    def get_shard_path(self, shard: int) -> str:
+        return os.path.join(self.CACHE_DIR, f"shard_{shard:02d}.json")
+
+    def shard_for(self, term: str) -> int:
+        """Stable shard number for a term, identical across processes"""
+        return zlib.crc32(term.encode('utf-8')) % self.SHARD_COUNT
+
+    def _read(self, path: str, default):
+        """Read a JSON file once per process, reloading it only when it changes"""
+        if not os.path.exists(path):
+            return default
+        mtime = os.stat(path).st_mtime_ns
+        loaded = self._loaded.get(path)
+        if loaded is not None and loaded[0] == mtime:
+            return loaded[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self._loaded[path] = (mtime, data)
+        return data
+
+    def _write(self, path: str, data):
+        atomic_write_json(path, data, separators=(',', ':'))
+        self._loaded[path] = (os.stat(path).st_mtime_ns, data)
+
+    def load_manifest(self) -> dict:
+        return self._read(self.get_manifest_path(), {
+            'sessions': {},       # filename -> {'id', 'chunks', 'length', 'size', 'mtime'}
+            'pending': {},        # filename -> {'size', 'mtime', 'status'}: 'chunking' or 'failed'
+            'next_id': 0,
+            'total_chunks': 0,
+            'total_length': 0,
+            'pdf_dir_mtime': None,
+        })
+
+    def load_shard(self, shard: int) -> Dict[str, List[List[int]]]:
+        # term -> [[session_id, chunk_id, term_frequency, chunk_length], ...]
+        return self._read(self.get_shard_path(shard), {})
+
+    def sync(self, force: bool = False, build: bool = False) -> int:
+        """Add new or replaced PDFs and drop deleted ones; a no-op while the PDF directory is unchanged
+
+        Only sessions whose chunks exist are merged. The others are queued for
+        chunking once and recorded as pending, as are those that failed to
+        index; with build=True (offline commands) they are chunked here instead.
+        The directory is marked as indexed either way, so requests do not rescan
+        it: the workers catch up with force=True when a chunking job is done.
+        """
+        pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
+        if not os.path.isdir(pdf_dir):
+            return 0
+
+        dir_mtime = os.stat(pdf_dir).st_mtime_ns
+        if not force and self.load_manifest()['pdf_dir_mtime'] == dir_mtime:
+            return 0
+
+        # One writer at a time; the others re-read the manifest it leaves behind
+        with file_lock('corpus-index'):
+            return self._sync(pdf_dir, dir_mtime, force, build)
+
+    def _sync(self, pdf_dir: str, dir_mtime: int, force: bool, build: bool) -> int:
+        manifest = self.load_manifest()
+        if not force and manifest['pdf_dir_mtime'] == dir_mtime:
+            return 0
+
+        present = {}
+        for filename in os.listdir(pdf_dir):
+            if filename.endswith('.pdf'):
+                stat = os.stat(os.path.join(pdf_dir, filename))
+                present[filename] = (stat.st_size, stat.st_mtime_ns)
+
+        indexed = manifest['sessions']
+        pending = {name: entry for name, entry in manifest.get('pending', {}).items() if name in present}
+        removed = [name for name in indexed if name not in present]
+        added = {}
+        for filename, (size, mtime) in sorted(present.items()):
+            entry = indexed.get(filename)
+            if entry is not None and entry['size'] == size and entry['mtime'] == mtime:
+                continue
+            waiting = pending.get(filename)
+            unchanged = waiting is not None and waiting['size'] == size and waiting['mtime'] == mtime
+            # Only a worker's sync (force) looks at a pending session again, not every request
+            if unchanged and not force and not build:
+                continue
+            pdf_path = os.path.join(pdf_dir, filename)
+            try:
+                # Chunks are keyed by content hash, so a replaced PDF gets new ones
+                if build:
+                    self.chunk_manager.ensure_chunks(pdf_path, filename)
+                elif not self.chunk_manager.chunk_exists(filename):
+                    if not (unchanged and waiting['status'] == 'chunking'):
+                        queue_chunks(filename)
+                    pending[filename] = {'size': size, 'mtime': mtime, 'status': 'chunking'}
+                    continue
+                # Postings are copied out of the map, which is closed before the next session is read
+                index = self.chunk_manager.load(filename, cache=False)[1].detach()
+            except Exception as e:
+                print(f"Error indexing {filename}: {e}")
+                pending[filename] = {'size': size, 'mtime': mtime, 'status': 'failed'}
+                continue
+            pending.pop(filename, None)
+            added[filename] = (index, size, mtime)
+
+        if added or removed:
+            self._apply(manifest, added, removed)
+        manifest['pending'] = pending
+        manifest['pdf_dir_mtime'] = dir_mtime
+        self._write(self.get_manifest_path(), manifest)
+        return len(added) + len(removed)
+
+    def _apply(self, manifest: dict, added: Dict[str, tuple], removed: List[str]):
+        """Merge the postings of added sessions into the shards, dropping replaced or removed ones"""
+        sessions = manifest['sessions']
+        stale_ids = set()
+        for filename in list(removed) + [name for name in added if name in sessions]:
+            entry = sessions.pop(filename)
+            stale_ids.add(entry['id'])
+            manifest['total_chunks'] -= entry['chunks']
+            manifest['total_length'] -= entry['length']
+
+        new_postings = {}
+        for filename, (index, size, mtime) in added.items():
+            session_id = manifest['next_id']
+            manifest['next_id'] += 1
+            sessions[filename] = {
+                'id': session_id,
+                'chunks': len(index.lengths),
+                'length': sum(index.lengths),
+                'size': size,
+                'mtime': mtime,
+                'indexed_at': str(datetime.now()),
+            }
+            manifest['total_chunks'] += len(index.lengths)
+            manifest['total_length'] += sum(index.lengths)
+            for term, docs in index.postings.items():
+                shard_postings = new_postings.setdefault(self.shard_for(term), {})
+                shard_postings.setdefault(term, []).extend(
+                    [session_id, chunk_id, freq, index.lengths[chunk_id]] for chunk_id, freq in docs
+                )
+
+        shards = range(self.SHARD_COUNT) if stale_ids else sorted(new_postings)
+        for shard in shards:
+            postings = dict(self.load_shard(shard))
+            if stale_ids:
+                postings = {
+                    term: kept for term, kept in (
+                        (term, [p for p in docs if p[0] not in stale_ids]) for term, docs in postings.items()
+                    ) if kept
+                }
+            for term, docs in new_postings.get(shard, {}).items():
+                postings[term] = postings.get(term, []) + docs
+            self._write(self.get_shard_path(shard), postings)
+
+    def search(self, query: str, k: int = 10) -> List[dict]:
+        """Rank chunks across all sessions with BM25 and return the top k with session and page references"""
+        manifest = self.load_manifest()
+        total = manifest['total_chunks']
+        if not total:
+            return []
+        avg_length = manifest['total_length'] / total
+        names = {entry['id']: filename for filename, entry in manifest['sessions'].items()}
+
+        term_postings = []
+        for term in set(tokenize(query)):
+            docs = self.load_shard(self.shard_for(term)).get(term)
+            if docs:
+                term_postings.append(docs)
+        # Very common terms add little to BM25 but dominate the work, so skip them when possible
+        rare = [docs for docs in term_postings if len(docs) <= total * self.COMMON_TERM_RATIO]
+        if rare:
+            term_postings = rare
+
+        scores = {}
+        for docs in term_postings:
+            idf = bm25_idf(total, len(docs))
+            for session_id, chunk_id, freq, length in docs:
+                key = (session_id, chunk_id)
+                scores[key] = scores.get(key, 0.0) + bm25(
+                    idf, freq, length, avg_length, InvertedIndex.K1, InvertedIndex.B)
+
+        results = []
+        for (session_id, chunk_id), score in heapq.nlargest(k, scores.items(), key=lambda item: item[1]):
+            filename = names.get(session_id)
+            if filename is None:
+                continue
+            # Only the sessions in the top k are ever opened
+            chunks, index = self.chunk_manager.load(filename)
+            results.append({
+                'session': filename,
+                'title': filename.replace('.pdf', ''),
+                'chunk': chunk_id,
+                'page': index.pages[chunk_id] if chunk_id < len(index.pages) else None,
+                'score': round(score, 4),
+                'text': chunks[chunk_id],
+                'url': f'/media/pdf_documents/{filename}',
+            })
+        return results
@@ -0,0 +1,102 @@
+from typing import List
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+import PyPDF2
+
+
+class PyPDF2Extractor:
+    """Pure-Python extraction with PyPDF2; always available"""
+    name = 'pypdf2'
+    BATCH = 100  # Pages parsed per PdfReader instance
+
+    def page_count(self, pdf_path: str) -> int:
+        with open(pdf_path, 'rb') as f:
+            return len(PyPDF2.PdfReader(f).pages)
+
+    def extract_range(self, pdf_path: str, first: int, last: int) -> List[str]:
+        """Raw text of pages first..last-1 (zero-based)
+
+        The reader is reopened every BATCH pages, which releases the PDF objects
+        it has parsed so far and keeps memory flat on very long ranges.
+        """
+        texts = []
+        with open(pdf_path, 'rb') as f:
+            for batch_start in range(first, last, self.BATCH):
+                f.seek(0)
+                reader = PyPDF2.PdfReader(f)
+                for number in range(batch_start, min(batch_start + self.BATCH, last)):
+                    texts.append(reader.pages[number].extract_text() or '')
+                del reader
+        return texts
+
+
+class PdfiumExtractor:
+    """PDFium through the pypdfium2 bindings: native code, several times faster than PyPDF2"""
+    name = 'pypdfium2'
+
+    def __init__(self):
+        import pypdfium2  # Optional dependency, only needed when this extractor is chosen
+        self.pdfium = pypdfium2
+
+    def page_count(self, pdf_path: str) -> int:
+        document = self.pdfium.PdfDocument(pdf_path)
+        try:
+            return len(document)
+        finally:
+            document.close()
+
+    def extract_range(self, pdf_path: str, first: int, last: int) -> List[str]:
+        document = self.pdfium.PdfDocument(pdf_path)
+        texts = []
+        try:
+            for number in range(first, last):
+                page = document[number]
+                text_page = page.get_textpage()
+                texts.append(text_page.get_text_range())
+                text_page.close()
+                page.close()
+        finally:
+            document.close()
+        # PDFium ends lines with \r\n
+        return [text.replace('\r\n', '\n') for text in texts]
+
+
+class PdfminerExtractor:
+    """pdfminer.six layout analysis: slower, but keeps reading order on multi-column pages"""
+    name = 'pdfminer'
+
+    def __init__(self):
+        from pdfminer import high_level, layout  # Optional dependency
+        self.high_level = high_level
+        self.layout = layout
+
+    def page_count(self, pdf_path: str) -> int:
+        from pdfminer.pdfpage import PDFPage
+        with open(pdf_path, 'rb') as f:
+            return sum(1 for _ in PDFPage.get_pages(f))
+
+    def extract_range(self, pdf_path: str, first: int, last: int) -> List[str]:
+        texts = []
+        for page in self.high_level.extract_pages(pdf_path, page_numbers=range(first, last)):
+            texts.append(''.join(element.get_text() for element in page
+                                 if isinstance(element, self.layout.LTTextContainer)))
+        return texts
+
+
+_extractors = {}
+
+
+def get_extractor(path: str = None):
+    """Process-wide extractor, chosen with the AGORA_PDF_EXTRACTOR setting"""
+    path = path or getattr(settings, 'AGORA_PDF_EXTRACTOR', 'proceedings.services.extractors.PyPDF2Extractor')
+    extractor = _extractors.get(path)
+    if extractor is None:
+        extractor = _extractors[path] = import_string(path)()
+    return extractor
+
+
+def extract_range(path: str, pdf_path: str, first: int, last: int) -> List[str]:
+    """Run one extractor over a page range; the unit of work of the extraction process pool"""
+    return get_extractor(path).extract_range(pdf_path, first, last)
@@ -0,0 +1,194 @@
+import os
+import gzip
+import html
+from html.parser import HTMLParser
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import urlparse
+
+import markdown
+
+from .artifact_store import ArtifactStore
+from .metrics import cache_result, span
+from .storage import atomic_write, single_flight
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are stored
+    brotli = None
+
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'strong', 'em', 'b', 'i',
+    'code', 'pre', 'blockquote', 'a', 'table', 'thead', 'tbody', 'tr', 'th', 'td',
+}
+ALLOWED_ATTRIBUTES = {'a': {'href', 'title'}, 'th': {'align'}, 'td': {'align'}, 'ol': {'start'}}
+VOID_TAGS = {'br', 'hr'}
+# Dropped together with their content
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'textarea', 'title'}
+SAFE_SCHEMES = {'', 'http', 'https', 'mailto'}
+
+
+class _Sanitizer(HTMLParser):
+    """Keep an allowlist of tags and attributes; escape or drop everything else"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open = []          # Allowed tags currently open
+        self.dropping = 0       # Depth inside dropped tags
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        kept = []
+        for name, value in attrs:
+            if name not in ALLOWED_ATTRIBUTES.get(tag, ()) or value is None:
+                continue
+            if name == 'href' and urlparse(value.strip()).scheme.lower() not in SAFE_SCHEMES:
+                continue
+            kept.append(f' {name}="{html.escape(value, quote=True)}"')
+        if tag == 'a':
+            kept.append(' rel="nofollow noopener"')
+        self.out.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and tag in ALLOWED_TAGS and not self.dropping and self.open and self.open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping or tag not in self.open:
+            return
+        # Close anything left open inside this tag
+        while self.open:
+            inner = self.open.pop()
+            self.out.append(f'</{inner}>')
+            if inner == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(html.escape(data, quote=False))
+
+    def result(self) -> str:
+        self.close()
+        return ''.join(self.out) + ''.join(f'</{tag}>' for tag in reversed(self.open))
+
+
+def sanitize_html(fragment: str) -> str:
+    """Strip tags, attributes and link schemes outside the allowlist from an HTML fragment"""
+    sanitizer = _Sanitizer()
+    sanitizer.feed(fragment)
+    return sanitizer.result()
+
+
+def render_markdown(text: str) -> str:
+    """Model-written markdown as safe HTML"""
+    return sanitize_html(markdown.markdown(text))
+
+
+class Fragment(NamedTuple):
+    key: str
+    paths: Dict[str, str]       # encoding ('identity', 'gzip', 'br') -> file
+    last_modified: float
+
+    def etag(self, variant: str = 'identity') -> str:
+        """Strong validator; the key already changes with the content"""
+        return f'"{self.key[:24]}-{variant}"'
+
+    def encodings(self):
+        return [encoding for encoding, path in self.paths.items() if os.path.exists(path)]
+
+    def read(self, encoding: str = 'identity') -> bytes:
+        with open(self.paths[encoding], 'rb') as f:
+            return f.read()
+
+    def text(self) -> str:
+        return self.read().decode('utf-8')
+
+
+class FragmentStore:
+    """Rendered, sanitized HTML of the summaries and topics, with precompressed variants
+
+    A fragment is keyed by the key of the artifact it renders, the field and
+    the renderer version, so it is rendered once per generated artifact and
+    its key doubles as an ETag. The gzip (and, when the brotli package is
+    installed, brotli) variants are compressed once, when the fragment is
+    written; the uncompressed file is written last, so its presence means
+    every variant is in place.
+    """
+    ARTIFACT_KIND = 'html'
+    RENDERER_VERSION = 1    # Bump when render_markdown or the sanitizer allowlist change
+    SUFFIXES = {'identity': 'html', 'gzip': 'html.gz', 'br': 'html.br'}
+
+    def __init__(self):
+        self.artifacts = ArtifactStore()
+
+    def key(self, artifact_key: str, field: str) -> str:
+        return self.artifacts.key(self.ARTIFACT_KIND, artifact_key, field=field, renderer=self.RENDERER_VERSION,
+                                  markdown=markdown.__version__)
+
+    def artifact_key(self, service, filename: str, field: str) -> str:
+        return self.key(service.artifact_key(filename), field)
+
+    def get_paths(self, key: str) -> Dict[str, str]:
+        encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+        return {encoding: self.artifacts.path(self.ARTIFACT_KIND, key, self.SUFFIXES[encoding])
+                for encoding in encodings}
+
+    def lookup(self, service, filename: str, field: str) -> Optional[Fragment]:
+        """The stored fragment of a service's artifact, without rendering it, or None"""
+        key = self.artifact_key(service, filename, field)
+        paths = self.get_paths(key)
+        try:
+            mtime = os.stat(paths['identity']).st_mtime
+        except FileNotFoundError:
+            return None
+        return Fragment(key, paths, mtime)
+
+    def get(self, service, filename: str, field: str) -> Optional[Fragment]:
+        """The fragment of a service's artifact, rendering it on first use; None until the artifact exists"""
+        fragment = self.lookup(service, filename, field)
+        cache_result(self.ARTIFACT_KIND, fragment is not None)
+        if fragment is not None:
+            return fragment
+
+        data = service.get_cached_data(filename)
+        if data is None:
+            return None
+        key = self.artifact_key(service, filename, field)
+        paths = self.get_paths(key)
+
+        def render():
+            with span('render'):
+                body = render_markdown(data.get(field, '')).encode('utf-8')
+                variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variants['br'] = brotli.compress(body, quality=11)
+                for encoding, content in variants.items():
+                    with atomic_write(paths[encoding], 'wb') as f:
+                        f.write(content)
+                with atomic_write(paths['identity'], 'wb') as f:
+                    f.write(body)
+            self.artifacts.record(self.ARTIFACT_KIND, key, list(paths.values()), source=filename,
+                                  content_hash=service.artifact_key(filename), params={'field': field})
+            return self.lookup(service, filename, field)
+
+        return single_flight(paths['identity'], lambda: self.lookup(service, filename, field), render)
+
+    def negotiate(self, fragment: Fragment, accept_encoding: str) -> str:
+        """Best stored encoding the client accepts"""
+        accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')
+                    if not part.strip().endswith(';q=0')}
+        available = fragment.encodings()
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in available:
+                return encoding
+        return 'identity'
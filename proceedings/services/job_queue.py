@@ -0,0 +1,162 @@
+import os
+import time
+import socket
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import GenerationJob
+from .corpus_search import CorpusIndex
+from .fragments import FragmentStore
+from .qa_service import PDFChunkManager
+from .registry import get_service
+from .session_catalog import SessionCatalog
+from .speaker_index import SpeakerIndex
+from .summarizer import SessionSummarizer
+from .topic_service import TopicExtractor
+
+
+class JobQueue:
+    """DB-backed queue of summary, topic and chunking work, deduplicated per artifact"""
+    MAX_ATTEMPTS = 3
+    HEARTBEAT_INTERVAL = 30                  # Seconds between a worker's signs of life while it runs a job
+    STALE_AFTER = timedelta(minutes=2)       # Running jobs without a heartbeat for this long are abandoned
+    FAILED_RETRY_AFTER = timedelta(hours=1)  # A job that failed for good is not queued again before this
+
+    def enqueue(self, kind: str, filename: str) -> GenerationJob:
+        """Queue a job unless an identical one is pending or running, or recently failed for good
+
+        A job that used up its attempts is returned as it is, failed, instead
+        of being queued again by every poll; it is retried after FAILED_RETRY_AFTER.
+        """
+        active = self.active_job(kind, filename)
+        if active is not None:
+            return active
+        failed = self.failed_job(kind, filename)
+        if failed is not None:
+            return failed
+        try:
+            with transaction.atomic():
+                return GenerationJob.objects.create(kind=kind, filename=filename)
+        except IntegrityError:
+            # Another request queued the same job between our check and insert
+            return self.active_job(kind, filename)
+
+    def active_job(self, kind: str, filename: str) -> Optional[GenerationJob]:
+        return GenerationJob.objects.filter(
+            kind=kind, filename=filename, status__in=GenerationJob.ACTIVE_STATUSES
+        ).first()
+
+    def failed_job(self, kind: str, filename: str) -> Optional[GenerationJob]:
+        """The latest job for an artifact, if it failed for good less than FAILED_RETRY_AFTER ago"""
+        latest = GenerationJob.objects.filter(kind=kind, filename=filename).order_by('-created_at').first()
+        if (latest is not None and latest.status == GenerationJob.STATUS_FAILED
+                and latest.finished_at and latest.finished_at > timezone.now() - self.FAILED_RETRY_AFTER):
+            return latest
+        return None
+
+    def claim(self, worker: str) -> Optional[GenerationJob]:
+        """Atomically take the oldest pending job, or return None if there is none"""
+        while True:
+            job = GenerationJob.objects.filter(status=GenerationJob.STATUS_PENDING).first()
+            if job is None:
+                return None
+            claimed = GenerationJob.objects.filter(pk=job.pk, status=GenerationJob.STATUS_PENDING).update(
+                status=GenerationJob.STATUS_RUNNING,
+                worker=worker,
+                started_at=timezone.now(),
+                heartbeat_at=timezone.now(),
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+            # Another worker won the race for this job; try the next one
+
+    def requeue_stale(self) -> int:
+        """Put jobs of crashed workers, whose heartbeat stopped, back in the queue"""
+        stale = timezone.now() - self.STALE_AFTER
+        return GenerationJob.objects.filter(
+            # Jobs claimed before heartbeats existed only have their start time
+            Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True, started_at__lt=stale),
+            status=GenerationJob.STATUS_RUNNING,
+        ).update(status=GenerationJob.STATUS_PENDING)
+
+    def _heartbeat(self, job: GenerationJob, stop: threading.Event):
+        """Refresh the job's heartbeat until stopped, so long map-reduce jobs are not taken for abandoned"""
+        try:
+            while not stop.wait(self.HEARTBEAT_INTERVAL):
+                GenerationJob.objects.filter(pk=job.pk, status=GenerationJob.STATUS_RUNNING).update(
+                    heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    def run(self, job: GenerationJob):
+        """Execute a claimed job and record its outcome"""
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)
+        heartbeat.start()
+        try:
+            self._execute(job)
+        except Exception as e:
+            print(f"Error running {job}: {e}")
+            job.error = str(e)
+            job.status = (GenerationJob.STATUS_PENDING if job.attempts < self.MAX_ATTEMPTS
+                          else GenerationJob.STATUS_FAILED)
+        else:
+            job.error = ''
+            job.status = GenerationJob.STATUS_DONE
+            get_service(SessionCatalog).mark_ready(job.filename, job.kind)
+        finally:
+            stop.set()
+            heartbeat.join()
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+
+    def _execute(self, job: GenerationJob):
+        pdf_path = os.path.join(settings.MEDIA_ROOT, 'pdf_documents', job.filename)
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"No such session PDF: {job.filename}")
+
+        if job.kind == GenerationJob.KIND_SUMMARY:
+            summarizer = get_service(SessionSummarizer)
+            summarizer.get_or_generate_summary(job.filename)
+            # Render and compress the HTML now, so the first page view only serves files
+            get_service(FragmentStore).get(summarizer, job.filename, 'summary')
+        elif job.kind == GenerationJob.KIND_TOPICS:
+            topic_extractor = get_service(TopicExtractor)
+            topic_extractor.get_or_generate_topics(job.filename, pdf_path)
+            get_service(FragmentStore).get(topic_extractor, job.filename, 'topics')
+        elif job.kind == GenerationJob.KIND_CHUNKS:
+            chunk_manager = get_service(PDFChunkManager)
+            if not chunk_manager.chunk_exists(job.filename):
+                chunk_manager.create_chunks(pdf_path, job.filename)
+            # Speaker turns come with the chunks; this only segments if they were deleted
+            chunk_manager.speakers.ensure_turns(job.filename)
+            # Merge the session into the cross-session indexes here rather than in a request;
+            # force, since the directory was marked as indexed while the session was pending
+            get_service(CorpusIndex).sync(force=True)
+            get_service(SpeakerIndex).sync(force=True)
+        else:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+
+    def work(self, poll_interval: float = 2.0, once: bool = False) -> int:
+        """Process jobs until stopped; with once=True, drain the queue and return"""
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+        self.requeue_stale()
+        while True:
+            job = self.claim(worker)
+            if job is None:
+                if once:
+                    return processed
+                time.sleep(poll_interval)
+                self.requeue_stale()
+                continue
+            self.run(job)
+            processed += 1
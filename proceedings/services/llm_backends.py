@@ -0,0 +1,148 @@
+import time
+import asyncio
+import hashlib
+import threading
+from typing import AsyncIterator, List
+
+from django.conf import settings
+
+
+class ThrottledError(Exception):
+    """The backend refused a call because of rate limits or quota; it may succeed later"""
+
+
+# google.api_core exceptions for 429 and 503, matched by name to keep the SDK import lazy
+THROTTLING_ERRORS = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable'}
+
+
+def _throttling(error: Exception) -> bool:
+    return type(error).__name__ in THROTTLING_ERRORS or getattr(error, 'code', None) in (429, 503)
+
+
+class GeminiBackend:
+    """Google Gemini through the google-generativeai SDK
+
+    The SDK is imported and the model built on first use, which keeps it out
+    of process startup. One GenerativeModel is kept for the life of the
+    process, so its transport connections are reused across requests.
+    """
+
+    def __init__(self, model_name: str, api_key: str = None, **options):
+        self.name = model_name
+        self.api_key = api_key
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.name)
+        return self._model
+
+    def generate(self, prompt: str) -> str:
+        try:
+            return self.model.generate_content(prompt).text
+        except Exception as e:
+            if _throttling(e):
+                raise ThrottledError(str(e)) from e
+            raise
+
+    async def agenerate(self, prompt: str) -> str:
+        try:
+            response = await self.model.generate_content_async(prompt)
+        except Exception as e:
+            if _throttling(e):
+                raise ThrottledError(str(e)) from e
+            raise
+        return response.text
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        try:
+            response = await self.model.generate_content_async(prompt, stream=True)
+        except Exception as e:
+            if _throttling(e):
+                raise ThrottledError(str(e)) from e
+            raise
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    """Offline stand-in for load tests and benchmarks: deterministic answers, configurable latency
+
+    The answer is a short markdown text derived from a hash of the prompt, so
+    the same prompt always gets the same answer. Each call waits
+    AGORA_FAKE_LLM_LATENCY seconds before the first piece of text, then
+    AGORA_FAKE_LLM_PIECE_LATENCY seconds per streamed piece. Its name differs
+    from the real model's, so its output never lands in the real model's
+    artifacts. With AGORA_FAKE_LLM_QUOTA set, it accepts at most that many
+    calls per second and throttles the rest, like a provider quota.
+    """
+    PIECES = 8  # Streamed pieces per answer
+
+    def __init__(self, model_name: str, api_key: str = None, latency: float = None,
+                 piece_latency: float = None, quota: float = None, **options):
+        self.name = f'fake-{model_name}'
+        self.latency = latency if latency is not None else getattr(settings, 'AGORA_FAKE_LLM_LATENCY', 0.0)
+        self.piece_latency = (piece_latency if piece_latency is not None
+                              else getattr(settings, 'AGORA_FAKE_LLM_PIECE_LATENCY', 0.0))
+        self.quota = quota if quota is not None else getattr(settings, 'AGORA_FAKE_LLM_QUOTA', 0.0)
+        self.calls = 0
+        self.throttled = 0
+        self._accepted = []  # Times of the calls accepted in the last second
+        self._quota_lock = threading.Lock()
+
+    def _admit(self):
+        """Count a call, throttling it if the quota of the last second is used up"""
+        self.calls += 1
+        if not self.quota:
+            return
+        with self._quota_lock:
+            now = time.monotonic()
+            self._accepted = [accepted for accepted in self._accepted if now - accepted < 1.0]
+            if len(self._accepted) >= self.quota:
+                self.throttled += 1
+                raise ThrottledError('429 Quota exceeded (fake backend)')
+            self._accepted.append(now)
+
+    def respond(self, prompt: str) -> List[str]:
+        """The answer to a prompt, split into the pieces it is streamed in
+
+        A batched Q&A prompt gets one answer per session, under the headers it asks for.
+        """
+        from .batch_qa import ANSWER_HEADER, SESSION_HEADER
+        sessions = len(ANSWER_HEADER.findall(prompt))
+        if sessions < 2:
+            return self._answer(prompt, len(prompt))
+        return [SESSION_HEADER.format(number=number) + '\n'
+                + ''.join(self._answer(f"{number}\n{prompt}", len(prompt))) + '\n\n'
+                for number in range(1, sessions + 1)]
+
+    def _answer(self, seed: str, prompt_length: int) -> List[str]:
+        digest = hashlib.sha256(seed.encode('utf-8')).hexdigest()
+        lines = [f"## Απάντηση {digest[:8]}\n"]
+        lines += [f"- Σημείο {i + 1}: {digest[i * 4:i * 4 + 12]}\n" for i in range(self.PIECES - 2)]
+        lines.append(f"\nΜήκος προτροπής: {prompt_length} χαρακτήρες.")
+        return lines
+
+    def generate(self, prompt: str) -> str:
+        self._admit()
+        time.sleep(self.latency + self.piece_latency * self.PIECES)
+        return ''.join(self.respond(prompt))
+
+    async def agenerate(self, prompt: str) -> str:
+        self._admit()
+        await asyncio.sleep(self.latency + self.piece_latency * self.PIECES)
+        return ''.join(self.respond(prompt))
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        self._admit()
+        await asyncio.sleep(self.latency)
+        for piece in self.respond(prompt):
+            await asyncio.sleep(self.piece_latency)
+            yield piece
@@ -0,0 +1,138 @@
+import time
+import asyncio
+import threading
+from typing import AsyncIterator, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .context_packer import estimate_tokens
+from .llm_backends import ThrottledError
+from .metrics import LLM_CALLS, LLM_TOKENS, span
+from .rate_limiter import BACKGROUND, RateLimiter
+
+
+class LLMClient:
+    """Process-wide model client with admission control, shared by all services
+
+    Calls go to a backend (see llm_backends), chosen with the AGORA_LLM_BACKEND
+    setting: Gemini in production, or an offline fake for load tests. The
+    backend's name, not the configured model name, goes into artifact keys.
+    Every call goes through a RateLimiter: callers pass their priority, and
+    throttled calls are retried after a jittered backoff before the
+    ThrottledError reaches them.
+    """
+
+    def __init__(self, backend, max_concurrency: int, limiter: Optional[RateLimiter] = None):
+        self.backend = backend
+        self.model_name = backend.name
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter or RateLimiter(backend.name, max_concurrency)
+
+    @property
+    def model(self):
+        """The backend's underlying model object, if it has one"""
+        return getattr(self.backend, 'model', None)
+
+    def _account(self, prompt: str, answer: Optional[str], outcome: str = None):
+        """Count a finished call and its estimated prompt and completion tokens"""
+        LLM_CALLS.inc(self.model_name, outcome or ('ok' if answer is not None else 'error'))
+        LLM_TOKENS.inc(self.model_name, 'prompt', amount=estimate_tokens(prompt))
+        if answer:
+            LLM_TOKENS.inc(self.model_name, 'completion', amount=estimate_tokens(answer))
+
+    def generate(self, prompt: str, priority: str = BACKGROUND) -> str:
+        """Blocking generation, for workers and sync views"""
+        for attempt in range(self.limiter.retries + 1):
+            with span('llm_wait'):
+                self.limiter.acquire(priority)
+            answer, outcome = None, None
+            try:
+                with span('llm'):
+                    answer = self.backend.generate(prompt)
+            except ThrottledError:
+                outcome = 'throttled'
+                if attempt == self.limiter.retries:
+                    raise
+            finally:
+                self.limiter.release()
+                self._account(prompt, answer, outcome)
+            if answer is not None:
+                self.limiter.succeeded()
+                return answer
+            time.sleep(self.limiter.throttled(attempt))
+
+    async def agenerate(self, prompt: str, priority: str = BACKGROUND) -> str:
+        """Non-blocking generation; waits while the limiter holds the call back"""
+        for attempt in range(self.limiter.retries + 1):
+            with span('llm_wait'):
+                await self.limiter.aacquire(priority)
+            answer, outcome = None, None
+            try:
+                with span('llm'):
+                    answer = await self.backend.agenerate(prompt)
+            except ThrottledError:
+                outcome = 'throttled'
+                if attempt == self.limiter.retries:
+                    raise
+            finally:
+                self.limiter.release()
+                self._account(prompt, answer, outcome)
+            if answer is not None:
+                await asyncio.to_thread(self.limiter.succeeded)
+                return answer
+            await asyncio.sleep(await asyncio.to_thread(self.limiter.throttled, attempt))
+
+    async def astream(self, prompt: str, priority: str = BACKGROUND) -> AsyncIterator[str]:
+        """Non-blocking generation, yielding text pieces as the model produces them
+
+        A throttled call is retried only if it failed before its first piece.
+        """
+        for attempt in range(self.limiter.retries + 1):
+            with span('llm_wait'):
+                await self.limiter.aacquire(priority)
+            parts, finished, outcome = [], False, None
+            try:
+                with span('llm'):
+                    async for piece in self.backend.astream(prompt):
+                        parts.append(piece)
+                        yield piece
+                finished = True
+            except ThrottledError:
+                outcome = 'throttled'
+                if parts or attempt == self.limiter.retries:
+                    raise
+            finally:
+                self.limiter.release()
+                self._account(prompt, ''.join(parts) if finished else None, outcome)
+            if finished:
+                await asyncio.to_thread(self.limiter.succeeded)
+                return
+            await asyncio.sleep(await asyncio.to_thread(self.limiter.throttled, attempt))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide client, creating it on first call"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                backend = import_string(getattr(
+                    settings, 'AGORA_LLM_BACKEND', 'proceedings.services.llm_backends.GeminiBackend'))
+                backend = backend(model_name=getattr(settings, 'AGORA_LLM_MODEL', 'gemini-pro'),
+                                  api_key=settings.GEMINI_API_KEY)
+                max_concurrency = getattr(settings, 'AGORA_LLM_MAX_CONCURRENCY', 64)
+                limiter = RateLimiter(
+                    backend.name, max_concurrency,
+                    rate=getattr(settings, 'AGORA_LLM_RATE', 5.0),
+                    burst=getattr(settings, 'AGORA_LLM_BURST', 0.0),
+                    reserve=getattr(settings, 'AGORA_LLM_INTERACTIVE_RESERVE', 0.25),
+                    retries=getattr(settings, 'AGORA_LLM_RETRIES', 4),
+                    backoff=getattr(settings, 'AGORA_LLM_BACKOFF', 0.5),
+                )
+                _client = LLMClient(backend, max_concurrency, limiter)
+    return _client
@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import MEMORY_CACHE_BYTES, MEMORY_CACHE_ENTRIES, cache_result
+
+
+class JSONFileCache:
+    """Decoded JSON files in a byte-bounded, per-process LRU in front of the disk
+
+    Every lookup stats the file, and an entry is only served while the file
+    has the modification time, size and inode it was read with, so a
+    rewritten or replaced file is never served stale. Entries are sized by
+    their bytes on disk and the least recently used are evicted once the
+    total passes AGORA_MEMORY_CACHE_BYTES.
+
+    When AGORA_SHARED_CACHE names an alias in CACHES (memcached, Redis...),
+    file contents are also kept there under a key that includes the same
+    stamp, so a worker that misses in memory skips the disk. The disk stays
+    the source of truth. Returned data is shared between callers and must
+    not be modified.
+    """
+    PREFIX = 'agora_json'
+
+    def __init__(self, name: str = 'artifacts', max_bytes: Optional[int] = None, shared: Optional[str] = None):
+        self.name = name
+        self.max_bytes = (max_bytes if max_bytes is not None
+                          else getattr(settings, 'AGORA_MEMORY_CACHE_BYTES', 64 * 1024 * 1024))
+        alias = shared if shared is not None else getattr(settings, 'AGORA_SHARED_CACHE', '')
+        self.shared = caches[alias] if alias else None
+        self.shared_timeout = getattr(settings, 'AGORA_SHARED_CACHE_TIMEOUT', 24 * 3600)
+        self._entries = OrderedDict()  # path -> (stamp, data, size), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counts = {'memory_hits': 0, 'shared_hits': 0, 'disk_reads': 0, 'missing': 0, 'evictions': 0}
+
+    def shared_key(self, path: str, stamp: Tuple[int, int, int]) -> str:
+        digest = hashlib.sha1(f'{os.path.abspath(path)}:{stamp}'.encode('utf-8')).hexdigest()
+        return f'{self.PREFIX}:{digest}'
+
+    def get(self, path: str):
+        """Decoded contents of a JSON file, or None if it does not exist"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._count('missing')
+            self.discard(path)
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.counts['memory_hits'] += 1
+        cache_result(f'{self.name}_memory', entry is not None and entry[0] == stamp)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        # A file replaced after the stat is stored under the older stamp, so the next lookup misses
+        raw = None
+        if self.shared is not None:
+            key = self.shared_key(path, stamp)
+            raw = self.shared.get(key)
+            cache_result(f'{self.name}_shared', raw is not None)
+        if raw is None:
+            try:
+                with open(path, 'rb') as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                self._count('missing')
+                return None
+            self._count('disk_reads')
+            if self.shared is not None:
+                self.shared.set(key, raw, self.shared_timeout)
+        else:
+            self._count('shared_hits')
+
+        data = json.loads(raw)
+        self._store(path, stamp, data, len(raw))
+        return data
+
+    def discard(self, path: str):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+                self._report()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._report()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counts, 'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+    def _store(self, path: str, stamp: Tuple[int, int, int], data, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[path] = (stamp, data, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted_path, (evicted_stamp, evicted, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.counts['evictions'] += 1
+            self._report()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _report(self):
+        MEMORY_CACHE_BYTES.set(self._bytes, self.name)
+        MEMORY_CACHE_ENTRIES.set(len(self._entries), self.name)
+
+
+class LoadedFiles:
+    """Objects opened from files (memory-mapped tables, parsed indexes), in a per-process LRU of at most
+    AGORA_LOADED_FILES entries
+
+    An entry is served only while its file has the stamp it was opened with.
+    Every memory map holds a file descriptor until it is freed, so an
+    unbounded cache of them runs out of descriptors on a large library;
+    evicted entries are dropped, and their maps and descriptors are released
+    as soon as no request still uses them.
+    """
+
+    def __init__(self, name: str, max_entries: Optional[int] = None):
+        self.name = name
+        self._max_entries = max_entries
+        self._entries = OrderedDict()  # path -> (stamp, value), least recently used first
+        self._lock = threading.Lock()
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'AGORA_LOADED_FILES', 64)
+
+    def get(self, path: str, stamp):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != stamp:
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def put(self, path: str, stamp, value):
+        with self._lock:
+            self._entries.pop(path, None)
+            self._entries[path] = (stamp, value)
+            while len(self._entries) > max(1, self.max_entries):
+                self._entries.popitem(last=False)
+            MEMORY_CACHE_ENTRIES.set(len(self._entries), self.name)
+
+    def discard(self, path: str):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
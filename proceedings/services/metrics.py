@@ -0,0 +1,412 @@
+import os
+import copy
+import glob
+import json
+import time
+import atexit
+import bisect
+import socket
+import threading
+import contextvars
+from multiprocessing import util as multiprocessing_util
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from django.conf import settings
+
+from .storage import atomic_write_json, file_lock
+
+T = TypeVar('T')
+
+# Seconds; from cache lookups (sub-millisecond) to model calls (tens of seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    TYPE = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.TYPE}'] + self.samples()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def dump(self) -> List[list]:
+        """Values as JSON-serializable [labels, value] pairs"""
+        with self._lock:
+            return [[list(labels), copy.copy(value)] for labels, value in self.values.items()]
+
+    def blank(self) -> 'Metric':
+        """An empty copy, to merge the values of several processes into"""
+        other = copy.copy(self)
+        other.values = {}
+        other._lock = threading.Lock()
+        return other
+
+    def absorb(self, items: List[list], process: str):
+        """Merge in values dumped by another process"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonic count per label set"""
+    TYPE = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values = {}  # label values -> count
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+        _changed()
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{_format_labels(self.labels, labels)} {value:g}' for labels, value in items]
+
+    def absorb(self, items: List[list], process: str):
+        for labels, value in items:
+            labels = tuple(labels)
+            self.values[labels] = self.values.get(labels, 0.0) + value
+
+
+class Gauge(Metric):
+    """Current value per label set; merged across processes with a process label, not summed"""
+    TYPE = 'gauge'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values = {}  # label values -> value
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self.values[labels] = value
+        _changed()
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{_format_labels(self.labels, labels)} {value:g}' for labels, value in items]
+
+    def blank(self) -> 'Gauge':
+        other = super().blank()
+        other.labels = self.labels + ('process',)
+        return other
+
+    def absorb(self, items: List[list], process: str):
+        for labels, value in items:
+            self.values[tuple(labels) + (process,)] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values per label set, in cumulative buckets"""
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [per-bucket counts..., count above the last bucket, sum]
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+        _changed()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(counts)) for labels, counts in self.values.items())
+        lines = []
+        for labels, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                bucket_labels = _format_labels(self.labels, labels, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, labels)} {counts[-1]:.6f}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}')
+        return lines
+
+    def absorb(self, items: List[list], process: str):
+        for labels, counts in items:
+            if len(counts) != len(self.buckets) + 2:
+                continue  # Dumped by a version with other buckets
+            labels = tuple(labels)
+            current = self.values.get(labels)
+            self.values[labels] = counts if current is None else [a + b for a, b in zip(current, counts)]
+
+
+STAGE_SECONDS = Histogram('agora_stage_duration_seconds',
+                          'Time spent in one stage of a request or job', ['stage'])
+REQUEST_SECONDS = Histogram('agora_request_duration_seconds',
+                            'Time to produce a response, by view (streamed bodies excluded)', ['view', 'method', 'status'])
+CACHE_REQUESTS = Counter('agora_cache_requests_total',
+                         'Cache lookups by cache and result', ['cache', 'result'])
+LLM_CALLS = Counter('agora_llm_calls_total', 'Model calls by backend and outcome', ['backend', 'outcome'])
+LLM_TOKENS = Counter('agora_llm_tokens_total',
+                     'Model tokens, estimated from text length, by direction', ['backend', 'direction'])
+MEMORY_CACHE_BYTES = Gauge('agora_memory_cache_bytes', 'Bytes held by an in-process cache', ['cache'])
+MEMORY_CACHE_ENTRIES = Gauge('agora_memory_cache_entries', 'Entries held by an in-process cache', ['cache'])
+
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, CACHE_REQUESTS, LLM_CALLS, LLM_TOKENS,
+            MEMORY_CACHE_BYTES, MEMORY_CACHE_ENTRIES]
+
+# Each process writes its values to a file of its own in AGORA_METRICS_DIR at
+# most every FLUSH_INTERVAL seconds, and a scrape, whichever worker serves it,
+# merges the files of all processes. Counters and histograms are summed; the
+# files of processes that exited are folded into ARCHIVE, so sums never go
+# back. Gauges are per process and get a process label.
+FLUSH_INTERVAL = 1.0
+ARCHIVE = 'archive.json'
+PROCESS = f"{socket.gethostname()}:{os.getpid()}"
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+_dirty = threading.Event()
+
+
+def metrics_dir() -> str:
+    """Directory shared by the processes of this deployment; empty to report each process alone"""
+    return getattr(settings, 'AGORA_METRICS_DIR', 'media/metrics')
+
+
+def _changed():
+    """Note that a value changed, starting this process's flusher on the first change"""
+    _dirty.set()
+    if _flusher_pid != os.getpid():
+        _start_flusher()
+
+
+def _start_flusher():
+    global _flusher_pid
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='agora-metrics', daemon=True).start()
+    # multiprocessing children end with os._exit, which skips atexit
+    multiprocessing_util.Finalize(None, _flush_if_dirty, exitpriority=0)
+
+
+def _flush_if_dirty():
+    if _dirty.is_set():
+        flush()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _dirty.is_set():
+            flush()
+
+
+def flush():
+    """Write this process's values to its file in the metrics directory"""
+    directory = metrics_dir()
+    if not directory:
+        return
+    _dirty.clear()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        host, pid = PROCESS.rsplit(':', 1)
+        atomic_write_json(os.path.join(directory, f'{host}_{pid}.json'),
+                          {'process': PROCESS, 'metrics': {metric.name: metric.dump() for metric in REGISTRY}})
+    except Exception as e:
+        print(f"Error writing metrics: {e}")
+
+
+def _forked():
+    """A forked child starts from zero, or the parent's values would be counted twice"""
+    global PROCESS, _flusher_lock
+    PROCESS = f"{socket.gethostname()}:{os.getpid()}"
+    _flusher_lock = threading.Lock()
+    for metric in REGISTRY:
+        metric.values = {}
+        metric._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forked)
+atexit.register(_flush_if_dirty)
+
+
+def _exited(process: str) -> bool:
+    """Whether a process of this host is gone; processes of other hosts are assumed alive"""
+    host, pid = process.rsplit(':', 1)
+    if host != socket.gethostname() or os.name == 'nt':
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (OSError, ValueError):
+        pass
+    return False
+
+
+def _read(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def collect() -> List[Metric]:
+    """The metrics of all processes writing to the metrics directory, merged"""
+    directory = metrics_dir()
+    if not directory:
+        return REGISTRY
+    flush()
+    merged = [metric.blank() for metric in REGISTRY]
+    by_name = {metric.name: metric for metric in merged}
+    archive_path = os.path.join(directory, ARCHIVE)
+    # One scrape at a time, so a file being folded into the archive is never counted twice
+    with file_lock('metrics'):
+        archive = _read(archive_path) or {'metrics': {}}
+        snapshots = []
+        archived = False
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            if os.path.basename(path) == ARCHIVE:
+                continue
+            snapshot = _read(path)
+            if snapshot is None:
+                continue
+            if _exited(snapshot['process']):
+                _fold(archive, snapshot)
+                os.remove(path)
+                archived = True
+            else:
+                snapshots.append(snapshot)
+        if archived:
+            atomic_write_json(archive_path, archive)
+    for snapshot in [archive] + snapshots:
+        for name, items in snapshot['metrics'].items():
+            if name in by_name:
+                by_name[name].absorb(items, snapshot.get('process', ''))
+    return merged
+
+
+def _fold(archive: Dict, snapshot: Dict):
+    """Add the counters and histograms of an exited process to the archive; its gauges are dropped"""
+    for metric in REGISTRY:
+        if isinstance(metric, Gauge) or metric.name not in snapshot['metrics']:
+            continue
+        total = metric.blank()
+        total.absorb(archive['metrics'].get(metric.name, []), '')
+        total.absorb(snapshot['metrics'][metric.name], '')
+        archive['metrics'][metric.name] = total.dump()
+
+
+# Spans of the request being handled, for the timing header; None outside of a timed request
+_request_spans = contextvars.ContextVar('agora_request_spans', default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as one stage, in the stage histogram and the current request's timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def cache_result(cache: str, hit: bool, result: Optional[str] = None):
+    """Count one cache lookup; result overrides hit/miss (e.g. 'similar_hit')"""
+    CACHE_REQUESTS.inc(cache, result or ('hit' if hit else 'miss'))
+
+
+def counted_lookup(cache: str, lookup: Callable[[], Optional[T]]) -> Callable[[], Optional[T]]:
+    """Wrap a single_flight lookup so that only its first call is counted as a cache lookup"""
+    counted = []
+
+    def wrapped():
+        result = lookup()
+        if not counted:
+            counted.append(True)
+            cache_result(cache, result is not None)
+        return result
+
+    return wrapped
+
+
+def start_request_spans() -> Tuple[List[Tuple[str, float]], contextvars.Token]:
+    spans = []
+    return spans, _request_spans.set(spans)
+
+
+def end_request_spans(token: contextvars.Token):
+    _request_spans.reset(token)
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value, with repeated stages summed"""
+    totals: Dict[str, Tuple[float, int]] = {}
+    for stage, elapsed in spans:
+        duration, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (duration + elapsed, count + 1)
+    entries = [f'{stage};dur={duration * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else '')
+               for stage, (duration, count) in totals.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def hit_ratios(requests: Counter = CACHE_REQUESTS) -> Dict[str, float]:
+    """Share of lookups that hit, per cache"""
+    totals, hits = {}, {}
+    with requests._lock:
+        items = list(requests.values.items())
+    for (cache, result), count in items:
+        totals[cache] = totals.get(cache, 0.0) + count
+        if result != 'miss':
+            hits[cache] = hits.get(cache, 0.0) + count
+    return {cache: hits.get(cache, 0.0) / total for cache, total in totals.items() if total}
+
+
+def render() -> str:
+    """All metrics, merged across processes, in the Prometheus text exposition format"""
+    lines = []
+    metrics = collect()
+    for metric in metrics:
+        lines.extend(metric.render())
+    requests = next(metric for metric in metrics if metric.name == CACHE_REQUESTS.name)
+    lines += ['# HELP agora_cache_hit_ratio Share of cache lookups that hit, over all processes',
+              '# TYPE agora_cache_hit_ratio gauge']
+    lines += [f'agora_cache_hit_ratio{{cache="{_escape(cache)}"}} {ratio:.4f}'
+              for cache, ratio in sorted(hit_ratios(requests).items())]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,69 @@
+import json
+import mmap
+import struct
+from typing import Dict, Union
+
+import numpy as np
+
+from .storage import atomic_write
+
+MAGIC = b'AGORAPK1'
+ALIGN = 8
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_packed(path: str, sections: Dict[str, Union[np.ndarray, bytes]], **meta):
+    """Write named arrays and byte blobs to one file, each section aligned for zero-copy reads
+
+    Layout: magic, header length (uint32), JSON header with the section table
+    and meta, then the sections. Arrays are read back flat. Offsets in the table are relative to the
+    first section.
+    """
+    table, blobs, offset = {}, [], 0
+    for name, data in sections.items():
+        array = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray)) else np.ascontiguousarray(data)
+        table[name] = [array.dtype.str, offset, array.size]
+        blobs.append((offset, array))
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({'meta': meta, 'sections': table}, ensure_ascii=False).encode('utf-8')
+    base = _aligned(len(MAGIC) + 4 + len(header))
+
+    with atomic_write(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        position = len(MAGIC) + 4 + len(header)
+        for start, array in blobs:
+            f.write(b'\0' * (base + start - position))
+            f.write(array.tobytes())
+            position = base + start + array.nbytes
+
+
+class PackedFile:
+    """Read-only, memory-mapped view of a file written by write_packed
+
+    Arrays are numpy views over the mapping and blobs are memoryviews, so
+    nothing is copied until a value is used, and every worker process shares
+    the same pages of the OS page cache.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a packed file: {path}")
+        header_length, = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + header_length])
+        self.meta = header['meta']
+        self._sections = header['sections']
+        self._base = _aligned(start + header_length)
+
+    def array(self, name: str) -> np.ndarray:
+        dtype, offset, count = self._sections[name]
+        return np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=self._base + offset)
+
+    def blob(self, name: str) -> memoryview:
+        dtype, offset, count = self._sections[name]
+        return memoryview(self._mmap)[self._base + offset:self._base + offset + count]
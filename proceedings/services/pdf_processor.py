@@ -0,0 +1,307 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Pattern, Tuple
+
+from django.conf import settings
+
+from .artifact_store import ArtifactStore, fingerprint
+from .extractors import extract_range, get_extractor
+from .metrics import counted_lookup, span
+from .storage import atomic_write, atomic_write_json, single_flight
+
+# One extraction pool per process, shared by concurrent extractions so they never
+# run more than AGORA_EXTRACT_PROCESSES processes together; started on first use
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def extract_pool(processes: int) -> ProcessPoolExecutor:
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # Spawned, not forked: the caller may be a threaded web server
+            _extract_pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'))
+        return _extract_pool
+
+
+def _reset_extract_pool():
+    """Forget a pool that can no longer be used (broken, or inherited by a forked child)"""
+    global _extract_pool, _extract_pool_lock
+    _extract_pool = None
+    _extract_pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_extract_pool)
+
+
+def split_text(text: str, chunk_size: int, overlap: int, min_size: int = 100) -> List[Tuple[int, str]]:
+    """Split text into overlapping chunks at sentence boundaries, keeping the start offset of each"""
+    return list(iter_split([text], chunk_size, overlap, min_size))
+
+
+def iter_split(pieces: Iterable[str], chunk_size: int, overlap: int, min_size: int = 100,
+               boundary: Optional[Pattern] = None) -> Iterator[Tuple[int, str]]:
+    """Streaming split_text over the newline-joined pieces (e.g. pages)
+
+    Pieces are pulled only as far as the next chunk needs, so at most about one
+    chunk and one piece of text are held in memory at a time. With a boundary
+    pattern (multi-line, e.g. speaker lines), a chunk is cut before the last match
+    in its second half, without overlap, so the next chunk starts at that match.
+    """
+    pieces = iter(pieces)
+    buffer = ''         # The text from offset base onwards
+    base = 0
+    exhausted = joined = False
+    start = 0
+
+    while True:
+        # Read ahead until the buffer goes past the end of this chunk, or the text ends
+        while not exhausted and base + len(buffer) <= start + chunk_size:
+            piece = next(pieces, None)
+            if piece is None:
+                exhausted = True
+            else:
+                buffer += '\n' + piece if joined else piece
+                joined = True
+        if start >= base + len(buffer):
+            return
+
+        # Get chunk with overlap
+        end = start + chunk_size
+        chunk = buffer[start - base:end - base]
+
+        # Try to break at a boundary match, then at a sentence boundary
+        cut = None
+        if boundary is not None and end < base + len(buffer):
+            cut = max((m.start() for m in boundary.finditer(chunk, chunk_size // 2)), default=None)
+        if cut:
+            chunk = chunk[:cut]
+            end = start + cut
+        elif end < base + len(buffer):
+            # Find last period or newline
+            last_break = max(
+                chunk.rfind('. '),
+                chunk.rfind('.\n'),
+                chunk.rfind('\n')
+            )
+            # Ignore breaks inside the overlap, they would not advance start
+            if last_break + 1 > overlap:
+                chunk = chunk[:last_break + 1]
+                end = start + last_break + 1
+
+        # Add chunk if it's not too short
+        if len(chunk.strip()) > min_size:
+            yield start, chunk.strip()
+
+        # Move start position, accounting for overlap, and drop text behind it
+        start = end if cut else end - overlap
+        if start > base:
+            buffer = buffer[start - base:]
+            base = start
+
+
+class PDFTextStore:
+    """Single extraction pass per PDF, stored as normalized per-page text keyed by content hash"""
+    ARTIFACT_KIND = 'text'
+    NORMALIZER_VERSION = 1  # Bump when _preprocess_text changes its output
+    LAYOUT_VERSION = 2      # Pages stored as JSON lines with an offset index
+    EXTRACT_BATCH = 100     # Most pages handed to one extraction process at a time
+    PAGES_PER_PROCESS = 250  # Fewest pages worth handing to an extraction process (PyPDF2 does ~1000/s)
+    HEADER_MARKERS = ['ΒΟΥΛΗ ΤΩΝ ΑΝΤΙΠΡΟΣΩΠΩΝ', 'Σελίδα']
+    # Agenda headings: short upper-case lines that are not speaker turns ("NAME (PARTY):")
+    HEADING_PATTERN = re.compile(r'^(?:[IVX]+\.\s+|\d+\.\s+)?(?=[^a-zα-ωάέήίόύώϊϋΐΰ:]*$)(?=.*[Α-ΩA-Z]{3}).{6,120}$')
+
+    # Content hashes already computed by this process, keyed by (path, size, mtime)
+    _hashes = {}
+
+    def __init__(self):
+        self.page_break_pattern = re.compile(r'\f')  # Form feed character
+        self.whitespace_pattern = re.compile(r'[ \t\r\v]+')
+        self.artifacts = ArtifactStore()
+
+    def content_hash(self, pdf_path: str) -> str:
+        """SHA-256 of the PDF bytes, memoized on file size and mtime"""
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            self._hashes[key] = digest
+        return digest
+
+    def artifact_params(self) -> dict:
+        """Everything besides the PDF bytes that affects the extracted text"""
+        return {
+            'extractor': get_extractor().name,
+            'normalizer': self.NORMALIZER_VERSION,
+            'headers': fingerprint(*self.HEADER_MARKERS),
+        }
+
+    def artifact_key(self, digest: str) -> str:
+        # The storage layout is part of this key only: it does not change the text itself
+        return self.artifacts.key(self.ARTIFACT_KIND, digest, layout=self.LAYOUT_VERSION, **self.artifact_params())
+
+    def get_cache_path(self, digest: str) -> dict:
+        """Get paths for the stored text of a PDF: one JSON line per page, and the page offsets"""
+        key = self.artifact_key(digest)
+        return {
+            'pages': self.artifacts.path(self.ARTIFACT_KIND, key, 'pages.jsonl'),
+            'index': self.artifacts.path(self.ARTIFACT_KIND, key, 'json'),
+        }
+
+    def get_page_index(self, pdf_path: str) -> Optional[dict]:
+        """Return the page offsets of the stored text, or None if the PDF was not extracted yet"""
+        index_path = self.get_cache_path(self.content_hash(pdf_path))['index']
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def ensure_extracted(self, pdf_path: str) -> dict:
+        """Extract the PDF unless its text is stored, once for all concurrent callers"""
+        digest = self.content_hash(pdf_path)
+        paths = self.get_cache_path(digest)
+
+        def extract():
+            offsets = []
+            with span('extract'), atomic_write(paths['pages'], 'wb') as f:
+                for page in self._extract_pages(pdf_path):
+                    offsets.append(f.tell())
+                    f.write(json.dumps(page, ensure_ascii=False).encode('utf-8') + b'\n')
+            index = {
+                'source': os.path.basename(pdf_path),
+                'page_count': len(offsets),
+                'offsets': offsets,
+                'extracted_at': str(datetime.now()),
+            }
+            # The index is written last, so its presence means the pages are complete
+            atomic_write_json(paths['index'], index)
+            self.artifacts.record(self.ARTIFACT_KIND, self.artifact_key(digest), [paths['pages'], paths['index']],
+                                  source=os.path.basename(pdf_path), content_hash=digest,
+                                  params=self.artifact_params())
+            return index
+
+        return single_flight(paths['index'], counted_lookup('text', lambda: self.get_page_index(pdf_path)), extract)
+
+    def iter_pages(self, pdf_path: str, first: int = 1, last: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """Yield (page number, normalized text) for pages first..last, reading one page at a time
+
+        Only the requested pages are read from the stored text; the PDF itself is
+        parsed once, on first use.
+        """
+        index = self.ensure_extracted(pdf_path)
+        offsets = index['offsets']
+        first = max(first, 1)
+        last = min(last or len(offsets), len(offsets))
+        if first > last:
+            return
+        with open(self.get_cache_path(self.content_hash(pdf_path))['pages'], 'rb') as f:
+            f.seek(offsets[first - 1])
+            for number in range(first, last + 1):
+                yield number, json.loads(f.readline())
+
+    def iter_texts(self, pdf_path: str, first: int = 1, last: Optional[int] = None) -> Iterator[str]:
+        """Yield the text of the non-empty pages, for consumers of the document as a stream"""
+        return (page for number, page in self.iter_pages(pdf_path, first, last) if page)
+
+    def iter_sections(self, pdf_path: str) -> Iterator[Tuple[str, int, str]]:
+        """Yield (heading, first page, text) for each agenda section detected in the transcript
+
+        A section starts at every heading line (see HEADING_PATTERN); text before the
+        first heading is yielded under an empty heading. Only one section is held
+        in memory at a time.
+        """
+        heading, first_page, lines = '', 1, []
+        for number, page in self.iter_pages(pdf_path):
+            for line in page.split('\n') if page else []:
+                if self.HEADING_PATTERN.match(line):
+                    if lines:
+                        yield heading, first_page, '\n'.join(lines)
+                    heading, first_page, lines = line, number, []
+                lines.append(line)
+        if lines:
+            yield heading, first_page, '\n'.join(lines)
+
+    def page_count(self, pdf_path: str) -> int:
+        return self.ensure_extracted(pdf_path)['page_count']
+
+    def get_pages(self, pdf_path: str) -> List[str]:
+        """Return normalized per-page text, parsing the PDF only on first use"""
+        return [page for number, page in self.iter_pages(pdf_path)]
+
+    def get_text(self, pdf_path: str) -> str:
+        """Return the whole document text, one page after the other"""
+        return '\n'.join(self.iter_texts(pdf_path))
+
+    def extract_processes(self) -> int:
+        """Processes to extract one document with; 1 inside pool workers, which cannot start their own"""
+        if multiprocessing.current_process().daemon:
+            return 1
+        return max(1, getattr(settings, 'AGORA_EXTRACT_PROCESSES', 0) or os.cpu_count() or 1)
+
+    def page_ranges(self, page_count: int, processes: int) -> List[Tuple[int, int]]:
+        """Split the pages into consecutive (first, last) ranges, several per process"""
+        size = max(1, min(self.EXTRACT_BATCH, -(-page_count // (processes * 2))))
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    def _extract_pages(self, pdf_path: str) -> Iterator[str]:
+        """Run the configured extractor over every page of the document, yielding pages in order
+
+        Long documents are split into page ranges extracted in parallel by the
+        process's extraction pool; ranges come back in order, so pages are
+        still written as a stream. Each range is read with a fresh parser, which
+        also keeps memory flat on very long documents. Shorter documents are
+        extracted in-process: starting and feeding a process costs more than
+        the few hundred milliseconds it saves on them.
+        """
+        extractor = get_extractor()
+        path = f'{extractor.__class__.__module__}.{extractor.__class__.__qualname__}'
+        page_count = extractor.page_count(pdf_path)
+        processes = max(1, min(self.extract_processes(), page_count // self.PAGES_PER_PROCESS))
+        ranges = self.page_ranges(page_count, processes)
+
+        if processes > 1:
+            pool = extract_pool(self.extract_processes())
+            try:
+                for texts in pool.map(extract_range, *zip(*[(path, pdf_path, first, last) for first, last in ranges])):
+                    yield from (self._preprocess_text(text) for text in texts)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); the next extraction gets a new pool
+                _reset_extract_pool()
+                raise
+        else:
+            for first, last in ranges:
+                yield from (self._preprocess_text(text) for text in extractor.extract_range(pdf_path, first, last))
+
+    def _preprocess_text(self, text: str) -> str:
+        """Clean and preprocess extracted text"""
+        # Remove form feed characters
+        text = self.page_break_pattern.sub('\n', text)
+
+        cleaned_lines = []
+        for line in text.split('\n'):
+            # Normalize whitespace within the line
+            line = self.whitespace_pattern.sub(' ', line).strip()
+            if not line:
+                continue
+            # Skip page numbers
+            if line.isdigit():
+                continue
+            # Skip common headers/footers (customize as needed)
+            if any(header in line for header in self.HEADER_MARKERS):
+                continue
+            cleaned_lines.append(line)
+
+        return '\n'.join(cleaned_lines)
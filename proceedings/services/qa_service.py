@@ -1,177 +1,420 @@
 import os
 import json
+import bisect
+import heapq
 from pathlib import Path
-import google.generativeai as genai
 from django.conf import settings
-from django.core.cache import cache
-from typing import List, Dict
-import PyPDF2
-import re
-from tqdm import tqdm
+from asgiref.sync import sync_to_async
+from typing import AsyncIterator, Iterable, Iterator, List, Dict, Optional, Set, Tuple
+from .answer_cache import AnswerCache
+from .artifact_store import fingerprint
+from .base_service import BaseService
+from .chunk_store import ChunkTable
+from .context_packer import ContextPacker, estimate_tokens
+from .memory_cache import LoadedFiles
+from .metrics import cache_result, counted_lookup, span
+from .pdf_processor import PDFTextStore, iter_split, split_text
+from .rate_limiter import INTERACTIVE
+from .storage import single_flight
+from .search_index import InvertedIndex
+from .speaker_index import SPEAKER_LINE, SPEAKER_PATTERN, SpeakerIndex, SpeakerSegmenter
+from .vector_index import VectorIndex, get_embedder
 
 class PDFTextExtractor:
     def __init__(self):
-        self.page_break_pattern = re.compile(r'\f')  # Form feed character
-        self.whitespace_pattern = re.compile(r'\s+')
+        self.text_store = PDFTextStore()
 
     def extract_text(self, pdf_path: str) -> str:
-        """Extract and preprocess text from PDF"""
+        """Return preprocessed PDF text from the shared extracted-text store"""
         try:
-            with open(pdf_path, 'rb') as file:
-                # Create PDF reader object
-                reader = PyPDF2.PdfReader(file)
-                
-                # Extract text from each page with progress bar
-                text_parts = []
-                for page in tqdm(reader.pages, desc="Extracting PDF text"):
-                    text = page.extract_text()
-                    if text:
-                        # Basic preprocessing
-                        text = self._preprocess_text(text)
-                        text_parts.append(text)
-
-                return '\n'.join(text_parts)
+            return self.text_store.get_text(pdf_path)
+        except Exception as e:
+            raise Exception(f"Error extracting text from PDF: {str(e)}")
 
+    def extract_pages(self, pdf_path: str) -> List[str]:
+        """Return preprocessed per-page PDF text from the shared extracted-text store"""
+        try:
+            return self.text_store.get_pages(pdf_path)
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-    def _preprocess_text(self, text: str) -> str:
-        """Clean and preprocess extracted text"""
-        # Remove form feed characters
-        text = self.page_break_pattern.sub('\n', text)
-        
-        # Normalize whitespace
-        text = self.whitespace_pattern.sub(' ', text)
-        
-        # Remove headers/footers (customize based on your PDF format)
-        lines = text.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            # Skip page numbers
-            if line.strip().isdigit():
-                continue
-            # Skip common headers/footers (customize as needed)
-            if any(header in line for header in ['ΒΟΥΛΗ ΤΩΝ ΑΝΤΙΠΡΟΣΩΠΩΝ', 'Σελίδα']):
-                continue
-            cleaned_lines.append(line)
-        
-        return '\n'.join(cleaned_lines)
+    def iter_pages(self, pdf_path: str, first: int = 1, last: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """Yield (page number, preprocessed text) for a page range, one page at a time"""
+        try:
+            yield from self.text_store.iter_pages(pdf_path, first, last)
+        except Exception as e:
+            raise Exception(f"Error extracting text from PDF: {str(e)}")
 
 class PDFChunkManager:
-    CACHE_DIR = 'media/chunks'
     CHUNK_SIZE = 1000  # Approximate characters per chunk
     OVERLAP = 100      # Character overlap between chunks
-    
+    HYBRID_DEPTH = 4   # Candidates taken from each ranking per requested chunk
+    RRF_K = 60         # Reciprocal rank fusion damping constant
+    SPEAKER_TURNS = 3  # Turns of a speaker named in a question added to its context
+
+    # Chunks and inverted indexes loaded by this process, keyed by chunks path
+    _loaded = LoadedFiles('chunk_tables')
+
     def __init__(self):
         self.extractor = PDFTextExtractor()
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        self.artifacts = self.extractor.text_store.artifacts
+        self.speakers = SpeakerIndex()
+
+    def get_pdf_path(self, filename: str) -> str:
+        return os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename)
+
+    def artifact_params(self) -> dict:
+        """Everything besides the PDF bytes that affects the chunks and their indexes"""
+        return {
+            'chunk_size': self.CHUNK_SIZE,
+            'overlap': self.OVERLAP,
+            'speakers': SpeakerIndex.SEGMENTER_VERSION,
+            'text': self.extractor.text_store.artifact_params(),
+        }
+
+    def artifact_keys(self, filename: str) -> dict:
+        """Artifact keys of the chunks (with their BM25 index) and of the vector index"""
+        content_hash = self.extractor.text_store.content_hash(self.get_pdf_path(filename))
+        params = self.artifact_params()
+        return {
+            'chunks': self.artifacts.key('chunks', content_hash, **params),
+            'vectors': self.artifacts.key('vectors', content_hash, embedder=get_embedder().name, **params),
+        }
 
     def get_cache_path(self, filename: str) -> dict:
         """Get path for cached chunks"""
-        base = os.path.splitext(filename)[0]
+        keys = self.artifact_keys(filename)
         return {
-            'chunks': os.path.join(self.CACHE_DIR, f"{base}_chunks.json"),
+            'chunks': self.artifacts.path('chunks', keys['chunks'], 'chunks.bin'),
+            'index': self.artifacts.path('chunks', keys['chunks'], 'index.bin'),
+            # Written before chunks were stored in binary; converted on first load
+            'chunks_json': self.artifacts.path('chunks', keys['chunks'], 'chunks.json'),
+            'index_json': self.artifacts.path('chunks', keys['chunks'], 'index.json'),
+            'vectors': self.artifacts.path('vectors', keys['vectors'], 'vectors.npy'),
+            'ivf': self.artifacts.path('vectors', keys['vectors'], 'ivf.npz'),
         }
 
+    def _record(self, filename: str, kind: str, files: List[str]):
+        params = self.artifact_params()
+        if kind == 'vectors':
+            params['embedder'] = get_embedder().name
+        self.artifacts.record(kind, self.artifact_keys(filename)[kind], files, source=filename,
+                              content_hash=self.extractor.text_store.content_hash(self.get_pdf_path(filename)),
+                              params=params)
+
     def chunk_exists(self, filename: str) -> bool:
         """Check if chunks exist for this file"""
-        return os.path.exists(self.get_cache_path(filename)['chunks'])
+        paths = self.get_cache_path(filename)
+        return os.path.exists(paths['chunks']) or os.path.exists(paths['chunks_json'])
+
+    def ensure_chunks(self, pdf_path: str, filename: str):
+        """Create chunks unless they exist, once for all concurrent callers"""
+        def create():
+            with span('chunking'):
+                self.create_chunks(pdf_path, filename)
+            return True
+
+        single_flight(self.get_cache_path(filename)['chunks'],
+                      counted_lookup('chunks', lambda: self.chunk_exists(filename) or None), create)
 
     def create_chunks(self, pdf_path: str, filename: str):
         """Create and cache chunks from PDF text"""
-        # Extract text
-        text = self.extractor.extract_text(pdf_path)
-        
-        # Create chunks
-        chunks = self._create_text_chunks(text)
-        
-        # Save chunks
-        cache_path = self.get_cache_path(filename)['chunks']
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, ensure_ascii=False, indent=2)
+        # Stream the pages through the chunker, mapping each chunk to the page it starts on
+        # Speaker turns are segmented in the same pass and stored as their own artifact
+        chunks, pages = [], []
+        segmenter = SpeakerSegmenter()
+        for page, chunk in self._iter_page_chunks(self.extractor.iter_pages(pdf_path), segmenter):
+            chunks.append(chunk)
+            pages.append(page)
+        self.speakers.store(filename, segmenter.finish())
+
+        # Build the inverted index once, at chunking time
+        self._save_index(filename, InvertedIndex.build(chunks, pages))
+
+        # Embed every chunk once, at chunking time
+        self._build_vector_index(filename, chunks)
+
+        # Save chunks last, so that chunk_exists() implies the indexes are in place
+        paths = self.get_cache_path(filename)
+        ChunkTable.write(paths['chunks'], chunks, pages)
+        self._record(filename, 'chunks', [paths['chunks'], paths['index']])
+
+    def convert_json(self, filename: str) -> bool:
+        """Rewrite chunks and index cached as JSON in the binary format; False if there is nothing to convert"""
+        paths = self.get_cache_path(filename)
+        if not os.path.exists(paths['chunks_json']):
+            return False
+        with open(paths['chunks_json'], 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        index = None
+        if os.path.exists(paths['index_json']):
+            with open(paths['index_json'], 'r', encoding='utf-8') as f:
+                index = InvertedIndex.from_dict(json.load(f))
+        if index is None or len(index.lengths) != len(chunks):
+            # Chunks cached before the index existed
+            index = InvertedIndex.build(chunks)
+        index.save(paths['index'])
+        ChunkTable.write(paths['chunks'], chunks, index.pages)
+        self._record(filename, 'chunks', [paths['chunks'], paths['index']])
+        return True
+
+    def _iter_page_chunks(self, pages: Iterable[Tuple[int, str]],
+                          segmenter: Optional[SpeakerSegmenter] = None) -> Iterator[Tuple[int, str]]:
+        """Chunk a stream of (page number, text) as one document, yielding (page number, chunk)
+
+        With a segmenter, chunks are cut at speaker changes where possible, and a
+        chunk that starts in the middle of a turn is prefixed with its speaker.
+        """
+        page_starts, page_numbers = [], []
+
+        def texts():
+            offset = 0
+            for number, page in pages:
+                if not page:
+                    continue
+                page_starts.append(offset)
+                page_numbers.append(number)
+                if segmenter is not None:
+                    segmenter.feed(number, page)
+                yield page
+                offset += len(page) + 1
+
+        boundary = SPEAKER_LINE if segmenter is not None else None
+        for start, chunk in iter_split(texts(), self.CHUNK_SIZE, self.OVERLAP, boundary=boundary):
+            if segmenter is not None:
+                chunk = self._label(segmenter, start, chunk)
+            yield page_numbers[bisect.bisect_right(page_starts, start) - 1], chunk
+
+    def _label(self, segmenter: SpeakerSegmenter, start: int, chunk: str) -> str:
+        """Prefix a chunk that continues a speaker's turn with who is speaking"""
+        current = segmenter.speaker_at(start)
+        if current is None or SPEAKER_PATTERN.match(chunk):
+            return chunk
+        name, party = segmenter.speakers[current[1]]
+        return f"[{name} ({party})] {chunk}" if party else f"[{name}] {chunk}"
 
     def _create_text_chunks(self, text: str) -> List[str]:
         """Split text into overlapping chunks"""
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            # Get chunk with overlap
-            end = start + self.CHUNK_SIZE
-            chunk = text[start:end]
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Find last period or newline
-                last_break = max(
-                    chunk.rfind('. '),
-                    chunk.rfind('.\n'),
-                    chunk.rfind('\n')
-                )
-                if last_break != -1:
-                    chunk = chunk[:last_break + 1]
-                    end = start + last_break + 1
-
-            # Add chunk if it's not too short
-            if len(chunk.strip()) > 100:  # Minimum chunk size
-                chunks.append(chunk.strip())
-            
-            # Move start position, accounting for overlap
-            start = end - self.OVERLAP
-
-        return chunks
-
-    def get_relevant_chunks(self, filename: str, query: str, k: int = 5) -> List[str]:
-        """Get most relevant chunks for a query using basic keyword matching"""
-        cache_path = self.get_cache_path(filename)['chunks']
-        
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-        
-        # Simple relevance scoring based on keyword matching
-        query_words = set(query.lower().split())
-        chunk_scores = []
-        
-        for chunk in chunks:
-            chunk_words = set(chunk.lower().split())
-            score = len(query_words.intersection(chunk_words))
-            chunk_scores.append((score, chunk))
-        
-        # Sort by score and return top k chunks
-        chunk_scores.sort(reverse=True)
-        return [chunk for score, chunk in chunk_scores[:k]]
+        return [chunk for start, chunk in self._chunk_spans(text)]
+
+    def _chunk_spans(self, text: str) -> List[Tuple[int, str]]:
+        """Split text into overlapping chunks, keeping the start offset of each"""
+        return split_text(text, self.CHUNK_SIZE, self.OVERLAP)
+
+    def _save_index(self, filename: str, index: InvertedIndex):
+        index.save(self.get_cache_path(filename)['index'])
+
+    def load(self, filename: str, cache: bool = True) -> Tuple[ChunkTable, InvertedIndex]:
+        """Get chunks and their inverted index, memory-mapped once per process
+
+        With cache=False (one pass over many sessions, e.g. an index sync) they
+        are opened without taking a place in the process's loaded files.
+        """
+        paths = self.get_cache_path(filename)
+        if not os.path.exists(paths['chunks']):
+            single_flight(paths['chunks'], lambda: os.path.exists(paths['chunks']) or None,
+                          lambda: self.convert_json(filename))
+        mtime = os.stat(paths['chunks']).st_mtime_ns
+        loaded = self._loaded.get(paths['chunks'], mtime) if cache else None
+        if cache:
+            cache_result('chunks_memory', loaded is not None)
+        if loaded is not None:
+            return loaded
+
+        with span('chunk_load'):
+            chunks = ChunkTable.open(paths['chunks'])
+            index = InvertedIndex.load(paths['index']) if os.path.exists(paths['index']) else None
+        if index is None or len(index.lengths) != len(chunks):
+            # Index deleted or left over from another run
+            index = InvertedIndex.build(chunks, chunks.pages)
+            self._save_index(filename, index)
+
+        if cache:
+            self._loaded.put(paths['chunks'], mtime, (chunks, index))
+        return chunks, index
+
+    def _build_vector_index(self, filename: str, chunks: List[str]) -> VectorIndex:
+        embedder = get_embedder()
+        index = VectorIndex.build(embedder.embed(chunks), embedder.name)
+        paths = self.get_cache_path(filename)
+        index.save(paths['vectors'], paths['ivf'])
+        self._record(filename, 'vectors', [paths['vectors'], paths['ivf']])
+        return index
+
+    def load_vector_index(self, filename: str) -> VectorIndex:
+        """Get the memory-mapped vector index, embedding the chunks if it is missing or stale"""
+        paths = self.get_cache_path(filename)
+        if os.path.exists(paths['vectors']) and os.path.exists(paths['ivf']):
+            index = VectorIndex.load(paths['vectors'], paths['ivf'])
+            chunks, _ = self.load(filename)
+            if index.embedder_name == get_embedder().name and len(index.ids) == len(chunks):
+                return index
+        chunks, _ = self.load(filename)
+        self._build_vector_index(filename, chunks)
+        return VectorIndex.load(paths['vectors'], paths['ivf'])
+
+    def chunks_in_pages(self, index: InvertedIndex, pages: Tuple[int, int]) -> Set[int]:
+        """Ids of the chunks overlapping an inclusive page range"""
+        first, last = pages
+        starts = index.pages
+        return {
+            chunk_id for chunk_id, start in enumerate(starts)
+            if start <= last and (starts[chunk_id + 1] if chunk_id + 1 < len(starts) else start) >= first
+        }
+
+    def rank_chunks(self, filename: str, query: str, k: int = 5, mode: str = None,
+                    pages: Optional[Tuple[int, int]] = None) -> List[int]:
+        """Ids of the chunks most relevant to a query, best first
+
+        mode is 'lexical' (BM25), 'vector' (embedding ANN) or 'hybrid', which merges
+        both rankings with reciprocal rank fusion. Defaults to AGORA_RETRIEVAL_MODE.
+        pages restricts retrieval to an inclusive (first, last) page range.
+        """
+        mode = mode or getattr(settings, 'AGORA_RETRIEVAL_MODE', 'hybrid')
+        chunks, index = self.load(filename)
+        with span('retrieval'):
+            return self._rank(filename, query, k, mode, pages, index)
+
+    def _rank(self, filename: str, query: str, k: int, mode: str, pages: Optional[Tuple[int, int]],
+              index: InvertedIndex) -> List[int]:
+        allowed = self.chunks_in_pages(index, pages) if pages and index.pages else None
+
+        if mode == 'lexical':
+            return [chunk_id for score, chunk_id in index.search(query, k, allowed)]
+
+        query_vector = get_embedder().embed([query])[0]
+        vector_index = self.load_vector_index(filename)
+        if mode == 'vector':
+            return [chunk_id for score, chunk_id in vector_index.search(query_vector, k, allowed=allowed)]
+
+        fused = {}
+        depth = k * self.HYBRID_DEPTH
+        for ranking in (index.search(query, depth, allowed), vector_index.search(query_vector, depth, allowed=allowed)):
+            for rank, (score, chunk_id) in enumerate(ranking):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (self.RRF_K + rank + 1)
+        best = heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+        return [chunk_id for chunk_id, score in best]
+
+    def get_relevant_chunks(self, filename: str, query: str, k: int = 5, mode: str = None,
+                            pages: Optional[Tuple[int, int]] = None) -> List[str]:
+        """Get most relevant chunks for a query, best first (see rank_chunks)"""
+        chunks, _ = self.load(filename)
+        return [chunks[chunk_id] for chunk_id in self.rank_chunks(filename, query, k, mode, pages)]
+
+class QAService(BaseService):
+    PROMPT_VERSION = 2  # Bump when build_prompt changes, so cached answers are not reused
+    CONTEXT_CHUNKS = 5  # Chunks retrieved per question, packed into the context as far as they fit
 
-class QAService:
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
+        super().__init__()
         self.chunk_manager = PDFChunkManager()
-        
-    def _get_cache_key(self, question: str, filename: str) -> str:
-        return f"qa_cache:{filename}:{hash(question)}"
+        self.answers = AnswerCache()
+        self.packer = ContextPacker()
+
+    def cache_scope(self, filename: str, pages: Optional[Tuple[int, int]] = None) -> str:
+        """What besides the question and history decides an answer: session content, pages, model, prompt"""
+        page_range = f"{pages[0]}-{pages[1]}" if pages else ''
+        return fingerprint(self.chunk_manager.artifact_keys(filename)['chunks'], page_range,
+                           self.llm.model_name, str(self.PROMPT_VERSION), length=16)
+
+    def get_answer(self, question: str, chat_history: List[Dict], filename: str,
+                   pages: Optional[Tuple[int, int]] = None) -> str:
+        """Answer from the cache, or generate once for all concurrent askers of the same question"""
+        scope = self.cache_scope(filename, pages)
+        cached = self.answers.get(question, chat_history, scope)
+        if cached is not None:
+            return cached
+
+        def generate():
+            answer = self.llm.generate(self.build_prompt(question, chat_history, filename, pages), INTERACTIVE)
+            self.answers.set(question, chat_history, scope, answer)
+            return answer
+
+        return self.single_flight(self.answers.key(question, chat_history, scope),
+                                  lambda: self.answers.peek(question, chat_history, scope), generate)
 
-    def get_answer(self, question: str, chat_history: List[Dict], filename: str) -> str:
-        # Check cache first
-        cache_key = self._get_cache_key(question, filename)
-        cached_response = cache.get(cache_key)
+    async def aget_answer(self, question: str, chat_history: List[Dict], filename: str,
+                          pages: Optional[Tuple[int, int]] = None) -> str:
+        """Async get_answer: retrieval runs in a thread, the model call on the event loop"""
+        scope = await sync_to_async(self.cache_scope)(filename, pages)
+        cached = await self.answers.aget(question, chat_history, scope)
+        if cached is not None:
+            return cached
+
+        async def lookup():
+            return await self.answers.apeek(question, chat_history, scope)
+
+        async def generate():
+            prompt = await sync_to_async(self.build_prompt)(question, chat_history, filename, pages)
+            answer = await self.llm.agenerate(prompt, INTERACTIVE)
+            await self.answers.aset(question, chat_history, scope, answer)
+            return answer
+
+        return await self.async_single_flight(self.answers.key(question, chat_history, scope), lookup, generate)
+
+    async def astream_answer(self, question: str, chat_history: List[Dict], filename: str,
+                            pages: Optional[Tuple[int, int]] = None) -> AsyncIterator[str]:
+        """Yield the answer in pieces as the model writes it, caching the full text at the end"""
+        scope = await sync_to_async(self.cache_scope)(filename, pages)
+        cached_response = await self.answers.aget(question, chat_history, scope)
         if cached_response:
-            return cached_response
+            yield cached_response
+            return
+
+        prompt = await sync_to_async(self.build_prompt)(question, chat_history, filename, pages)
+        parts = []
+        async for piece in self.llm.astream(prompt, INTERACTIVE):
+            parts.append(piece)
+            yield piece
 
+        # Only a completed answer is cached; an interrupted stream leaves no entry
+        await self.answers.aset(question, chat_history, scope, ''.join(parts))
+
+    def speaker_turns(self, question: str, filename: str, pages: Optional[Tuple[int, int]] = None) -> List[str]:
+        """Turns of the session's speakers named in the question that best match it"""
+        speakers = self.chunk_manager.speakers
+        turns = speakers.get_turns(filename)
+        matched = speakers.speakers_in(filename, question)
+        if turns is None or not matched:
+            return []
+        texts = []
+        for score, turn_id in speakers.search_turns(filename, question, self.chunk_manager.SPEAKER_TURNS, matched):
+            speaker_id, first_page, last_page = turns['turns'][turn_id][:3]
+            if pages and (last_page < pages[0] or first_page > pages[1]):
+                continue
+            # Long speeches are cut to a few chunks' worth of text
+            texts.append(speakers.turn_text(filename, turns, turn_id)[:self.chunk_manager.CHUNK_SIZE * 2])
+        return texts
+
+    def retrieve(self, question: str, filename: str,
+                 pages: Optional[Tuple[int, int]] = None) -> Tuple[ChunkTable, List[int], List[str]]:
+        """The session's chunks, ids of those relevant to the question, and turns of speakers it names"""
         # Ensure chunks exist
-        if not self.chunk_manager.chunk_exists(filename):
-            pdf_path = os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename)
-            self.chunk_manager.create_chunks(pdf_path, filename)
+        pdf_path = os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename)
+        self.chunk_manager.ensure_chunks(pdf_path, filename)
 
         # Get relevant chunks
-        relevant_chunks = self.chunk_manager.get_relevant_chunks(filename, question)
-        
-        # Format context and prompt
-        context = "\n".join(relevant_chunks)
-        formatted_history = "\n".join([
-            f"{'Χρήστης' if msg['role'] == 'user' else 'Βοηθός'}: {msg['content']}"
-            for msg in chat_history[-3:]
-        ])
+        chunks, _ = self.chunk_manager.load(filename)
+        ranked = self.chunk_manager.rank_chunks(filename, question, k=self.CONTEXT_CHUNKS, pages=pages)
+
+        # A question about a speaker also gets that speaker's most relevant turns
+        return chunks, ranked, self.speaker_turns(question, filename, pages)
 
+    def build_prompt(self, question: str, chat_history: List[Dict], filename: str,
+                     pages: Optional[Tuple[int, int]] = None) -> str:
+        """Retrieve the relevant chunks, from a page range if given, and pack them into the Q&A prompt"""
+        chunks, ranked, turns = self.retrieve(question, filename, pages)
+
+        # Fit context and history into the token budget left by the instructions and the question
+        with span('prompt'):
+            context, formatted_history = self.packer.pack(
+                chunks, ranked, chat_history[-AnswerCache.HISTORY_TURNS:],
+                reserved=estimate_tokens(self.format_prompt(question, '', '')),
+                extra=turns, overlap=self.chunk_manager.OVERLAP,
+            )
+            return self.format_prompt(question, context, formatted_history)
+
+    def format_prompt(self, question: str, context: str, formatted_history: str) -> str:
         prompt = f"""
         Είσαι ένας βοηθός που βοηθά τους χρήστες να κατανοήσουν τα πρακτικά των συνεδριάσεων της Βουλής των Αντιπροσώπων της Κύπρου.
 
@@ -192,12 +435,4 @@ class QAService:
         
         Απάντηση:
         """
-
-        # Generate response
-        response = self.model.generate_content(prompt)
-        answer = response.text
-
-        # Cache the response
-        cache.set(cache_key, answer, timeout=3600)
-
-        return answer
+        return prompt
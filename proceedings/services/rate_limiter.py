@@ -0,0 +1,291 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import struct
+import itertools
+import threading
+from typing import Callable, Dict, List
+
+from .storage import file_lock
+
+INTERACTIVE = 'interactive'  # A user is waiting: Q&A
+BACKGROUND = 'background'    # Summaries, topics and their map steps
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}
+
+
+class SharedBucket:
+    """Token bucket and concurrency limit shared by every process on this host
+
+    The state lives in a small file, read and rewritten in place under a file
+    lock: tokens left, when they were last refilled, the current concurrency
+    limit, a time before which nobody may call the backend (set after it
+    throttles us), then the calls each process has in flight, by pid. A call
+    is admitted while the host's calls in flight are under the limit, so the
+    limit holds for all processes together. Background callers leave a
+    reserve of the burst and of the concurrency limit to interactive ones,
+    which is how Q&A in a web worker gets ahead of summaries in a job worker.
+    Processes that died with calls in flight are dropped when the limit is
+    reached.
+
+    With rate 0 there is no host-wide admission: the state is kept in memory,
+    per process, and no file is touched.
+    """
+    STATE = struct.Struct('<4d')
+    HOLDER = struct.Struct('<qq')  # pid, calls in flight
+    RECHECK = 0.05                 # Seconds between tries while the host is at its concurrency limit
+
+    def __init__(self, path: str, rate: float, burst: float, reserve: float, limit: float):
+        self.path = path
+        self.rate = rate            # Calls per second; 0 for no rate limit and no sharing
+        self.burst = burst
+        self.reserve = reserve      # Share of the burst and of the concurrency only interactive calls may take
+        self.initial_limit = limit
+        self._local = None          # State of a bucket that is not shared
+        self._local_lock = threading.Lock()
+
+    def _update(self, change: Callable[[List[float], Dict[int, int], float], float]) -> float:
+        if not self.rate:
+            with self._local_lock:
+                if self._local is None:
+                    self._local = [self.burst, time.time(), self.initial_limit, 0.0]
+                return change(self._local, {}, time.time())
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with file_lock(self.path):
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                raw = os.pread(fd, 1 << 16, 0)
+                now = time.time()
+                if len(raw) >= self.STATE.size:
+                    state = list(self.STATE.unpack_from(raw))
+                    holders = dict(self.HOLDER.iter_unpack(raw[self.STATE.size:][
+                        :(len(raw) - self.STATE.size) // self.HOLDER.size * self.HOLDER.size]))
+                else:
+                    state, holders = [self.burst, now, self.initial_limit, 0.0], {}
+                state[0] = min(self.burst, state[0] + max(0.0, now - state[1]) * self.rate)
+                state[1] = now
+                result = change(state, holders, now)
+                data = self.STATE.pack(*state) + b''.join(
+                    self.HOLDER.pack(pid, count) for pid, count in holders.items() if count > 0)
+                os.pwrite(fd, data, 0)
+                os.ftruncate(fd, len(data))
+                return result
+            finally:
+                os.close(fd)
+
+    def take(self, priority: str) -> float:
+        """Take a token and a host-wide slot; 0 if taken, else seconds to wait before trying again"""
+        def change(state, holders, now):
+            if state[3] > now:
+                return state[3] - now
+            if not self.rate:
+                return 0.0
+            background = priority == BACKGROUND
+            limit = max(1, int(state[2]))
+            if background:
+                limit = max(1, limit - max(1, int(limit * self.reserve)))
+            if sum(holders.values()) >= limit:
+                _drop_exited(holders)
+                if sum(holders.values()) >= limit:
+                    return self.RECHECK
+            # Background calls always leave room for at least one
+            floor = min(self.burst * self.reserve, self.burst - 1) if background else 0.0
+            if state[0] - 1 >= floor:
+                state[0] -= 1
+                pid = os.getpid()
+                holders[pid] = holders.get(pid, 0) + 1
+                return 0.0
+            return (1 + floor - state[0]) / self.rate
+
+        return self._update(change)
+
+    def release(self):
+        """Give back the host-wide slot of a call taken with take"""
+        if not self.rate:
+            return
+
+        def change(state, holders, now):
+            pid = os.getpid()
+            holders[pid] = holders.get(pid, 0) - 1
+            return 0.0
+
+        self._update(change)
+
+    def adjust(self, factor: float = 1.0, increase: float = 0.0, pause: float = 0.0,
+               low: float = 1.0, high: float = float('inf')) -> float:
+        """Scale and raise the concurrency limit, optionally pausing all callers; returns the new limit"""
+        def change(state, holders, now):
+            state[2] = max(low, min(high, state[2] * factor + increase / max(state[2], 1.0)))
+            if pause:
+                state[3] = max(state[3], now + pause)
+                state[0] = 0.0
+            return state[2]
+
+        return self._update(change)
+
+
+def _drop_exited(holders: Dict[int, int]):
+    """Forget the calls of processes that are gone; they can no longer release them"""
+    for pid in list(holders):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            del holders[pid]
+        except OSError:
+            pass
+
+
+class PrioritySlots:
+    """Concurrency slots handed out by priority, then arrival, to threads and coroutines alike"""
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = []  # (priority, arrival, waiter)
+        self._arrivals = itertools.count()
+        self._lock = threading.Lock()
+
+    def _free(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    def acquire(self, priority: str):
+        with self._lock:
+            if self._free() and not self._waiters:
+                self.in_flight += 1
+                return
+            waiter = {'event': threading.Event(), 'state': 'waiting'}
+            heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._arrivals), waiter))
+        waiter['event'].wait()
+
+    async def aacquire(self, priority: str):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free() and not self._waiters:
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+            waiter = {'loop': loop, 'future': future, 'state': 'waiting'}
+            heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._arrivals), waiter))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter['state'] == 'waiting':
+                    waiter['state'] = 'cancelled'
+                    return_slot = False
+                else:
+                    # Handed a slot just as we were cancelled; give it back unless _resolve will
+                    return_slot = future.done() and not future.cancelled()
+            if return_slot:
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def set_limit(self, limit: float):
+        with self._lock:
+            self.limit = limit
+            self._wake()
+
+    def _wake(self):
+        while self._waiters and self._free():
+            waiter = heapq.heappop(self._waiters)[-1]
+            if waiter['state'] == 'cancelled':
+                continue
+            waiter['state'] = 'handed'
+            self.in_flight += 1
+            if 'event' in waiter:
+                waiter['event'].set()
+                continue
+            try:
+                waiter['loop'].call_soon_threadsafe(self._resolve, waiter['future'])
+            except RuntimeError:
+                # Its event loop has closed; nobody is waiting any more
+                self.in_flight -= 1
+
+    def _resolve(self, future: asyncio.Future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class RateLimiter:
+    """Admission control for model calls: rate, priority, adaptive concurrency and retry backoff
+
+    A call first waits for one of this process's concurrency slots,
+    interactive callers ahead of background ones, then for a token and a
+    slot from the host-wide bucket (see SharedBucket). When the
+    backend throttles, the limit is halved for every process and calls pause
+    for the backoff; each success raises it again by about one per window of
+    calls (AIMD), up to max_concurrency. Retries wait a random time of up to
+    base * 2^attempt seconds ("full jitter"), so throttled callers spread out
+    instead of coming back together.
+    """
+    DECREASE = 0.5
+    MAX_BACKOFF = 30.0
+
+    def __init__(self, name: str, max_concurrency: int, rate: float = 0.0, burst: float = 0.0,
+                 reserve: float = 0.25, retries: int = 4, backoff: float = 0.5, state_dir: str = 'media/ratelimit'):
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.base_backoff = backoff
+        self.bucket = SharedBucket(os.path.join(state_dir, f'{name}.state'), rate,
+                                   burst or max(1.0, rate), reserve, max_concurrency)
+        self.slots = PrioritySlots(max_concurrency)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.MAX_BACKOFF, self.base_backoff * 2 ** attempt))
+
+    def acquire(self, priority: str = BACKGROUND):
+        self.slots.acquire(priority)
+        try:
+            while True:
+                wait = self.bucket.take(priority)
+                if not wait:
+                    return
+                time.sleep(wait)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    async def aacquire(self, priority: str = BACKGROUND):
+        await self.slots.aacquire(priority)
+        try:
+            while True:
+                # The bucket lives in a locked file: keep the event loop free while it is read
+                take = asyncio.ensure_future(asyncio.to_thread(self.bucket.take, priority))
+                try:
+                    wait = await asyncio.shield(take)
+                except asyncio.CancelledError:
+                    # The take still runs in its thread; give back the slot if it gets one
+                    take.add_done_callback(self._release_taken)
+                    raise
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self):
+        self.bucket.release()
+        self.slots.release()
+
+    def _release_taken(self, take: asyncio.Future):
+        if not take.cancelled() and take.exception() is None and not take.result():
+            self.bucket.release()
+
+    def succeeded(self):
+        self.slots.set_limit(self.bucket.adjust(increase=1.0, high=self.max_concurrency))
+
+    def throttled(self, attempt: int) -> float:
+        """Shrink the limit for everyone after a throttling error; returns how long to wait before retrying"""
+        delay = self.backoff(attempt)
+        self.slots.set_limit(self.bucket.adjust(factor=self.DECREASE, pause=delay, high=self.max_concurrency))
+        return delay
@@ -0,0 +1,22 @@
+import threading
+from typing import Type, TypeVar
+
+T = TypeVar('T')
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def get_service(cls: Type[T]) -> T:
+    """Return the process-wide instance of a service class, creating it on first call
+
+    Services keep no per-request state, so views share one instance per class
+    instead of rebuilding stores, directories and clients on every request.
+    """
+    instance = _instances.get(cls)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(cls)
+            if instance is None:
+                instance = _instances[cls] = cls()
+    return instance
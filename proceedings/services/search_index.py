@@ -0,0 +1,159 @@
+import re
+import math
+import heapq
+import unicodedata
+from collections import Counter
+from collections.abc import Mapping
+from typing import Container, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .packed import PackedFile, write_packed
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def fold_text(text: str) -> str:
+    """Case- and accent-fold text so that 'Βουλή', 'ΒΟΥΛΗ' and 'βουλη' compare equal"""
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn')
+    # casefold() also maps the final sigma to σ
+    return stripped.casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split folded text into word tokens"""
+    return TOKEN_PATTERN.findall(fold_text(text))
+
+
+def bm25_idf(total: int, doc_freq: int) -> float:
+    return math.log(1 + (total - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def bm25(idf: float, freq: int, length: int, avg_length: float, k1: float, b: float) -> float:
+    """BM25 contribution of one query term to one chunk"""
+    norm = k1 * (1 - b + b * length / avg_length)
+    return idf * freq * (k1 + 1) / (freq + norm)
+
+
+class PackedPostings(Mapping):
+    """Read-only term -> [[chunk_id, term_frequency], ...] mapping over a memory-mapped index file
+
+    Terms are stored sorted, so a lookup is a binary search that decodes a
+    handful of terms, and only the postings of the looked-up terms are read.
+    """
+
+    def __init__(self, packed: PackedFile):
+        self._terms = packed.blob('terms')
+        self._term_offsets = packed.array('term_offsets')
+        self._posting_offsets = packed.array('posting_offsets')
+        self._postings = packed.array('postings')
+
+    def _term(self, i: int) -> str:
+        return str(self._terms[int(self._term_offsets[i]):int(self._term_offsets[i + 1])], 'utf-8')
+
+    def _find(self, term: str) -> int:
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self) and self._term(low) == term else -1
+
+    def __getitem__(self, term: str) -> List[List[int]]:
+        i = self._find(term) if isinstance(term, str) else -1
+        if i < 0:
+            raise KeyError(term)
+        start, end = int(self._posting_offsets[i]), int(self._posting_offsets[i + 1])
+        return self._postings[start * 2:end * 2].reshape(-1, 2).tolist()
+
+    def __len__(self) -> int:
+        return len(self._term_offsets) - 1
+
+    def __iter__(self):
+        return (self._term(i) for i in range(len(self)))
+
+
+class InvertedIndex:
+    """Per-session inverted index over chunks, ranked with BM25"""
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, postings: Mapping, lengths: List[int],
+                 pages: Optional[List[int]] = None):
+        self.postings = postings      # term -> [[chunk_id, term_frequency], ...]
+        self.lengths = lengths        # chunk_id -> number of tokens
+        self.pages = pages or []      # chunk_id -> page the chunk starts on
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @classmethod
+    def build(cls, chunks: List[str], pages: Optional[List[int]] = None) -> 'InvertedIndex':
+        """Build the index from chunk texts"""
+        postings = {}
+        lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                postings.setdefault(term, []).append([chunk_id, freq])
+        return cls(postings, lengths, pages)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'InvertedIndex':
+        return cls(data['postings'], data['lengths'], data.get('pages'))
+
+    def detach(self) -> 'InvertedIndex':
+        """A copy held in memory, independent of the file it was loaded from"""
+        return InvertedIndex({term: self.postings[term] for term in self.postings},
+                             list(self.lengths), list(self.pages))
+
+    def to_dict(self) -> dict:
+        return {
+            'postings': self.postings,
+            'doc_freqs': {term: len(docs) for term, docs in self.postings.items()},
+            'lengths': self.lengths,
+            'pages': self.pages,
+        }
+
+    def save(self, path: str):
+        """Write the index as a flat binary file that load() memory-maps"""
+        terms = sorted(self.postings)
+        encoded = [term.encode('utf-8') for term in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum(np.array([len(term) for term in encoded], dtype=np.uint64), out=term_offsets[1:])
+        posting_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum(np.array([len(self.postings[term]) for term in terms], dtype=np.uint64), out=posting_offsets[1:])
+        postings = np.array([pair for term in terms for pair in self.postings[term]], dtype=np.uint32).reshape(-1)
+        write_packed(path, {
+            'lengths': np.array(self.lengths, dtype=np.uint32),
+            'pages': np.array(self.pages, dtype=np.uint32),
+            'term_offsets': term_offsets,
+            'posting_offsets': posting_offsets,
+            'postings': postings,
+            'terms': b''.join(encoded),
+        })
+
+    @classmethod
+    def load(cls, path: str) -> 'InvertedIndex':
+        """Open an index written by save(); postings stay on disk until looked up"""
+        packed = PackedFile(path)
+        return cls(PackedPostings(packed), packed.array('lengths').tolist(), packed.array('pages').tolist())
+
+    def search(self, query: str, k: int = 5, allowed: Optional[Container[int]] = None) -> List[Tuple[float, int]]:
+        """Return up to k (score, chunk_id) pairs, best first, optionally only among allowed chunk ids"""
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = bm25_idf(len(self.lengths), len(docs))
+            for chunk_id, freq in docs:
+                if allowed is not None and chunk_id not in allowed:
+                    continue
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + bm25(
+                    idf, freq, self.lengths[chunk_id], self.avg_length, self.K1, self.B)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, chunk_id) for chunk_id, score in best]
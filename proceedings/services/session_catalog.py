@@ -0,0 +1,138 @@
+import os
+import re
+from datetime import date
+from typing import Optional
+
+import PyPDF2
+from django.conf import settings
+from django.db import transaction
+
+from ..models import ParliamentarySession
+from .pdf_processor import PDFTextStore
+from .qa_service import PDFChunkManager
+from .registry import get_service
+from .summarizer import SessionSummarizer
+from .topic_service import TopicExtractor
+from .storage import file_lock
+
+# Session dates as they appear in file names: 2024-03-14, 20240314, 14.03.2024, 14-03-2024, 14_03_2024
+DATE_PATTERNS = [
+    (re.compile(r'(?<!\d)(\d{4})[-_.]?(\d{2})[-_.]?(\d{2})(?!\d)'), ('year', 'month', 'day')),
+    (re.compile(r'(?<!\d)(\d{1,2})[-_.](\d{1,2})[-_.](\d{4})(?!\d)'), ('day', 'month', 'year')),
+]
+# PDF metadata dates look like D:20240314103000+02'00'
+PDF_DATE_PATTERN = re.compile(r'D:(\d{4})(\d{2})(\d{2})')
+
+
+def parse_session_date(filename: str, pdf_date: str = '') -> Optional[date]:
+    """Session date from the file name, falling back to the PDF creation date"""
+    for pattern, order in DATE_PATTERNS:
+        match = pattern.search(filename)
+        if match:
+            parts = dict(zip(order, (int(group) for group in match.groups())))
+            try:
+                return date(parts['year'], parts['month'], parts['day'])
+            except ValueError:
+                continue
+    match = PDF_DATE_PATTERN.match(pdf_date or '')
+    if match:
+        try:
+            return date(*(int(group) for group in match.groups()))
+        except ValueError:
+            pass
+    return None
+
+
+class SessionCatalog:
+    """Keeps the ParliamentarySession table in step with the PDFs on disk
+
+    A scan only stats the PDF directory; files are opened only when they are new
+    or their size or mtime changed. Job completion flips the artifact status
+    columns, so listing sessions never touches the generated artifacts.
+    """
+
+    # PDF directory mtime at the last scan done by this process
+    _scanned_mtime = None
+
+    def __init__(self):
+        self.pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
+        self.text_store = PDFTextStore()
+
+    def sync(self, force: bool = False) -> int:
+        """Catalog new or replaced PDFs and drop deleted ones; a no-op while the PDF directory is unchanged"""
+        if not os.path.isdir(self.pdf_dir):
+            return 0
+        dir_mtime = os.stat(self.pdf_dir).st_mtime_ns
+        if not force and SessionCatalog._scanned_mtime == dir_mtime:
+            return 0
+
+        with file_lock('session-catalog'):
+            changed = self._scan(force)
+        SessionCatalog._scanned_mtime = dir_mtime
+        return changed
+
+    def _scan(self, force: bool) -> int:
+        present = {}
+        for filename in os.listdir(self.pdf_dir):
+            if filename.endswith('.pdf'):
+                stat = os.stat(os.path.join(self.pdf_dir, filename))
+                present[filename] = (stat.st_size, stat.st_mtime_ns)
+
+        known = {
+            filename: (size, mtime_ns)
+            for filename, size, mtime_ns in ParliamentarySession.objects.values_list('filename', 'size', 'mtime_ns')
+        }
+        changed = 0
+        for filename, stat in sorted(present.items()):
+            if force or known.get(filename) != stat:
+                if self.refresh(filename) is not None:
+                    changed += 1
+
+        removed = [filename for filename in known if filename not in present]
+        if removed:
+            ParliamentarySession.objects.filter(filename__in=removed).delete()
+        return changed + len(removed)
+
+    def refresh(self, filename: str) -> Optional[ParliamentarySession]:
+        """Create or update the catalog entry of one PDF; the ingest hook for new uploads"""
+        pdf_path = os.path.join(self.pdf_dir, filename)
+        if not os.path.isfile(pdf_path):
+            ParliamentarySession.objects.filter(filename=filename).delete()
+            return None
+
+        stat = os.stat(pdf_path)
+        try:
+            with open(pdf_path, 'rb') as f:
+                reader = PyPDF2.PdfReader(f)
+                page_count = len(reader.pages)
+                pdf_date = (reader.metadata or {}).get('/CreationDate', '')
+        except Exception as e:
+            print(f"Error reading {filename}: {e}")
+            page_count, pdf_date = 0, ''
+
+        content_hash = self.text_store.content_hash(pdf_path)
+        defaults = {
+            'title': os.path.splitext(filename)[0][:200],
+            'date': parse_session_date(filename, str(pdf_date)),
+            'pdf_file': f'pdf_documents/{filename}',
+            'page_count': page_count,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'content_hash': content_hash,
+            **self.artifact_status(filename),
+        }
+        with transaction.atomic():
+            session, _ = ParliamentarySession.objects.update_or_create(filename=filename, defaults=defaults)
+        return session
+
+    def artifact_status(self, filename: str) -> dict:
+        """Which generated artifacts already exist for the current content of a PDF"""
+        return {
+            'summary_ready': os.path.exists(get_service(SessionSummarizer).get_cache_path(filename)),
+            'topics_ready': os.path.exists(get_service(TopicExtractor).get_cache_path(filename)),
+            'chunks_ready': get_service(PDFChunkManager).chunk_exists(filename),
+        }
+
+    def mark_ready(self, filename: str, kind: str):
+        """Record that a background job produced the artifact of this kind"""
+        ParliamentarySession.objects.filter(filename=filename).update(**{f'{kind}_ready': True})
@@ -0,0 +1,394 @@
+import os
+import re
+import json
+import bisect
+import heapq
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from .artifact_store import ArtifactStore
+from .memory_cache import LoadedFiles
+from .pdf_processor import PDFTextStore
+from .registry import get_service
+from .search_index import InvertedIndex, fold_text, tokenize
+from .storage import atomic_write_json, file_lock, single_flight
+
+# A speaker turn starts with an upper-case name, an optional party and a colon:
+# "Α. ΝΕΟΦΥΤΟΥ (ΔΗΣΥ): ...", "ΠΡΟΕΔΡΟΣ: ..."
+SPEAKER_PATTERN = re.compile(
+    r"^(?P<name>[Α-ΩΆΈΉΊΌΎΏΪΫA-Z][Α-ΩΆΈΉΊΌΎΏΪΫA-Z.'\- ]{1,60}?)\s*"
+    r"(?:\((?P<party>[^()\n]{1,40})\))?\s*:(?:\s+|$)"
+)
+# The same, anywhere in a multi-line text, for chunk boundaries
+SPEAKER_LINE = re.compile(SPEAKER_PATTERN.pattern, re.MULTILINE)
+
+
+class SpeakerSegmenter:
+    """Incremental parser of speaker turns over a stream of non-empty pages
+
+    Offsets are positions in the newline-joined page texts, the same document
+    the chunker splits. Each turn's terms are counted as its lines go by, so
+    only the open turn is ever held in memory.
+    """
+
+    def __init__(self):
+        self.speakers = []      # speaker_id -> [name, party]
+        self.turns = []         # turn_id -> [speaker_id, first_page, last_page, start, end]
+        self.page_starts = []   # [page_number, offset] of each non-empty page
+        self.postings = {}      # term -> [[turn_id, term_frequency], ...]
+        self.lengths = []       # turn_id -> number of tokens
+        self._speaker_ids = {}
+        self._starts = []
+        self._terms = None
+        self.offset = 0
+
+    def feed(self, number: int, page: str):
+        """Add the next non-empty page"""
+        self.page_starts.append([number, self.offset])
+        position = self.offset
+        for line_number, line in enumerate(page.split('\n')):
+            match = SPEAKER_PATTERN.match(line)
+            if match:
+                self._close(position - 1)
+                speaker_id = self._speaker_id(match.group('name'), match.group('party') or '')
+                self.turns.append([speaker_id, number, number, position, None])
+                self._starts.append(position)
+                self._terms = Counter()
+            elif line_number == 0 and self._terms is not None:
+                # The open turn carries on onto this page
+                self.turns[-1][2] = number
+            if self._terms is not None:
+                self._terms.update(tokenize(line))
+            position += len(line) + 1
+        self.offset += len(page) + 1
+
+    def finish(self) -> 'SpeakerSegmenter':
+        self._close(self.offset - 1)
+        return self
+
+    def speaker_at(self, offset: int) -> Optional[Tuple[int, int]]:
+        """(turn_id, speaker_id) of the turn running at a document offset, if any"""
+        turn_id = bisect.bisect_right(self._starts, offset) - 1
+        if turn_id < 0:
+            return None
+        return turn_id, self.turns[turn_id][0]
+
+    def _speaker_id(self, name: str, party: str) -> int:
+        speaker = (' '.join(name.split()), ' '.join(party.split()))
+        speaker_id = self._speaker_ids.get(speaker)
+        if speaker_id is None:
+            speaker_id = self._speaker_ids[speaker] = len(self.speakers)
+            self.speakers.append(list(speaker))
+        return speaker_id
+
+    def _close(self, end: int):
+        if self._terms is None:
+            return
+        turn_id = len(self.turns) - 1
+        self.turns[turn_id][4] = end
+        for term, freq in self._terms.items():
+            self.postings.setdefault(term, []).append([turn_id, freq])
+        self.lengths.append(sum(self._terms.values()))
+        self._terms = None
+
+    def to_dict(self) -> dict:
+        return {
+            'speakers': self.speakers,
+            'turns': self.turns,
+            'page_starts': self.page_starts,
+            'index': InvertedIndex(self.postings, self.lengths,
+                                   [turn[1] for turn in self.turns]).to_dict(),
+        }
+
+
+def mp_key(name: str) -> str:
+    """Accent- and case-insensitive key of a speaker name"""
+    return ' '.join(fold_text(name).replace('.', ' ').split())
+
+
+class SpeakerIndex:
+    """Speaker turns of every session, indexed by MP across sessions
+
+    Each session's turns are an artifact keyed by its PDF content, holding who
+    spoke, their party, the page span and text offsets of every turn, and a BM25
+    index over the turns. The cross-session MP index maps each speaker to their
+    turns in every session, so "what did X say about Y" is answered from the
+    turns of X alone.
+    """
+    ARTIFACT_KIND = 'turns'
+    SEGMENTER_VERSION = 1   # Bump when SPEAKER_PATTERN or SpeakerSegmenter change their output
+    CACHE_DIR = 'media/speakers'
+
+    # Turn artifacts and MP index loaded by this process, keyed by path
+    _loaded = LoadedFiles('speaker_turns')
+
+    def __init__(self):
+        self.text_store = PDFTextStore()
+        self.artifacts = ArtifactStore()
+        os.makedirs(self.CACHE_DIR, exist_ok=True)
+
+    def get_pdf_path(self, filename: str) -> str:
+        return os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename)
+
+    def artifact_params(self) -> dict:
+        return {'segmenter': self.SEGMENTER_VERSION, 'text': self.text_store.artifact_params()}
+
+    def artifact_key(self, filename: str) -> str:
+        content_hash = self.text_store.content_hash(self.get_pdf_path(filename))
+        return self.artifacts.key(self.ARTIFACT_KIND, content_hash, **self.artifact_params())
+
+    def get_cache_path(self, filename: str) -> str:
+        return self.artifacts.path(self.ARTIFACT_KIND, self.artifact_key(filename))
+
+    def _read(self, path: str, default=None, cache: bool = True):
+        """Read a JSON file once per process, reloading it only when it changes"""
+        if not os.path.exists(path):
+            return default
+        mtime = os.stat(path).st_mtime_ns
+        loaded = self._loaded.get(path, mtime) if cache else None
+        if loaded is not None:
+            return loaded
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if 'index' in data:
+            data['index'] = InvertedIndex.from_dict(data['index'])
+        if cache:
+            self._loaded.put(path, mtime, data)
+        return data
+
+    def get_turns(self, filename: str, cache: bool = True) -> Optional[dict]:
+        """Speaker turns of a session, or None if they were not segmented yet; cache=False for one-off passes"""
+        return self._read(self.get_cache_path(filename), cache=cache)
+
+    def ensure_turns(self, filename: str) -> dict:
+        """Segment a session into speaker turns unless that was done, once for all concurrent callers"""
+        pdf_path = self.get_pdf_path(filename)
+        cache_path = self.get_cache_path(filename)
+
+        def segment():
+            segmenter = SpeakerSegmenter()
+            for number, page in self.text_store.iter_pages(pdf_path):
+                if page:
+                    segmenter.feed(number, page)
+            self.store(filename, segmenter.finish())
+            return self.get_turns(filename)
+
+        return single_flight(cache_path, lambda: self.get_turns(filename), segment)
+
+    def store(self, filename: str, segmenter: SpeakerSegmenter):
+        """Save the turns of a finished segmenter as the session's artifact"""
+        data = {**segmenter.to_dict(), 'segmented_at': str(datetime.now())}
+        self.artifacts.put(self.ARTIFACT_KIND, self.artifact_key(filename), data, source=filename,
+                           content_hash=self.text_store.content_hash(self.get_pdf_path(filename)),
+                           params=self.artifact_params())
+
+    def turn_text(self, filename: str, turns: dict, turn_id: int) -> str:
+        """Text of one turn, read from the stored pages it spans"""
+        speaker_id, first_page, last_page, start, end = turns['turns'][turn_id]
+        numbers = [number for number, offset in turns['page_starts']]
+        page_offset = turns['page_starts'][bisect.bisect_left(numbers, first_page)][1]
+        text = '\n'.join(self.text_store.iter_texts(self.get_pdf_path(filename), first_page, last_page))
+        return text[start - page_offset:end - page_offset].strip()
+
+    def session_speakers(self, filename: str) -> Optional[List[dict]]:
+        """Who spoke in a session and how much, in order of first appearance"""
+        turns = self.get_turns(filename)
+        if turns is None:
+            return None
+        counts, words, first_pages = Counter(), Counter(), {}
+        for turn_id, (speaker_id, first_page, last_page, start, end) in enumerate(turns['turns']):
+            counts[speaker_id] += 1
+            words[speaker_id] += turns['index'].lengths[turn_id]
+            first_pages.setdefault(speaker_id, first_page)
+        return [
+            {
+                'name': name,
+                'party': party,
+                'key': mp_key(name),
+                'contributions': counts[speaker_id],
+                'words': words[speaker_id],
+                'first_page': first_pages.get(speaker_id),
+            }
+            for speaker_id, (name, party) in enumerate(turns['speakers'])
+        ]
+
+    def speakers_in(self, filename: str, text: str) -> List[int]:
+        """Speaker ids of a session whose surname appears in text (e.g. a question)"""
+        turns = self.get_turns(filename)
+        if turns is None:
+            return []
+        words = set(tokenize(text))
+        matched = []
+        for speaker_id, (name, party) in enumerate(turns['speakers']):
+            surname = max(tokenize(name), key=len, default='')
+            # Greek surnames inflect at the end, so compare their stems
+            stem = surname[:max(4, len(surname) - 2)]
+            if len(surname) >= 4 and any(word.startswith(stem) for word in words):
+                matched.append(speaker_id)
+        return matched
+
+    def search_turns(self, filename: str, query: str, k: int = 5,
+                     speakers: Optional[Iterable[int]] = None) -> List[Tuple[float, int]]:
+        """Rank the turns of one session, optionally only those of some speakers"""
+        turns = self.get_turns(filename)
+        if turns is None:
+            return []
+        allowed = None
+        if speakers is not None:
+            speakers = set(speakers)
+            allowed = {turn_id for turn_id, turn in enumerate(turns['turns']) if turn[0] in speakers}
+        return turns['index'].search(query, k, allowed)
+
+    # Cross-session MP index
+
+    def get_index_path(self) -> str:
+        return os.path.join(self.CACHE_DIR, 'index.json')
+
+    def load_index(self) -> dict:
+        return self._read(self.get_index_path(), {
+            'sessions': {},     # filename -> turns artifact key
+            'mps': {},          # mp key -> {'name', 'party', 'sessions': {filename: [turn ids]}}
+            'pending': {},      # filename -> {'key', 'status'}: 'chunking' or 'failed'
+            'pdf_dir_mtime': None,
+        })
+
+    def sync(self, force: bool = False, build: bool = False) -> int:
+        """Add new or replaced sessions to the MP index and drop deleted ones
+
+        Only sessions already segmented are added; the others are queued for
+        chunking, which segments them, once and recorded as pending, as are those
+        that failed. With build=True (offline commands) they are segmented here.
+        The directory is marked as indexed either way, so requests do not rescan
+        it: the workers catch up with force=True when a chunking job is done.
+        """
+        pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
+        if not os.path.isdir(pdf_dir):
+            return 0
+        dir_mtime = os.stat(pdf_dir).st_mtime_ns
+        if not force and self.load_index()['pdf_dir_mtime'] == dir_mtime:
+            return 0
+
+        # One writer at a time; the others re-read the index it leaves behind
+        with file_lock('speaker-index'):
+            index = self.load_index()
+            if not force and index['pdf_dir_mtime'] == dir_mtime:
+                return 0
+            index = json.loads(json.dumps(index))  # Private copy of the cached index
+            present = sorted(f for f in os.listdir(pdf_dir) if f.endswith('.pdf'))
+
+            pending = {name: entry for name, entry in index.get('pending', {}).items() if name in present}
+            changed = 0
+            for filename in [name for name in index['sessions'] if name not in present]:
+                self._drop(index, filename)
+                changed += 1
+            for filename in present:
+                key = None
+                try:
+                    key = self.artifact_key(filename)
+                    if index['sessions'].get(filename) == key:
+                        continue
+                    waiting = pending.get(filename)
+                    unchanged = waiting is not None and waiting['key'] == key
+                    # Only a worker's sync (force) looks at a pending session again, not every request
+                    if unchanged and not force and not build:
+                        continue
+                    if build:
+                        self.ensure_turns(filename)
+                    # Read once for the merge, without keeping every session in the loaded files
+                    turns = self.get_turns(filename, cache=False)
+                    if turns is None:
+                        if not (unchanged and waiting['status'] == 'chunking'):
+                            from .job_queue import JobQueue  # job_queue imports this module
+                            from ..models import GenerationJob
+                            get_service(JobQueue).enqueue(GenerationJob.KIND_CHUNKS, filename)
+                        pending[filename] = {'key': key, 'status': 'chunking'}
+                        continue
+                except Exception as e:
+                    print(f"Error indexing speakers of {filename}: {e}")
+                    pending[filename] = {'key': key, 'status': 'failed'}
+                    continue
+                pending.pop(filename, None)
+                self._drop(index, filename)
+                self._add(index, filename, key, turns)
+                changed += 1
+
+            index['pending'] = pending
+            index['pdf_dir_mtime'] = dir_mtime
+            atomic_write_json(self.get_index_path(), index, separators=(',', ':'))
+        return changed
+
+    def _drop(self, index: dict, filename: str):
+        index['sessions'].pop(filename, None)
+        for key in list(index['mps']):
+            entry = index['mps'][key]
+            if entry['sessions'].pop(filename, None) is not None and not entry['sessions']:
+                del index['mps'][key]
+
+    def _add(self, index: dict, filename: str, key: str, turns: dict):
+        index['sessions'][filename] = key
+        for turn_id, turn in enumerate(turns['turns']):
+            name, party = turns['speakers'][turn[0]]
+            entry = index['mps'].setdefault(mp_key(name), {'name': name, 'party': party, 'sessions': {}})
+            if party:
+                entry['party'] = party
+            entry['sessions'].setdefault(filename, []).append(turn_id)
+
+    def list_mps(self) -> List[dict]:
+        """Every speaker in the index with their session and turn counts"""
+        return sorted((
+            {
+                'key': key,
+                'name': entry['name'],
+                'party': entry['party'],
+                'sessions': len(entry['sessions']),
+                'contributions': sum(len(ids) for ids in entry['sessions'].values()),
+            }
+            for key, entry in self.load_index()['mps'].items()
+        ), key=lambda mp: mp['name'])
+
+    def find_mps(self, name: str) -> List[str]:
+        """MP keys matching a (partial, accent-insensitive) name"""
+        wanted = mp_key(name)
+        mps = self.load_index()['mps']
+        if wanted in mps:
+            return [wanted]
+        return [key for key in mps if wanted and wanted in key]
+
+    def what_did_they_say(self, name: str, query: str = '', k: int = 10,
+                          filename: Optional[str] = None) -> List[dict]:
+        """Turns of an MP about a topic, best first, read straight from the indexes"""
+        mps = self.load_index()['mps']
+        ranked = []
+        for key in self.find_mps(name):
+            for session, turn_ids in mps[key]['sessions'].items():
+                if filename and session != filename:
+                    continue
+                turns = self.get_turns(session)
+                if turns is None:
+                    continue
+                if query.strip():
+                    hits = turns['index'].search(query, k, set(turn_ids))
+                else:
+                    hits = [(0.0, turn_id) for turn_id in turn_ids[:k]]
+                ranked.extend((score, session, turn_id) for score, turn_id in hits)
+
+        best = heapq.nlargest(k, ranked, key=lambda hit: hit[0]) if query.strip() else ranked[:k]
+        results = []
+        for score, session, turn_id in best:
+            turns = self.get_turns(session)
+            speaker_id, first_page, last_page, start, end = turns['turns'][turn_id]
+            name, party = turns['speakers'][speaker_id]
+            results.append({
+                'session': session,
+                'speaker': name,
+                'party': party,
+                'turn': turn_id,
+                'pages': [first_page, last_page],
+                'score': round(score, 4),
+                'text': self.turn_text(session, turns, turn_id),
+                'url': f'/media/pdf_documents/{session}',
+            })
+        return results
@@ -0,0 +1,165 @@
+import os
+import asyncio
+import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are coordinated
+    fcntl = None
+
+LOCK_DIR = 'media/locks'
+
+T = TypeVar('T')
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', encoding: Optional[str] = 'utf-8'):
+    """Write to a temp file in the same directory, then rename it over path
+
+    Readers see either the old file or the complete new one, never a partial write.
+    The directory is created if needed, so looking a path up never creates one.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with open(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path: str, data, **dump_kwargs):
+    dump_kwargs.setdefault('ensure_ascii', False)
+    with atomic_write(path) as f:
+        json.dump(data, f, **dump_kwargs)
+
+
+@contextmanager
+def file_lock(key: str):
+    """Exclusive lock shared by all processes on this host, named after key
+
+    The lock file exists only while the lock is held or waited for: the
+    holder deletes it before unlocking, so keys used once (one per Q&A
+    question) leave nothing behind. A waiter that then gets the lock on the
+    deleted file sees that the path no longer points to it and starts over.
+    Keys are not mapped onto a fixed set of files, because these locks nest
+    and two keys sharing a file would deadlock.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    lock_path = os.path.join(LOCK_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.lock')
+    while True:
+        f = open(lock_path, 'a')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and current.st_ino == os.fstat(f.fileno()).st_ino:
+                break
+        except BaseException:
+            f.close()
+            raise
+        # Locked a file its holder deleted on release
+        f.close()
+    try:
+        yield
+    finally:
+        try:
+            os.unlink(lock_path)
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            f.close()
+
+
+class _KeyedLocks:
+    """Per-key thread locks that are discarded once nobody holds or waits for them"""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks = {}  # key -> [lock, number of users]
+
+    @contextmanager
+    def hold(self, key: str):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+_thread_locks = _KeyedLocks()
+
+
+def single_flight(key: str, lookup: Callable[[], Optional[T]], generate: Callable[[], T]) -> T:
+    """Return lookup() if it has a result, otherwise run generate() once per key
+
+    Concurrent callers for the same key, whether threads of this process or other
+    processes on the host, wait for the one running generate() and then get the
+    result through lookup(). generate() is expected to store what it returns.
+    """
+    result = lookup()
+    if result is not None:
+        return result
+    with _thread_locks.hold(key):
+        result = lookup()
+        if result is not None:
+            return result
+        with file_lock(key):
+            result = lookup()
+            if result is not None:
+                return result
+            return generate()
+
+
+_async_inflight = {}  # (event loop, key) -> asyncio.Task of the running generation
+
+
+async def async_single_flight(key: str, lookup: Callable[[], Awaitable[Optional[T]]],
+                              generate: Callable[[], Awaitable[T]]) -> T:
+    """Coroutine version of single_flight, coalescing callers on the same event loop
+
+    Waiting callers await the first caller's result instead of blocking a thread
+    on a lock, so one event loop can hold many coalesced requests. generate()
+    runs in its own task: a caller that is cancelled (e.g. its client went
+    away) stops waiting, but the result still reaches the others and the cache.
+    """
+    result = await lookup()
+    if result is not None:
+        return result
+
+    loop = asyncio.get_running_loop()
+    inflight_key = (loop, key)
+    task = _async_inflight.get(inflight_key)
+    if task is None:
+        task = asyncio.ensure_future(generate(), loop=loop)
+        _async_inflight[inflight_key] = task
+
+        def done(task):
+            if _async_inflight.get(inflight_key) is task:
+                del _async_inflight[inflight_key]
+            if not task.cancelled():
+                task.exception()  # Mark as retrieved when every caller was cancelled
+
+        task.add_done_callback(done)
+    return await asyncio.shield(task)
@@ -2,94 +2,90 @@ import os
 import json
 from pathlib import Path
 from datetime import datetime
-import google.generativeai as genai
 from django.conf import settings
-import PyPDF2
+from .base_service import BaseService
 
-class SessionSummarizer:
-    CACHE_DIR = 'media/summaries'
+class SessionSummarizer(BaseService):
+    ARTIFACT_KIND = 'summary'
+    LEGACY_CACHE = 'media/summaries/{filename}.json'
+    LEGACY_PROMPT = '072e46f67f6f'
 
-    def __init__(self):
-        # Ensure cache directory exists
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
-        
-        # Initialize Gemini (you'll need to set GEMINI_API_KEY in settings)
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
+    PROMPT = """
+        Based on the following parliamentary session transcript, please provide a summary including:
+        1. Main topics discussed - an emphasis on the discussion around legislation
+        2. Notable debates or disagreements
+        3. Key decisions made
+        4. Voting results with the number of votes for and against
 
-    def get_cache_path(self, filename):
-        """Get path for cached summary"""
-        return os.path.join(self.CACHE_DIR, f"{filename}.json")
+        Format the response in markdown with clear headings and bullet points.
 
-    def get_cached_summary(self, filename):
-        """Retrieve cached summary if it exists"""
-        cache_path = self.get_cache_path(filename)
-        if os.path.exists(cache_path):
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+        Transcript:
+        {text}
+        """
 
-    def cache_summary(self, filename, summary_data):
-        """Save summary to cache"""
-        cache_path = self.get_cache_path(filename)
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(summary_data, f, ensure_ascii=False, indent=2)
+    # Long transcripts: each section is condensed, then the notes are merged
+    MAP_PROMPT = """
+        The following is one section of a longer parliamentary session transcript.
+        List, as concise markdown bullet points:
+        1. Topics discussed, especially legislation
+        2. Debates or disagreements, naming the speakers and their positions
+        3. Decisions made
+        4. Voting results with the exact number of votes for and against
 
-    def read_pdf_content(self, pdf_path):
-        """Extract text content from PDF"""
-        text_content = ""
-        try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text() + "\n"
-            return text_content
-        except Exception as e:
-            print(f"Error reading PDF: {e}")
-            return ""
+        Only include what is in this section.
 
-    def generate_summary(self, pdf_path):
-        """Generate summary using Gemini"""
-        # Read PDF content
-        pdf_content = self.read_pdf_content(pdf_path)
-        if not pdf_content:
-            return {
-                'summary': "Error: Could not read PDF content",
-                'generated_at': str(datetime.now()),
-                'format': 'markdown'
-            }
-
-        prompt = f"""
-        Based on the following parliamentary session transcript, please provide a summary including:
+        Section:
+        {text}
+        """
+
+    REDUCE_PROMPT = """
+        The following are notes taken, section by section, from one parliamentary session transcript.
+        Combine them into a single summary of the whole session including:
         1. Main topics discussed - an emphasis on the discussion around legislation
         2. Notable debates or disagreements
         3. Key decisions made
         4. Voting results with the number of votes for and against
 
+        Merge points that span several sections and do not repeat them.
         Format the response in markdown with clear headings and bullet points.
 
-        Transcript:
-        {pdf_content[:30000]}  # Limiting content length to avoid token limits
+        Notes:
+        {text}
         """
-        
-        response = self.model.generate_content(prompt)
-        
+
+    def usable(self, data):
+        return bool(data.get('summary')) and not data['summary'].startswith('Error')
+
+    def get_cached_summary(self, filename):
+        """Retrieve cached summary if it exists"""
+        return self.get_cached_data(filename)
+
+    def cache_summary(self, filename, summary_data):
+        """Save summary to cache"""
+        self.cache_data(filename, summary_data)
+
+    def read_pdf_content(self, pdf_path):
+        """Stream the text of the PDF page by page from the shared extracted-text store
+
+        Errors propagate, so the job that asked is retried instead of caching them.
+        """
+        self.text_store.ensure_extracted(pdf_path)
+        return self.text_store.iter_texts(pdf_path)
+
+    def generate_summary(self, pdf_path):
+        """Generate summary using Gemini"""
+        # Stream the PDF content through the map-reduce pipeline
+        summary = self.map_reduce(self.read_pdf_content(pdf_path), self.PROMPT, self.MAP_PROMPT, self.REDUCE_PROMPT)
+        if summary is None:
+            raise ValueError("Could not read PDF content")
+
         return {
-            'summary': response.text,
+            'summary': summary,
             'generated_at': str(datetime.now()),
             'format': 'markdown'
         }
 
     def get_or_generate_summary(self, filename):
-        """Get cached summary or generate new one"""
-        # Try to get cached summary
-        summary_data = self.get_cached_summary(filename)
-        
-        if summary_data is None:
-            # Generate new summary
-            pdf_path = os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename)
-            summary_data = self.generate_summary(pdf_path)
-            # Cache the new summary
-            self.cache_summary(filename, summary_data)
-        
-        return summary_data
+        """Get cached summary or generate new one, once for all concurrent callers"""
+        pdf_path = self.get_pdf_path(filename)
+        return self.get_or_generate(filename, lambda: self.generate_summary(pdf_path))
@@ -2,59 +2,16 @@ import os
 import json
 from datetime import datetime
 from pathlib import Path
-import google.generativeai as genai
+from typing import Iterable, Iterator, Union
 from django.conf import settings
-from PyPDF2 import PdfReader
+from .base_service import BaseService
 
-class TopicExtractor:
-    CACHE_DIR = 'media/topics'
+class TopicExtractor(BaseService):
+    ARTIFACT_KIND = 'topics'
+    LEGACY_CACHE = 'media/topics/{base}_topics.json'
+    LEGACY_PROMPT = '33e67f751b07'
 
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
-
-    def get_cache_path(self, filename: str) -> str:
-        """Get path for cached topics"""
-        base = os.path.splitext(filename)[0]
-        return os.path.join(self.CACHE_DIR, f"{base}_topics.json")
-
-    def get_cached_topics(self, filename: str) -> dict:
-        """Retrieve cached topics if they exist"""
-        cache_path = self.get_cache_path(filename)
-        if os.path.exists(cache_path):
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
-
-    def cache_topics(self, filename: str, topics_data: dict):
-        """Save topics to cache"""
-        cache_path = self.get_cache_path(filename)
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(topics_data, f, ensure_ascii=False, indent=2)
-
-    def read_pdf_content(self, pdf_path: str) -> str:
-        """Read content from PDF file"""
-        try:
-            reader = PdfReader(pdf_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
-        except Exception as e:
-            print(f"Error reading PDF: {e}")
-            return ""
-
-    def extract_topics(self, text: str) -> dict:
-        """Extract topics from the session text"""
-        if not text.strip():
-            return {
-                'topics': "Error: No content available to analyze",
-                'generated_at': str(datetime.now()),
-                'sections_found': False
-            }
-
-        prompt = """
+    PROMPT = """
         Ανάλυσε το παρακάτω κείμενο της κοινοβουλευτικής συνεδρίασης και εντόπισε όλα τα νομοθετικά θέματα.
         
         Για κάθε θέμα που εντοπίζεις, παρέχε:
@@ -80,30 +37,79 @@ class TopicExtractor:
         Κείμενο συνεδρίασης:
         {text}
         """
-        
-        try:
-            response = self.model.generate_content(prompt.format(text=text[:30000]))
-            return {
-                'topics': response.text,
-                'generated_at': str(datetime.now()),
-                'sections_found': True
-            }
-        except Exception as e:
-            print(f"Error generating topics: {e}")
-            return {
-                'topics': f"Error generating topics: {str(e)}",
-                'generated_at': str(datetime.now()),
-                'sections_found': False
-            }
+
+    # Long transcripts: legislative items are listed per section, then merged
+    MAP_PROMPT = """
+        Το παρακάτω είναι ένα τμήμα από το κείμενο μιας κοινοβουλευτικής συνεδρίασης.
+        Εντόπισε όλα τα νομοθετικά θέματα (νομοσχέδια, προτάσεις νόμου, τροπολογίες) που συζητούνται σε αυτό.
+
+        Για κάθε θέμα δώσε σύντομα, σε markdown:
+        1. Τίτλο του νομοσχεδίου/πρότασης/τροπολογίας
+        2. Σκοπό
+        3. Προτεινόμενες αλλαγές
+        4. Αποτέλεσμα ψηφοφορίας με τους ακριβείς αριθμούς (αν υπάρχει σε αυτό το τμήμα)
+
+        Τμήμα κειμένου:
+        {text}
+        """
+
+    REDUCE_PROMPT = """
+        Τα παρακάτω είναι σημειώσεις για τα νομοθετικά θέματα, τμήμα προς τμήμα, από μία κοινοβουλευτική συνεδρίαση.
+        Συγχώνευσε τα θέματα που εμφανίζονται σε περισσότερα από ένα τμήματα και παρουσίασε κάθε θέμα μία φορά.
+
+        Μορφοποίησε την απάντηση σε markdown ως εξής:
+
+        ## 1. [Τίτλος νομοσχεδίου]
+
+        ### Σκοπός
+        [Περιγραφή σκοπού]
+
+        ### Προτεινόμενες Αλλαγές
+        - [Αλλαγή 1]
+        - [Αλλαγή 2]
+
+        ### Αποτέλεσμα
+        [Αποτέλεσμα ψηφοφορίας αν υπάρχει]
+
+        Σημειώσεις:
+        {text}
+        """
+
+    def usable(self, data: dict) -> bool:
+        return bool(data.get('topics')) and data.get('sections_found', False)
+
+    def get_cached_topics(self, filename: str) -> dict:
+        """Retrieve cached topics if they exist"""
+        return self.get_cached_data(filename)
+
+    def cache_topics(self, filename: str, topics_data: dict):
+        """Save topics to cache"""
+        self.cache_data(filename, topics_data)
+
+    def read_pdf_content(self, pdf_path: str) -> Iterator[str]:
+        """Stream the text of the PDF page by page from the shared extracted-text store
+
+        Errors propagate, so the job that asked is retried instead of caching them.
+        """
+        self.text_store.ensure_extracted(pdf_path)
+        return self.text_store.iter_texts(pdf_path)
+
+    def extract_topics(self, text: Union[str, Iterable[str]]) -> dict:
+        """Extract topics from the session text, given as a string or a stream of page texts"""
+        # Model errors (ThrottledError included) propagate to the job, which retries it
+        topics = self.map_reduce(text, self.PROMPT, self.MAP_PROMPT, self.REDUCE_PROMPT)
+        if topics is None:
+            raise ValueError("No content available to analyze")
+        return {
+            'topics': topics,
+            'generated_at': str(datetime.now()),
+            'sections_found': True
+        }
 
     def get_or_generate_topics(self, filename: str, text: str) -> dict:
-        """Get cached topics or generate new ones"""
-        topics_data = self.get_cached_topics(filename)
-        
-        if topics_data is None:
-            if os.path.isfile(text):
-                text = self.read_pdf_content(text)
-            topics_data = self.extract_topics(text)
-            self.cache_topics(filename, topics_data)
-        
-        return topics_data 
\ No newline at end of file
+        """Get cached topics or generate new ones, once for all concurrent callers"""
+        def generate():
+            content = self.read_pdf_content(text) if os.path.isfile(text) else text
+            return self.extract_topics(content)
+
+        return self.get_or_generate(filename, generate)
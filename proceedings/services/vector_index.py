@@ -0,0 +1,141 @@
+import os
+import zlib
+import math
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .memory_cache import LoadedFiles
+from .search_index import tokenize
+from .storage import atomic_write
+
+
+class HashingEmbedder:
+    """Deterministic offline embedder: signed feature hashing of words and character trigrams"""
+    name = 'hashing-v1'
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> Counter:
+        features = Counter()
+        for token in tokenize(text):
+            features[token] += 1.0
+            # Trigrams of the padded word let inflected Greek forms share most features
+            padded = f'<{token}>'
+            for i in range(len(padded) - 2):
+                features[padded[i:i + 3]] += 0.5
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return one L2-normalized float32 row per text"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text).items():
+                h = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[row, h % self.dim] += sign * (1.0 + math.log(weight + 1.0))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+_embedder = None
+
+
+def get_embedder():
+    """Process-wide embedder, chosen with the AGORA_EMBEDDER setting"""
+    global _embedder
+    if _embedder is None:
+        path = getattr(settings, 'AGORA_EMBEDDER', 'proceedings.services.vector_index.HashingEmbedder')
+        _embedder = import_string(path)()
+    return _embedder
+
+
+class VectorIndex:
+    """IVF index over chunk embeddings, stored as a memory-mapped float32 matrix
+
+    Rows of the matrix are grouped by inverted list, so each probed list is a
+    contiguous slice of the file. The matrix is opened with mmap_mode='r', which
+    lets all worker processes share the same pages of the OS page cache.
+    """
+    KMEANS_ITERATIONS = 10
+    MIN_ROWS_PER_LIST = 64
+
+    # Indexes opened by this process, keyed by vectors path
+    _loaded = LoadedFiles('vector_indexes')
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, offsets: np.ndarray,
+                 ids: np.ndarray, embedder_name: str):
+        self.vectors = vectors        # (n, dim) float32, rows grouped by list
+        self.centroids = centroids    # (nlist, dim) float32
+        self.offsets = offsets        # list i spans rows offsets[i]:offsets[i + 1]
+        self.ids = ids                # row -> chunk id
+        self.embedder_name = embedder_name
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, embedder_name: str) -> 'VectorIndex':
+        """Cluster embeddings with spherical k-means and group rows by cluster"""
+        n = len(embeddings)
+        nlist = max(1, min(int(math.sqrt(n)), n // cls.MIN_ROWS_PER_LIST))
+        rng = np.random.RandomState(0)
+        centroids = embeddings[rng.permutation(n)[:nlist]].copy() if n else embeddings[:0]
+        assignments = np.zeros(n, dtype=np.int64)
+        for _ in range(cls.KMEANS_ITERATIONS if nlist > 1 else 0):
+            assignments = np.argmax(embeddings @ centroids.T, axis=1)
+            for i in range(nlist):
+                members = embeddings[assignments == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(np.ascontiguousarray(embeddings[order], dtype=np.float32),
+                   centroids.astype(np.float32), offsets, order.astype(np.int64), embedder_name)
+
+    def save(self, vectors_path: str, ivf_path: str):
+        with atomic_write(vectors_path, 'wb') as f:
+            np.save(f, self.vectors)
+        with atomic_write(ivf_path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, ids=self.ids,
+                     embedder=np.array(self.embedder_name))
+
+    @classmethod
+    def load(cls, vectors_path: str, ivf_path: str) -> 'VectorIndex':
+        """Open an index zero-copy, once per process until the files change"""
+        mtime = os.stat(vectors_path).st_mtime_ns
+        loaded = cls._loaded.get(vectors_path, mtime)
+        if loaded is not None:
+            return loaded
+        with np.load(ivf_path) as ivf:
+            index = cls(np.load(vectors_path, mmap_mode='r'), ivf['centroids'], ivf['offsets'],
+                        ivf['ids'], str(ivf['embedder']))
+        cls._loaded.put(vectors_path, mtime, index)
+        return index
+
+    def search(self, query_vector: np.ndarray, k: int = 5, nprobe: int = 0,
+               allowed: Optional[Iterable[int]] = None) -> List[Tuple[float, int]]:
+        """Return up to k (cosine score, chunk_id) pairs from the nprobe closest lists
+
+        With allowed chunk ids (e.g. a page range), those rows are scored exhaustively instead.
+        """
+        nlist = len(self.centroids)
+        if not nlist:
+            return []
+        if allowed is not None:
+            rows = np.flatnonzero(np.isin(self.ids, np.fromiter(allowed, dtype=np.int64)))
+        else:
+            nprobe = nprobe or max(1, int(math.ceil(nlist / 4)))
+            probed = np.argsort(-(self.centroids @ query_vector))[:nprobe]
+            rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in probed])
+        if not len(rows):
+            return []
+        scores = self.vectors[rows] @ query_vector
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(self.ids[rows[i]])) for i in top]
@@ -0,0 +1,466 @@
+import os
+import asyncio
+import time
+import tempfile
+import unittest
+import threading
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from proceedings.services.answer_cache import AnswerCache
+from proceedings.services.artifact_store import ArtifactStore
+from proceedings.services.batch_qa import split_answers
+from proceedings.services.chunk_store import ChunkTable
+from proceedings.services.corpus_search import CorpusIndex
+from proceedings.services.fragments import render_markdown, sanitize_html
+from proceedings.services.llm_backends import ThrottledError
+from proceedings.services.memory_cache import LoadedFiles
+from proceedings.services.packed import PackedFile, write_packed
+from proceedings.services.rate_limiter import BACKGROUND, INTERACTIVE, PrioritySlots
+from proceedings.services.search_index import InvertedIndex
+from proceedings.services.speaker_index import SpeakerSegmenter
+from proceedings.services.storage import async_single_flight
+from proceedings.services.summarizer import SessionSummarizer
+
+
+class AnswerCacheTests(SimpleTestCase):
+    SCOPE = 'test-scope'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_exact_tier_ignores_case_accents_and_punctuation(self):
+        answers = AnswerCache()
+        answers.set('Τι είπε ο Υπουργός;', [], self.SCOPE, 'απάντηση')
+        self.assertEqual(answers.get('τι ειπε ο υπουργος', [], self.SCOPE), 'απάντηση')
+        self.assertEqual(answers.local_stats['exact_hits'], 1)
+
+    def test_history_and_scope_are_part_of_the_key(self):
+        answers = AnswerCache()
+        history = [{'role': 'user', 'content': 'Για τον προϋπολογισμό'}]
+        answers.set('Τι είπε ο Υπουργός;', history, self.SCOPE, 'απάντηση')
+        self.assertIsNone(answers.get('Τι είπε ο Υπουργός;', [], self.SCOPE))
+        self.assertIsNone(answers.get('Τι είπε ο Υπουργός;', history, 'other-scope'))
+        self.assertEqual(answers.get('Τι είπε ο Υπουργός;', history, self.SCOPE), 'απάντηση')
+
+    def test_similarity_tier_is_off_by_default(self):
+        answers = AnswerCache()
+        answers.set('Τι είπε ο Υπουργός Οικονομικών για τις δαπάνες υγείας;', [], self.SCOPE, 'υγεία')
+        self.assertIsNone(answers.get('Τι ακριβώς είπε ο Υπουργός Οικονομικών για τις δαπάνες υγείας;',
+                                      [], self.SCOPE))
+
+    @override_settings(AGORA_QA_SIMILARITY=0.92)
+    def test_similarity_tier_serves_rewordings(self):
+        answers = AnswerCache()
+        answers.set('Τι είπε ο Υπουργός Οικονομικών για τις δαπάνες υγείας;', [], self.SCOPE, 'υγεία')
+        for question in ('Τι ακριβώς είπε ο Υπουργός Οικονομικών για τις δαπάνες υγείας?',
+                         'Ο Υπουργός Οικονομικών τι είπε για τις δαπάνες υγείας'):
+            self.assertEqual(answers.get(question, [], self.SCOPE), 'υγεία', question)
+        self.assertEqual(answers.local_stats['similar_hits'], 2)
+
+    @override_settings(AGORA_QA_SIMILARITY=0.5)
+    def test_similarity_tier_never_answers_a_different_question(self):
+        answers = AnswerCache()
+        pairs = [
+            ('Τι είπε ο Υπουργός Οικονομικών για τις δαπάνες υγείας;',
+             'Τι είπε ο Υπουργός Οικονομικών για τις δαπάνες παιδείας;'),
+            ('Ποιος ψήφισε υπέρ του νομοσχεδίου;', 'Ποιος ψήφισε κατά του νομοσχεδίου;'),
+            ('Ποιοι βουλευτές ψήφισαν το νομοσχέδιο;', 'Ποιοι βουλευτές δεν ψήφισαν το νομοσχέδιο;'),
+            ('Τι ψηφίστηκε μετά τη συζήτηση;', 'Τι ψηφίστηκε χωρίς συζήτηση;'),
+            ('Πόσοι βουλευτές ψήφισαν το 2023;', 'Πόσοι βουλευτές ψήφισαν το 2024;'),
+            ('Τι είπε ο κ. Νεοφύτου για την ακρίβεια;', 'Τι είπε η κα Νεοφύτου για την ακρίβεια;'),
+        ]
+        for cached, asked in pairs:
+            answers.set(cached, [], self.SCOPE, cached)
+            self.assertIsNone(answers.get(asked, [], self.SCOPE), asked)
+        self.assertEqual(answers.local_stats['similar_hits'], 0)
+
+
+class SplitAnswersTests(SimpleTestCase):
+    def test_answers_by_session_number(self):
+        text = ('=== ΣΥΝΕΔΡΙΑ 1 ===\nΠρώτη απάντηση.\n\n'
+                '**=== ΣΥΝΕΔΡΙΑ 2 ===**\nΔεύτερη\nσε δύο γραμμές.\n'
+                '## === ΣΥΝΕΔΡΙΑ 3 ===\nΤρίτη.')
+        self.assertEqual(split_answers(text, 3), {1: 'Πρώτη απάντηση.', 2: 'Δεύτερη\nσε δύο γραμμές.', 3: 'Τρίτη.'})
+
+    def test_missing_empty_repeated_and_unknown_sessions_are_left_out(self):
+        text = ('Εισαγωγή χωρίς επικεφαλίδα\n=== ΣΥΝΕΔΡΙΑ 2 ===\n\n=== ΣΥΝΕΔΡΙΑ 3 ===\nΤρίτη.\n'
+                '=== ΣΥΝΕΔΡΙΑ 3 ===\nΞανά.\n=== ΣΥΝΕΔΡΙΑ 7 ===\nΆγνωστη.')
+        self.assertEqual(split_answers(text, 3), {3: 'Τρίτη.'})
+        self.assertEqual(split_answers('Καμία επικεφαλίδα', 2), {})
+
+
+class PackedStorageTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+
+    def test_write_packed_round_trip(self):
+        path = os.path.join(self.dir, 'data.pack')
+        vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+        write_packed(path, {'odd': np.array([1, 2, 3], dtype=np.uint8), 'vectors': vectors,
+                            'blob': 'κείμενο'.encode('utf-8')}, version=2)
+        packed = PackedFile(path)
+        self.assertEqual(packed.meta, {'version': 2})
+        self.assertEqual(packed.array('odd').tolist(), [1, 2, 3])
+        # Sections after an odd-sized one are still aligned for zero-copy views; arrays come back flat
+        np.testing.assert_array_equal(packed.array('vectors').reshape(3, 4), vectors)
+        self.assertEqual(packed.array('vectors').ctypes.data % 4, 0)
+        self.assertEqual(str(packed.blob('blob'), 'utf-8'), 'κείμενο')
+
+    def test_rejects_other_files(self):
+        path = os.path.join(self.dir, 'other.json')
+        with open(path, 'wb') as f:
+            f.write(b'{"not": "packed"}')
+        with self.assertRaises(ValueError):
+            PackedFile(path)
+
+    def test_chunk_table_round_trip(self):
+        path = os.path.join(self.dir, 'chunks.pack')
+        chunks = ['Πρώτο κομμάτι.', '', 'Τρίτο — με σύμβολα € και ünicode.']
+        ChunkTable.write(path, chunks, [1, 1, 4])
+        table = ChunkTable.open(path)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(list(table), chunks)
+        self.assertEqual(table[-1], chunks[-1])
+        self.assertEqual(table[1:], chunks[1:])
+        self.assertEqual(table.pages, [1, 1, 4])
+        with self.assertRaises(IndexError):
+            table[3]
+
+    def test_inverted_index_save_and_load(self):
+        path = os.path.join(self.dir, 'index.pack')
+        chunks = ['Ο προϋπολογισμός της υγείας αυξάνεται.',
+                  'Η Βουλή ψήφισε τον προϋπολογισμό.',
+                  'Συζήτηση για την παιδεία και την υγεία, την υγεία πρώτα.']
+        built = InvertedIndex.build(chunks, [1, 2, 3])
+        built.save(path)
+        loaded = InvertedIndex.load(path)
+        self.assertEqual(loaded.lengths, built.lengths)
+        self.assertEqual(loaded.pages, [1, 2, 3])
+        self.assertEqual(sorted(loaded.postings), sorted(built.postings))
+        for query in ('υγεία', 'ΠΡΟΫΠΟΛΟΓΙΣΜΟΣ', 'παιδεία υγεία', 'ανύπαρκτος'):
+            self.assertEqual(loaded.search(query), built.search(query), query)
+        self.assertEqual([chunk_id for _, chunk_id in loaded.search('υγεία')], [2])
+        self.assertEqual(loaded.search('υγεία', allowed={0, 1}), [])
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'counts open descriptors in /proc')
+    def test_loaded_files_release_the_maps_they_evict(self):
+        loaded = LoadedFiles('test', max_entries=4)
+        paths = []
+        for session in range(40):
+            paths.append(os.path.join(self.dir, f'{session}.chunks'))
+            ChunkTable.write(paths[-1], [f'Συνεδρία {session}'], [1])
+            InvertedIndex.build([f'Συνεδρία {session}']).save(paths[-1] + '.index')
+        before = len(os.listdir('/proc/self/fd'))
+        for path in paths:
+            if loaded.get(path, 1) is None:
+                loaded.put(path, 1, (ChunkTable.open(path), InvertedIndex.load(path + '.index')))
+        self.assertEqual(len(loaded), 4)
+        # Two maps per session still loaded; the 36 evicted sessions hold no descriptors
+        self.assertLessEqual(len(os.listdir('/proc/self/fd')) - before, 8)
+        self.assertEqual(loaded.get(paths[-1], 1)[0][0], 'Συνεδρία 39')
+        self.assertIsNone(loaded.get(paths[0], 1))
+        self.assertIsNone(loaded.get(paths[-1], 2))
+
+    def test_detached_index_outlives_its_file(self):
+        path = os.path.join(self.dir, 'index.pack')
+        InvertedIndex.build(['υγεία και παιδεία', 'υγεία']).save(path)
+        detached = InvertedIndex.load(path).detach()
+        os.remove(path)
+        self.assertEqual(detached.postings, {'υγεια': [[0, 1], [1, 1]], 'και': [[0, 1]], 'παιδεια': [[0, 1]]})
+        self.assertEqual(detached.lengths, [3, 1])
+
+
+class ArtifactStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = mock.patch.object(ArtifactStore, 'ROOT', directory.name)
+        root.start()
+        self.addCleanup(root.stop)
+        self.store = ArtifactStore()
+
+    def test_lookups_create_no_directories(self):
+        path = self.store.path('summary', 'ab' + '0' * 62)
+        self.assertIsNone(self.store.get('summary', 'ab' + '0' * 62))
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+        self.store.put('summary', 'ab' + '0' * 62, {'summary': 'Περίληψη'})
+        self.assertEqual(self.store.get('summary', 'ab' + '0' * 62), {'summary': 'Περίληψη'})
+
+    def test_garbage_collection_keeps_artifacts_written_during_the_run(self):
+        old, kept, new = 'aa' + '1' * 62, 'bb' + '2' * 62, 'cc' + '3' * 62
+        for key in (old, kept):
+            self.store.put('summary', key, {'summary': key})
+            os.utime(self.store.path('summary', key), (1, 1))
+        started = time.time() - 1
+        # Written after the reachable keys were computed, so it is not among them
+        self.store.put('summary', new, {'summary': new})
+        removed = self.store.collect_garbage([kept], started=started)
+        self.assertEqual(removed, [self.store.path('summary', old)])
+        self.assertTrue(os.path.exists(self.store.path('summary', new)))
+        self.assertEqual(sorted(self.store.manifest()), [kept, new])
+
+
+class CorpusSyncTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.pdf_dir = os.path.join(directory.name, 'pdf_documents')
+        os.makedirs(self.pdf_dir)
+        for filename in ('a.pdf', 'b.pdf'):
+            with open(os.path.join(self.pdf_dir, filename), 'wb') as f:
+                f.write(b'%PDF-1.4 ' + filename.encode())
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache_dir = mock.patch.object(CorpusIndex, 'CACHE_DIR', os.path.join(directory.name, 'search'))
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+        self.index = CorpusIndex()
+        self.chunked = {'a.pdf'}
+        self.index.chunk_manager = mock.Mock(chunk_exists=lambda filename: filename in self.chunked)
+        self.index.chunk_manager.load.side_effect = self.load
+
+    def load(self, filename, cache=True):
+        chunks = [f'Συνεδρία {filename[0]}']
+        return chunks, InvertedIndex.build(chunks)
+
+    def test_pending_session_is_queued_once_and_merged_by_the_worker(self):
+        with mock.patch('proceedings.services.corpus_search.queue_chunks') as queue_chunks:
+            self.assertEqual(self.index.sync(), 1)
+            manifest = self.index.load_manifest()
+            self.assertEqual(manifest['pending']['b.pdf']['status'], 'chunking')
+            self.assertEqual(manifest['pdf_dir_mtime'], os.stat(self.pdf_dir).st_mtime_ns)
+
+            # Requests neither rescan the directory nor queue the session again
+            self.chunked.add('b.pdf')
+            self.assertEqual(self.index.sync(), 0)
+            self.assertEqual(self.index.sync(force=True), 1)
+            self.assertEqual(self.index.sync(force=True), 0)
+        queue_chunks.assert_called_once_with('b.pdf')
+        self.assertEqual(self.index.load_manifest()['pending'], {})
+        self.assertEqual([hit['session'] for hit in self.index.search('b')], ['b.pdf'])
+
+    def test_failed_session_is_recorded_without_blocking_the_directory(self):
+        self.chunked.add('b.pdf')
+
+        def load(filename, cache=True):
+            if filename == 'b.pdf':
+                raise OSError('Truncated chunk table')
+            return self.load(filename)
+        self.index.chunk_manager.load.side_effect = load
+        self.assertEqual(self.index.sync(), 1)
+        manifest = self.index.load_manifest()
+        self.assertEqual(manifest['pending']['b.pdf']['status'], 'failed')
+        self.assertEqual(manifest['pdf_dir_mtime'], os.stat(self.pdf_dir).st_mtime_ns)
+        self.assertEqual(list(manifest['sessions']), ['a.pdf'])
+
+
+class FailedGenerationTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.makedirs(os.path.join(directory.name, 'pdf_documents'))
+        with open(os.path.join(directory.name, 'pdf_documents', 'session.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.4 session')
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        artifacts = mock.patch.object(ArtifactStore, 'ROOT', os.path.join(directory.name, 'artifacts'))
+        artifacts.start()
+        self.addCleanup(artifacts.stop)
+        self.summarizer = SessionSummarizer()
+
+    def test_transient_failure_is_not_cached(self):
+        summary = {'summary': 'Η Βουλή ψήφισε τον προϋπολογισμό.', 'generated_at': 'now', 'format': 'markdown'}
+        with mock.patch.object(self.summarizer, 'generate_summary',
+                               side_effect=[ThrottledError('quota'), summary]) as generate:
+            with self.assertRaises(ThrottledError):
+                self.summarizer.get_or_generate_summary('session.pdf')
+            self.assertIsNone(self.summarizer.get_cached_summary('session.pdf'))
+            self.assertEqual(self.summarizer.get_or_generate_summary('session.pdf'), summary)
+            self.assertEqual(self.summarizer.get_or_generate_summary('session.pdf'), summary)
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(self.summarizer.get_cached_summary('session.pdf'), summary)
+
+    def test_error_results_are_neither_stored_nor_served(self):
+        error = {'summary': 'Error: Could not read PDF content', 'generated_at': 'now', 'format': 'markdown'}
+        with mock.patch.object(self.summarizer, 'generate_summary', return_value=error):
+            with self.assertRaises(ValueError):
+                self.summarizer.get_or_generate_summary('session.pdf')
+        self.assertFalse(os.path.exists(self.summarizer.get_cache_path('session.pdf')))
+        # One stored by older code counts as missing
+        self.summarizer.cache_data('session.pdf', error)
+        self.assertIsNone(self.summarizer.get_cached_summary('session.pdf'))
+
+
+class AsyncSingleFlightTests(SimpleTestCase):
+    def test_cancelled_leader_still_answers_its_waiters(self):
+        cache, calls = {}, []
+
+        async def lookup():
+            return cache.get('answer')
+
+        async def generate():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            cache['answer'] = 'απάντηση'
+            return cache['answer']
+
+        async def scenario():
+            leader = asyncio.ensure_future(async_single_flight('question', lookup, generate))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.ensure_future(async_single_flight('question', lookup, generate))
+            await asyncio.sleep(0.01)
+            # As Django does when the leader's client disconnects
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(scenario()), 'απάντηση')
+        self.assertEqual(calls, [1])
+        self.assertEqual(cache, {'answer': 'απάντηση'})
+
+
+class PrioritySlotsTests(SimpleTestCase):
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            threading.Event().wait(0.01)
+        self.fail('condition not reached')
+
+    def test_interactive_waiters_go_before_earlier_background_ones(self):
+        slots = PrioritySlots(1)
+        slots.acquire(BACKGROUND)
+        order = []
+
+        def call(priority):
+            slots.acquire(priority)
+            order.append(priority)
+            slots.release()
+
+        threads = []
+        for count, priority in enumerate([BACKGROUND, BACKGROUND, INTERACTIVE], start=1):
+            threads.append(threading.Thread(target=call, args=(priority,)))
+            threads[-1].start()
+            self.wait_for(lambda: len(slots._waiters) == count)
+        slots.release()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order, [INTERACTIVE, BACKGROUND, BACKGROUND])
+        self.assertEqual(slots.in_flight, 0)
+
+    def test_raising_the_limit_wakes_waiters(self):
+        slots = PrioritySlots(1)
+        slots.acquire(INTERACTIVE)
+        waiter = threading.Thread(target=slots.acquire, args=(INTERACTIVE,))
+        waiter.start()
+        self.wait_for(lambda: slots._waiters)
+        slots.set_limit(2)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(slots.in_flight, 2)
+
+    def test_cancelled_waiter_does_not_keep_a_slot(self):
+        async def scenario():
+            slots = PrioritySlots(1)
+            await slots.aacquire(INTERACTIVE)
+            cancelled = asyncio.ensure_future(slots.aacquire(INTERACTIVE))
+            waiting = asyncio.ensure_future(slots.aacquire(BACKGROUND))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            slots.release()
+            await asyncio.wait_for(waiting, 5)
+            self.assertTrue(cancelled.cancelled())
+            self.assertEqual(slots.in_flight, 1)
+            slots.release()
+            self.assertEqual(slots.in_flight, 0)
+
+        asyncio.run(scenario())
+
+    def test_waiter_cancelled_as_it_is_handed_a_slot_gives_it_back(self):
+        async def scenario():
+            slots = PrioritySlots(1)
+            await slots.aacquire(INTERACTIVE)
+            waiter = asyncio.ensure_future(slots.aacquire(INTERACTIVE))
+            await asyncio.sleep(0)
+            # The slot is handed over, then the waiter is cancelled before it runs
+            slots.release()
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.sleep(0)
+            self.assertEqual(slots.in_flight, 0)
+
+        asyncio.run(scenario())
+
+
+class SpeakerSegmenterTests(SimpleTestCase):
+    PAGES = [
+        (1, 'ΠΡΑΚΤΙΚΑ ΣΥΝΕΔΡΙΑΣΗΣ\nΠΡΟΕΔΡΟΣ: Κηρύσσω την έναρξη.\nΑ. ΝΕΟΦΥΤΟΥ (ΔΗΣΥ): Για τον προϋπολογισμό'),
+        (3, 'της υγείας, κύριε Πρόεδρε.\nΠΡΟΕΔΡΟΣ: Ευχαριστώ.'),
+    ]
+
+    def segment(self):
+        segmenter = SpeakerSegmenter()
+        for number, page in self.PAGES:
+            segmenter.feed(number, page)
+        return segmenter.finish()
+
+    def test_turn_offsets_point_into_the_joined_pages(self):
+        document = '\n'.join(page for _, page in self.PAGES)
+        segmenter = self.segment()
+        texts = [document[start:end] for _, _, _, start, end in segmenter.turns]
+        self.assertEqual(texts, [
+            'ΠΡΟΕΔΡΟΣ: Κηρύσσω την έναρξη.',
+            'Α. ΝΕΟΦΥΤΟΥ (ΔΗΣΥ): Για τον προϋπολογισμό\nτης υγείας, κύριε Πρόεδρε.',
+            'ΠΡΟΕΔΡΟΣ: Ευχαριστώ.',
+        ])
+        self.assertEqual(segmenter.page_starts, [[1, 0], [3, len(self.PAGES[0][1]) + 1]])
+
+    def test_speakers_pages_and_lookup_by_offset(self):
+        document = '\n'.join(page for _, page in self.PAGES)
+        segmenter = self.segment()
+        self.assertEqual(segmenter.speakers, [['ΠΡΟΕΔΡΟΣ', ''], ['Α. ΝΕΟΦΥΤΟΥ', 'ΔΗΣΥ']])
+        self.assertEqual([turn[:3] for turn in segmenter.turns], [[0, 1, 1], [1, 1, 3], [0, 3, 3]])
+        self.assertIsNone(segmenter.speaker_at(0))
+        self.assertEqual(segmenter.speaker_at(document.index('υγείας')), (1, 1))
+        self.assertEqual(segmenter.speaker_at(len(document) - 1), (2, 0))
+        self.assertEqual(segmenter.lengths[1], sum(freq for postings in segmenter.postings.values()
+                                                   for turn_id, freq in postings if turn_id == 1))
+
+
+class SanitizeHtmlTests(SimpleTestCase):
+    def test_keeps_allowed_markup(self):
+        fragment = '<h2>Θέμα</h2><p><strong>Ναι</strong>: 30, <em>Όχι</em>: 20</p><ol start="3"><li>α</li></ol>'
+        self.assertEqual(sanitize_html(fragment), fragment)
+
+    def test_drops_scripts_handlers_and_unknown_tags(self):
+        self.assertEqual(
+            sanitize_html('<p onclick="steal()">Κείμενο<script>alert(1)</script><span>ορατό</span></p>'
+                          '<style>p {}</style><img src=x onerror=alert(1)>'),
+            '<p>Κείμενοορατό</p>')
+
+    def test_links_keep_safe_schemes_only(self):
+        self.assertEqual(sanitize_html('<a href="https://www.parliament.cy/">Βουλή</a>'),
+                         '<a href="https://www.parliament.cy/" rel="nofollow noopener">Βουλή</a>')
+        for href in ('javascript:alert(1)', ' JavaScript:alert(1)', 'data:text/html,x'):
+            self.assertEqual(sanitize_html(f'<a href="{href}">x</a>'), '<a rel="nofollow noopener">x</a>', href)
+
+    def test_escapes_text_and_closes_open_tags(self):
+        self.assertEqual(sanitize_html('<ul><li>1 &lt; 2 & 3 > 2'), '<ul><li>1 &lt; 2 &amp; 3 &gt; 2</li></ul>')
+        self.assertEqual(sanitize_html('<p><em>α</p>β'), '<p><em>α</em></p>β')
+
+    def test_markdown_is_rendered_then_sanitized(self):
+        html = render_markdown('## Ψηφοφορία\n\n- **Υπέρ**: 30\n\n<script>alert(1)</script>')
+        self.assertIn('<h2>Ψηφοφορία</h2>', html)
+        self.assertIn('<strong>Υπέρ</strong>', html)
+        self.assertNotIn('script', html)
@@ -0,0 +1,55 @@
+import json
+from datetime import date
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from proceedings.models import ParliamentarySession
+from proceedings.services.session_catalog import SessionCatalog
+from proceedings.views import _filter_by_date, _parse_date
+
+
+class ParseDateTests(SimpleTestCase):
+    def test_valid_dates(self):
+        self.assertEqual(_parse_date('2024-02-29'), date(2024, 2, 29))
+
+    def test_missing_malformed_and_impossible_dates_are_none(self):
+        for value in (None, '', '2024', '29/02/2024', '2024-13-01', '2024-02-30', '2023-02-29'):
+            self.assertIsNone(_parse_date(value), value)
+
+
+# The catalog is not synced against the PDF directory of whoever runs the tests
+@mock.patch.object(SessionCatalog, 'sync', return_value=0)
+class DateFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for filename, day in (('a.pdf', date(2023, 12, 14)), ('b.pdf', date(2024, 1, 11)),
+                              ('c.pdf', date(2024, 3, 7)), ('d.pdf', None)):
+            ParliamentarySession.objects.create(filename=filename, title=filename, date=day,
+                                                pdf_file=f'pdf_documents/{filename}')
+
+    def filenames(self, params):
+        return sorted(_filter_by_date(ParliamentarySession.objects.all(), params).values_list('filename', flat=True))
+
+    def test_year_and_inclusive_range(self, sync):
+        self.assertEqual(self.filenames({'year': '2024'}), ['b.pdf', 'c.pdf'])
+        self.assertEqual(self.filenames({'date_from': '2024-01-11', 'date_to': '2024-03-07'}), ['b.pdf', 'c.pdf'])
+        self.assertEqual(self.filenames({'date_to': '2024-01-10'}), ['a.pdf'])
+
+    def test_invalid_values_are_ignored(self, sync):
+        everything = ['a.pdf', 'b.pdf', 'c.pdf', 'd.pdf']
+        self.assertEqual(self.filenames({'year': 'twenty'}), everything)
+        self.assertEqual(self.filenames({'date_from': '2024-02-30', 'date_to': 'soon'}), everything)
+        self.assertEqual(self.filenames({'year': '2024', 'date_from': '2024-02-31'}), ['b.pdf', 'c.pdf'])
+
+    def test_session_list_with_invalid_dates(self, sync):
+        response = self.client.get('/', {'date_from': '2024-02-30', 'date_to': '2024-01-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([session.filename for session in response.context['sessions']], ['b.pdf', 'a.pdf'])
+
+    def test_batch_question_rejects_invalid_dates(self, sync):
+        for filters in ({'date_from': '2024-02-30'}, {'date_to': '07/03/2024'}, {'year': '24a'}):
+            response = self.client.post('/qa/batch/', json.dumps({'question': 'Τι ψηφίστηκε;', **filters}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400, filters)
+            self.assertIn('error', response.json())
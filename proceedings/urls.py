@@ -6,6 +6,14 @@ app_name = 'proceedings'
 urlpatterns = [
     path('', views.SessionListView.as_view(), name='session_list'),
     path('session/<str:filename>/', views.SessionDetailView.as_view(), name='session_detail'),
+    path('session/<str:filename>/summary/', views.get_session_summary, name='session_summary'),
     path('session/<str:filename>/topics/', views.session_topics_view, name='session_topics'),
+    path('session/<str:filename>/<str:field>.html', views.session_fragment_view, name='session_fragment'),
     path('session/<str:filename>/qa/', views.session_qa_view, name='session_qa'),
+    path('search/', views.search_view, name='search'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('qa/batch/', views.batch_qa_view, name='batch_qa'),
+    path('qa/cache/', views.qa_cache_stats_view, name='qa_cache_stats'),
+    path('mps/', views.mp_list_view, name='mp_list'),
+    path('mps/search/', views.mp_search_view, name='mp_search'),
 ] 
\ No newline at end of file
@@ -1,19 +1,35 @@
 from django.shortcuts import render
 from django.core.files.storage import FileSystemStorage
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django.views.generic import ListView, DetailView
 from django.conf import settings
 import os
 from datetime import datetime
 from .services.summarizer import SessionSummarizer
-from .services.qa_service import QAService
+from .services.qa_service import QAService, PDFChunkManager
+from .services.batch_qa import BatchQAService
 import json
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect
-import markdown
+from asgiref.sync import sync_to_async
 from django.utils.safestring import mark_safe
+from django.utils.dateparse import parse_date
 from .services.topic_service import TopicExtractor
+from .services.corpus_search import CorpusIndex
+from .services.job_queue import JobQueue
+from .services.session_catalog import SessionCatalog
+from .services.speaker_index import SpeakerIndex
+from .services.fragments import FragmentStore
+from .services.memory_cache import JSONFileCache
+from .services.llm_backends import ThrottledError
+from .services.artifact_store import fingerprint
+from .services.registry import get_service
+from .services import metrics
+from .models import GenerationJob, ParliamentarySession
 
 # Create your views here.
 
@@ -23,71 +39,128 @@ def test_setup(request):
         fs = FileSystemStorage()
         filename = fs.save(f'pdf_documents/{file.name}', file)
         uploaded_file_url = fs.url(filename)
+        get_service(SessionCatalog).refresh(os.path.basename(filename))
         return render(request, 'proceedings/test_setup.html', {
             'uploaded_file_url': uploaded_file_url
         })
     return render(request, 'proceedings/test_setup.html')
 
 class Session:
+    """Lightweight view of one session PDF; artifacts are loaded on first access"""
+    __slots__ = ('filename', '_cache')
+
     def __init__(self, filename):
         self.filename = filename
-        self.path = f'pdf_documents/{filename}'
-        self.title = filename.replace('.pdf', '')
         self._cache = {}
-        self.summarizer = SessionSummarizer()
-        self.topic_extractor = TopicExtractor()
-        self.mps = [
-            {"name": "MP 1", "party": "Party A", "contributions": "Placeholder contribution"},
-            {"name": "MP 2", "party": "Party B", "contributions": "Placeholder contribution"},
-        ]
-
-    def _get_cached_property(self, name, generator_func):
+
+    @property
+    def path(self):
+        return f'pdf_documents/{self.filename}'
+
+    @property
+    def title(self):
+        return self.filename.replace('.pdf', '')
+
+    @property
+    def summarizer(self):
+        return get_service(SessionSummarizer)
+
+    @property
+    def topic_extractor(self):
+        return get_service(TopicExtractor)
+
+    @property
+    def mps(self):
+        """Speakers of the session with their number of turns, or [] while the transcript is being segmented"""
+        if 'mps' not in self._cache:
+            try:
+                speakers = get_service(SpeakerIndex).session_speakers(self.filename)
+                if speakers is None:
+                    # Turns are segmented together with the chunks
+                    get_service(JobQueue).enqueue(GenerationJob.KIND_CHUNKS, self.filename)
+                self._cache['mps'] = speakers or []
+            except Exception as e:
+                print(f"Error getting mps: {e}")
+                self._cache['mps'] = []
+        return self._cache['mps']
+
+    def _get_cached_property(self, name, service, job_kind):
+        """Prerendered HTML of a cached artifact, or queue its generation and return None while it is pending"""
         if name not in self._cache:
             try:
-                data = generator_func()
-                self._cache[name] = mark_safe(markdown.markdown(data))
+                fragment = get_service(FragmentStore).get(service, self.filename, name)
+                if fragment is None:
+                    get_service(JobQueue).enqueue(job_kind, self.filename)
+                    self._cache[name] = None
+                else:
+                    self._cache[name] = mark_safe(fragment.text())
             except Exception as e:
                 print(f"Error getting {name}: {e}")
                 self._cache[name] = f"Error loading {name}."
         return self._cache[name]
 
-    def _get_pdf_content(self):
-        """Get the PDF content using the summarizer's PDF reader"""
-        pdf_path = os.path.join(settings.MEDIA_ROOT, 'pdf_documents', self.filename)
-        return self.summarizer.read_pdf_content(pdf_path)
-
     @property
     def summary(self):
-        return self._get_cached_property('summary', 
-            lambda: self.summarizer.get_or_generate_summary(self.filename).get('summary', ''))
+        return self._get_cached_property('summary', self.summarizer, GenerationJob.KIND_SUMMARY)
 
     @property
     def topics(self):
-        return self._get_cached_property('topics',
-            lambda: self.topic_extractor.get_or_generate_topics(
-                self.filename, 
-                self._get_pdf_content()  # Pass the PDF content instead of summary
-            ).get('topics', ''))
+        return self._get_cached_property('topics', self.topic_extractor, GenerationJob.KIND_TOPICS)
 
     @property
     def url(self):
         return f'/media/pdf_documents/{self.filename}'
 
+def _parse_date(value):
+    """A date from YYYY-MM-DD, or None if it is missing, malformed or impossible (2024-02-30)"""
+    try:
+        return parse_date(str(value or ''))
+    except ValueError:
+        return None
+
+def _filter_by_date(sessions, params):
+    """Sessions of a `year`, or between `date_from` and `date_to` (inclusive); invalid values are ignored"""
+    year = str(params.get('year', '') or '')
+    if year.isdigit():
+        sessions = sessions.filter(date__year=int(year))
+    for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        value = _parse_date(params.get(param))
+        if value:
+            sessions = sessions.filter(**{lookup: value})
+    return sessions
+
 class SessionListView(ListView):
     template_name = 'proceedings/session_list.html'
     context_object_name = 'sessions'
-    
+    paginate_by = 50
+    STATUS_FILTERS = {
+        'summarized': {'summary_ready': True},
+        'pending': {'summary_ready': False},
+        'complete': {'summary_ready': True, 'topics_ready': True},
+    }
+
     def get_queryset(self):
-        pdf_dir = os.path.join(settings.MEDIA_ROOT, 'pdf_documents')
-        sessions = []
-        
-        if os.path.exists(pdf_dir):
-            for filename in sorted(os.listdir(pdf_dir)):
-                if filename.endswith('.pdf'):
-                    sessions.append(Session(filename))
-                    
+        # Picks up added, replaced or deleted PDFs; only stats the directory when nothing changed
+        get_service(SessionCatalog).sync()
+
+        sessions = ParliamentarySession.objects.defer('summary')
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            sessions = sessions.filter(title__icontains=query)
+        sessions = _filter_by_date(sessions, self.request.GET)
+        status = self.STATUS_FILTERS.get(self.request.GET.get('status', ''))
+        if status:
+            sessions = sessions.filter(**status)
         return sessions
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['filters'] = self.request.GET
+        context['filter_query'] = params.urlencode()
+        return context
+
 @method_decorator(csrf_protect, name='dispatch')
 class SessionDetailView(DetailView):
     template_name = 'proceedings/session_detail.html'
@@ -95,8 +168,30 @@ class SessionDetailView(DetailView):
     
     def get_object(self):
         filename = self.kwargs.get('filename')
+        if not _pdf_exists(filename):
+            raise Http404("Session not found")
         return Session(filename)
 
+    def get(self, request, *args, **kwargs):
+        """Answer revalidations with 304 once everything on the page is generated"""
+        filename = self.kwargs.get('filename')
+        etag = _detail_etag(request, filename) if _pdf_exists(filename) else None
+        if etag:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return _revalidate(not_modified)
+        response = super().get(request, *args, **kwargs)
+        if etag:
+            response['ETag'] = etag
+            _revalidate(response)
+        return response
+
+    def get_context_data(self, **kwargs):
+        # Have chunks ready before the first question is asked
+        if not get_service(PDFChunkManager).chunk_exists(self.object.filename):
+            get_service(JobQueue).enqueue(GenerationJob.KIND_CHUNKS, self.object.filename)
+        return super().get_context_data(**kwargs)
+
     def post(self, request, *args, **kwargs):
         """Handle Q&A interactions"""
         try:
@@ -108,7 +203,7 @@ class SessionDetailView(DetailView):
                 return JsonResponse({'error': 'Question is required'}, status=400)
 
             session = self.get_object()
-            qa_service = QAService()
+            qa_service = get_service(QAService)
             
             answer = qa_service.get_answer(
                 question=question,
@@ -120,30 +215,129 @@ class SessionDetailView(DetailView):
                 'answer': answer
             })
 
+        except ThrottledError:
+            return _busy_response()
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
-# Add a new view for fetching summary
-def get_session_summary(request, filename):
-    summarizer = SessionSummarizer()
-    summary_data = summarizer.get_or_generate_summary(filename)
-    return JsonResponse(summary_data)
+BUSY_RETRY_AFTER = 10  # Seconds clients are asked to wait when the model provider keeps throttling
+
+def _busy_response():
+    """The model provider is still throttling after retries: ask the client to come back"""
+    response = JsonResponse({'error': 'The model is busy, please try again shortly', 'status': 'busy'}, status=503)
+    response['Retry-After'] = str(BUSY_RETRY_AFTER)
+    return response
+
+def _pdf_exists(filename):
+    return os.path.isfile(os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename))
+
+def _artifact_service(kind):
+    """The service generating an artifact kind, and the markdown field of its data"""
+    if kind == GenerationJob.KIND_SUMMARY:
+        return get_service(SessionSummarizer), 'summary'
+    return get_service(TopicExtractor), 'topics'
+
+def _revalidate(response):
+    """Let browsers keep a copy, but check it with the server before every use"""
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def _detail_etag(request, filename):
+    """Validator of the detail page, or None while any of its parts is still being generated
+
+    The page embeds both fragments, the speakers table and a CSRF token, so
+    its ETag combines their keys with the CSRF cookie and the template's
+    modification time.
+    """
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not csrf_cookie:
+        return None
+    fragments = get_service(FragmentStore)
+    keys = []
+    for kind in (GenerationJob.KIND_SUMMARY, GenerationJob.KIND_TOPICS):
+        service, field = _artifact_service(kind)
+        fragment = fragments.lookup(service, filename, field)
+        if fragment is None:
+            return None
+        keys.append(fragment.key)
+    speakers = get_service(SpeakerIndex)
+    if not os.path.exists(speakers.get_cache_path(filename)):
+        return None
+    keys.append(speakers.artifact_key(filename))
+    template = get_template(SessionDetailView.template_name).origin.name
+    keys += [csrf_cookie, str(os.stat(template).st_mtime_ns)]
+    return f'"{fingerprint(*keys, length=24)}"'
+
+def _pending_payload(kind, filename):
+    """Payload and status of an artifact being generated: 202 while its job is queued or running
+
+    A job that failed for good gets a 500, which stops clients from polling;
+    it is not queued again until JobQueue.FAILED_RETRY_AFTER has passed.
+    """
+    # At most one active job per artifact, however many clients are polling
+    job = get_service(JobQueue).enqueue(kind, filename)
+    if job is not None and job.status == GenerationJob.STATUS_FAILED:
+        return {
+            'error': f"Generating the {kind} failed; it will be retried later",
+            'status': 'failed',
+            'job_status': job.status
+        }, 500
+    return {
+        'status': 'pending',
+        'job_status': job.status if job else GenerationJob.STATUS_PENDING
+    }, 202
+
+def _artifact_payload(kind, filename):
+    """Cached summary or topics as a JSON payload with prerendered HTML, queueing generation on a miss"""
+    service, field = _artifact_service(kind)
+    data = service.get_cached_data(filename)
+    fragment = get_service(FragmentStore).get(service, filename, field) if data is not None else None
+    if fragment is None:
+        return _pending_payload(kind, filename)
+
+    return {
+        **data,
+        f'{field}_html': fragment.text(),
+        'status': 'success'
+    }, 200
+
+async def _artifact_response(request, kind, filename):
+    """JSON of a summary or topics, or 304 when the client's copy matches the stored fragment"""
+    service, field = _artifact_service(kind)
+    fragment = await sync_to_async(get_service(FragmentStore).lookup)(service, filename, field)
+    if fragment is not None:
+        not_modified = get_conditional_response(request, etag=fragment.etag('json'),
+                                                last_modified=int(fragment.last_modified))
+        if not_modified is not None:
+            return _revalidate(not_modified)
+
+    payload, status = await sync_to_async(_artifact_payload)(kind, filename)
+    response = JsonResponse(payload, status=status)
+    if status == 200:
+        fragment = fragment or await sync_to_async(get_service(FragmentStore).lookup)(service, filename, field)
+        response['ETag'] = fragment.etag('json')
+        response['Last-Modified'] = http_date(fragment.last_modified)
+        _revalidate(response)
+    return response
 
 @require_http_methods(["GET"])
-def session_topics_view(request, filename):
-    """API endpoint to get topics for a session"""
+async def get_session_summary(request, filename):
+    """API endpoint to get the summary of a session, generated in the background"""
+    if not _pdf_exists(filename):
+        return JsonResponse({'error': 'Session not found', 'status': 'error'}, status=404)
+
+    return await _artifact_response(request, GenerationJob.KIND_SUMMARY, filename)
+
+@require_http_methods(["GET"])
+async def session_topics_view(request, filename):
+    """API endpoint to get topics for a session, generated in the background"""
+    if not _pdf_exists(filename):
+        return JsonResponse({'error': 'Session not found', 'status': 'error'}, status=404)
+
     try:
-        session = Session(filename)
-        topics_data = session.topic_extractor.get_or_generate_topics(
-            filename,
-            os.path.join(settings.MEDIA_ROOT, 'pdf_documents', filename)
-        )
-        return JsonResponse({
-            'topics': topics_data.get('topics', ''),
-            'status': 'success'
-        })
+        return await _artifact_response(request, GenerationJob.KIND_TOPICS, filename)
     except Exception as e:
         print(f"Error getting topics: {e}")
         return JsonResponse({
@@ -151,10 +345,80 @@ def session_topics_view(request, filename):
             'status': 'error'
         }, status=500)
 
-@method_decorator(csrf_protect, name='dispatch')
+FRAGMENT_KINDS = {'summary': GenerationJob.KIND_SUMMARY, 'topics': GenerationJob.KIND_TOPICS}
+
+@require_http_methods(["GET", "HEAD"])
+async def session_fragment_view(request, filename, field):
+    """Prerendered HTML of the summary or topics, precompressed, with conditional GETs"""
+    if field not in FRAGMENT_KINDS or not _pdf_exists(filename):
+        return JsonResponse({'error': 'Session not found', 'status': 'error'}, status=404)
+
+    kind = FRAGMENT_KINDS[field]
+    service, field = _artifact_service(kind)
+    fragments = get_service(FragmentStore)
+    fragment = await sync_to_async(fragments.get)(service, filename, field)
+    if fragment is None:
+        payload, status = await sync_to_async(_pending_payload)(kind, filename)
+        return JsonResponse(payload, status=status)
+
+    encoding = fragments.negotiate(fragment, request.headers.get('Accept-Encoding', ''))
+    # Each encoding is a different representation, so it gets its own ETag
+    response = get_conditional_response(request, etag=fragment.etag(encoding),
+                                        last_modified=int(fragment.last_modified))
+    if response is None:
+        response = HttpResponse(await sync_to_async(fragment.read)(encoding), content_type='text/html; charset=utf-8')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = fragment.etag(encoding)
+    response['Last-Modified'] = http_date(fragment.last_modified)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return _revalidate(response)
+
+def _sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+async def _stream_answer_events(qa_service, question, chat_history, filename, pages=None):
+    """Relay answer pieces as Server-Sent Events, ending with the full answer"""
+    parts = []
+    try:
+        async for piece in qa_service.astream_answer(question, chat_history, filename, pages):
+            parts.append(piece)
+            yield _sse_event('token', {'text': piece})
+        yield _sse_event('done', {'answer': ''.join(parts), 'status': 'success'})
+    except ThrottledError:
+        yield _sse_event('error', {'error': 'The model is busy, please try again shortly', 'status': 'busy',
+                                   'retry_after': BUSY_RETRY_AFTER})
+    except Exception as e:
+        print(f"Error in Q&A stream: {e}")
+        yield _sse_event('error', {'error': str(e), 'status': 'error'})
+
+def _wants_stream(request, data):
+    return data.get('stream') or 'text/event-stream' in request.headers.get('Accept', '')
+
+def _parse_page_range(value):
+    """Inclusive (first, last) page range from "12-15", "12" or [12, 15]; None when not given"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, int):
+        first = last = value
+    elif isinstance(value, (list, tuple)) and len(value) == 2:
+        first, last = (int(page) for page in value)
+    else:
+        first, _, last = str(value).partition('-')
+        first, last = int(first), int(last or first)
+    if first < 1 or last < first:
+        raise ValueError(f"Invalid page range: {value}")
+    return first, last
+
+@csrf_protect
 @require_http_methods(["POST"])
-def session_qa_view(request, filename):
-    """API endpoint for Q&A interactions"""
+async def session_qa_view(request, filename):
+    """API endpoint for Q&A interactions; the model call does not hold a thread
+
+    Clients sending `Accept: text/event-stream` (or `"stream": true`) receive the
+    answer as Server-Sent Events; everyone else gets the JSON response. An
+    optional `"pages": "12-15"` limits the answer to those pages of the transcript.
+    """
     try:
         data = json.loads(request.body)
         question = data.get('question')
@@ -163,13 +427,30 @@ def session_qa_view(request, filename):
         if not question:
             return JsonResponse({'error': 'Question is required'}, status=400)
 
-        session = Session(filename)
-        qa_service = QAService()
+        try:
+            pages = _parse_page_range(data.get('pages'))
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Invalid page range'}, status=400)
+
+        if not _pdf_exists(filename):
+            return JsonResponse({'error': 'Session not found'}, status=404)
+
+        qa_service = get_service(QAService)
+
+        if _wants_stream(request, data):
+            response = StreamingHttpResponse(
+                _stream_answer_events(qa_service, question, chat_history, filename, pages),
+                content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+            return response
         
-        answer = qa_service.get_answer(
+        answer = await qa_service.aget_answer(
             question=question,
             chat_history=chat_history,
-            filename=session.filename
+            filename=filename,
+            pages=pages
         )
 
         return JsonResponse({
@@ -177,8 +458,190 @@ def session_qa_view(request, filename):
             'status': 'success'
         })
 
+    except ThrottledError:
+        return _busy_response()
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
     except Exception as e:
         print(f"Error in Q&A: {e}")  # For debugging
         return JsonResponse({'error': str(e)}, status=500)
+
+def _batch_filenames(data):
+    """Sessions a batch question is asked over: the `sessions` listed, or catalogued ones matching the date filters"""
+    filenames = data.get('sessions')
+    if filenames:
+        if not isinstance(filenames, list) or not all(isinstance(name, str) for name in filenames):
+            raise ValueError('sessions must be a list of filenames')
+        return list(dict.fromkeys(filenames))
+    if not any(data.get(param) for param in ('year', 'date_from', 'date_to')):
+        raise ValueError('Give the sessions or a year, date_from or date_to')
+    if data.get('year') and not str(data['year']).isdigit():
+        raise ValueError(f"Invalid year: {data['year']}")
+    for param in ('date_from', 'date_to'):
+        if data.get(param) and _parse_date(data[param]) is None:
+            raise ValueError(f"Invalid {param}: {data[param]} (expected YYYY-MM-DD)")
+    # The catalog as it is: uploads, ingest and the session list keep it in sync, not this request
+    limit = getattr(settings, 'AGORA_QA_BATCH_MAX_SESSIONS', 50)
+    sessions = _filter_by_date(ParliamentarySession.objects.all(), data)
+    return list(sessions.values_list('filename', flat=True)[:limit + 1])
+
+async def _batch_results(question, chat_history, filenames):
+    """Per-session results of a batch question as they complete, queueing chunking where it is missing"""
+    found = []
+    for filename in filenames:
+        if os.path.basename(filename) != filename or not _pdf_exists(filename):
+            yield {'filename': filename, 'status': 'error', 'error': 'Session not found'}
+        else:
+            found.append(filename)
+
+    async for result in get_service(BatchQAService).astream(question, chat_history, found):
+        if result['status'] == 'pending':
+            job = await sync_to_async(get_service(JobQueue).enqueue)(GenerationJob.KIND_CHUNKS, result['filename'])
+            result['job_status'] = job.status if job else GenerationJob.STATUS_PENDING
+            if result['job_status'] == GenerationJob.STATUS_FAILED:
+                result.update(status='error', error='Chunking this session failed; it will be retried later')
+        elif result['status'] == 'busy':
+            result.update(error='The model is busy, please try again shortly', retry_after=BUSY_RETRY_AFTER)
+        yield result
+
+async def _stream_batch_events(question, chat_history, filenames):
+    """Relay each session's result as a Server-Sent Event as soon as it is ready"""
+    answered = 0
+    try:
+        async for result in _batch_results(question, chat_history, filenames):
+            answered += result['status'] == 'success'
+            yield _sse_event('session', result)
+        yield _sse_event('done', {'sessions': len(filenames), 'answered': answered, 'status': 'success'})
+    except Exception as e:
+        print(f"Error in batch Q&A stream: {e}")
+        yield _sse_event('error', {'error': str(e), 'status': 'error'})
+
+@csrf_protect
+@require_http_methods(["POST"])
+async def batch_qa_view(request):
+    """Ask one question over many sessions
+
+    The body has the `question`, an optional `chat_history`, and either a list
+    of `sessions` (PDF filenames) or a `year`, `date_from` and/or `date_to`
+    filter. Each session gets its own answer, with the status 'success',
+    'pending' (its transcript is still being chunked; ask again later), 'busy'
+    or 'error'. Streaming clients (see session_qa_view) receive a `session`
+    event per session as it completes, in completion order, then `done`;
+    everyone else gets all results at once, in the order of the sessions.
+    """
+    try:
+        data = json.loads(request.body)
+        question = data.get('question')
+        chat_history = data.get('chat_history', [])
+
+        if not question:
+            return JsonResponse({'error': 'Question is required'}, status=400)
+
+        try:
+            filenames = await sync_to_async(_batch_filenames)(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        limit = getattr(settings, 'AGORA_QA_BATCH_MAX_SESSIONS', 50)
+        if len(filenames) > limit:
+            return JsonResponse({'error': f'At most {limit} sessions per question'}, status=400)
+
+        if _wants_stream(request, data):
+            response = StreamingHttpResponse(_stream_batch_events(question, chat_history, filenames),
+                                             content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        results = {result['filename']: result
+                   async for result in _batch_results(question, chat_history, filenames)}
+        return JsonResponse({
+            'results': [results[filename] for filename in filenames],
+            'status': 'success'
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        print(f"Error in batch Q&A: {e}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def search_view(request):
+    """API endpoint for ranked search across all sessions"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Query is required', 'status': 'error'}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit', 'status': 'error'}, status=400)
+
+    try:
+        corpus_index = get_service(CorpusIndex)
+        # Merges newly chunked PDFs and queues the others; cheap when the PDF directory is unchanged
+        corpus_index.sync()
+        results = corpus_index.search(query, k=limit)
+        return JsonResponse({
+            'query': query,
+            'results': results,
+            'status': 'success'
+        })
+    except Exception as e:
+        print(f"Error in search: {e}")
+        return JsonResponse({'error': str(e), 'status': 'error'}, status=500)
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus metrics of all worker processes: stage and request latency, cache lookups, model calls and tokens"""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_http_methods(["GET"])
+def qa_cache_stats_view(request):
+    """API endpoint with the Q&A answer cache hit rate across workers, and this worker's artifact cache"""
+    return JsonResponse({**get_service(QAService).answers.stats(),
+                         'artifacts': get_service(JSONFileCache).stats(), 'status': 'success'})
+
+@require_http_methods(["GET"])
+def mp_list_view(request):
+    """API endpoint listing every speaker across sessions"""
+    try:
+        speaker_index = get_service(SpeakerIndex)
+        speaker_index.sync()
+        return JsonResponse({'mps': speaker_index.list_mps(), 'status': 'success'})
+    except Exception as e:
+        print(f"Error listing MPs: {e}")
+        return JsonResponse({'error': str(e), 'status': 'error'}, status=500)
+
+@require_http_methods(["GET"])
+def mp_search_view(request):
+    """API endpoint for what an MP said, optionally about a topic and in one session"""
+    mp = request.GET.get('mp', '').strip()
+    if not mp:
+        return JsonResponse({'error': 'MP name is required', 'status': 'error'}, status=400)
+    query = request.GET.get('q', '').strip()
+    session = request.GET.get('session') or None
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit', 'status': 'error'}, status=400)
+
+    try:
+        speaker_index = get_service(SpeakerIndex)
+        # Merges newly segmented PDFs and queues the others; cheap when the PDF directory is unchanged
+        speaker_index.sync()
+        mps = speaker_index.find_mps(mp)
+        if not mps:
+            return JsonResponse({'error': f'No speaker matches "{mp}"', 'status': 'error'}, status=404)
+        results = speaker_index.what_did_they_say(mp, query, k=limit, filename=session)
+        return JsonResponse({
+            'mp': mp,
+            'matches': [speaker_index.load_index()['mps'][key]['name'] for key in mps],
+            'query': query,
+            'results': results,
+            'status': 'success'
+        })
+    except Exception as e:
+        print(f"Error in MP search: {e}")
+        return JsonResponse({'error': str(e), 'status': 'error'}, status=500)